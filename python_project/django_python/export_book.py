@@ -1,4 +1,3 @@
-import csv
 import os
 import django
 
@@ -6,23 +5,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_python.settings")
 
 django.setup()
 
-from library.models import Book
+from library.exports import BOOK_COLUMNS, book_rows, iter_csv, iter_encoded
 
-with open("books.csv", "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["id", "title", "author", "categories", "publisher", "price", "description"])
-
-    for book in Book.objects.all():
-        categories = ", ".join([c.name for c in book.categories.all()]) if hasattr(book, "categories") else ""
-
-        writer.writerow([
-            book.id,
-            book.name,
-            book.author.name if book.author else "",
-            categories,
-            book.publisher.name if book.publisher else "",
-            book.price,
-            getattr(book, "description", "")
-        ])
+# Dùng chung bộ xuất với admin/`manage.py export_books_csv`:
+# đọc theo khối, thể loại gộp bằng SQL.
+with open("books.csv", "wb") as f:
+    for chunk in iter_encoded(iter_csv(BOOK_COLUMNS, book_rows())):
+        f.write(chunk)
 
 print("books.csv created successfully!")
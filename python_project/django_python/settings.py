@@ -36,8 +36,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.RequestProfilerMiddleware',
+    'library.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'library.middleware.PrimaryStickyMiddleware',
+    'library.middleware.AccountMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -93,13 +97,49 @@ WSGI_APPLICATION = 'django_python.wsgi.application'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# PRAGMA chạy mỗi khi mở kết nối SQLite:
+# WAL cho phép đọc song song với một luồng ghi, busy_timeout chờ khóa thay vì
+# báo "database is locked" ngay, mmap/cache_size giảm I/O khi đọc.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,            # ms
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+    'cache_size': -20000,            # KiB (~20 MB mỗi kết nối)
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {k}={v}' for k, v in SQLITE_PRAGMAS.items()),
+            # Giao dịch ghi lấy khóa ngay từ BEGIN, tránh lỗi khóa khi nâng cấp từ đọc lên ghi
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+        # Giữ kết nối giữa các request (giây); 0 = mở kết nối mới mỗi request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Bản sao chỉ đọc (tùy chọn) cho catalog, gợi ý và thống kê admin; được chép
+# từ primary bằng `manage.py sync_replica`. Đặt DB_REPLICA_PATH để bật.
+DB_REPLICA_PATH = os.getenv('DB_REPLICA_PATH', '')
+if DB_REPLICA_PATH:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_PATH,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['library.db_router.ReplicaRouter']
+
+# Sau khi ghi, các request kế tiếp của trình duyệt đó đọc từ primary trong chừng ấy giây
+REPLICA_STICKY_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -125,16 +165,103 @@ STATICFILES_DIRS = [
     BASE_DIR / "library" / "static",
 ]
 
+# default: giữ tối đa MAX_ENTRIES mục (mặc định 300), vượt quá thì xóa ngẫu nhiên 1/3.
+# versions: khóa phiên bản của library/caching.py (get_version / bump_version), một
+# khóa cho mỗi tài khoản. Tách riêng và không giới hạn để không bao giờ bị cull:
+# mất khóa phiên bản thì các mục cũ cùng số phiên bản lại được dùng.
+# renditions: URL / kích thước ảnh thu nhỏ (library/renditions.py), mỗi ảnh một mục
+# cho mỗi cỡ. Tách riêng để danh mục sách lớn không cull mục gợi ý của cache mặc
+# định, và không bị cull để trang danh mục không phải mở lại ảnh bằng PIL.
 CACHES = {
   "default": {
     "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
     "LOCATION": BASE_DIR / "django_cache",
     "TIMEOUT": None,
-  }
+  },
+  "versions": {
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": BASE_DIR / "django_cache" / "versions",
+    "TIMEOUT": None,
+    "OPTIONS": {"MAX_ENTRIES": 10_000_000},
+  },
+  "renditions": {
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": BASE_DIR / "django_cache" / "renditions",
+    "TIMEOUT": None,
+    "OPTIONS": {"MAX_ENTRIES": 10_000_000},
+  },
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Engine used for recommendations: 'rules' (mine_rules) or 'itemcf' (build_similarity)
+RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'rules')
+
+# File luật (.npz) xuất bởi `mine_rules --export`; nếu đặt, worker đọc luật
+# trực tiếp từ file (memory-map) thay vì bảng BookAssociationRule
+RULES_FILE = os.getenv('RULES_FILE', '')
+
+# Cache gợi ý: tươi trong TTL, sau đó còn được phục vụ (stale) thêm STALE_TTL
+# trong lúc một worker tính lại
+RECOMMENDATION_CACHE_TTL = 300
+RECOMMENDATION_CACHE_STALE_TTL = 3600
+
+# Đo số truy vấn / thời gian DB, template, view mỗi request (header Server-Timing
+# + log 'library.profiling'). Truy vấn cùng dạng lặp >= ngưỡng bị báo là N+1.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_REPEAT_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'library': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Bộ đếm cho /metrics: mỗi worker ghi một file .json vào METRICS_DIR, /metrics
+# gộp tất cả. Chỉ trả lời khi có header "Authorization: Bearer <METRICS_TOKEN>",
+# khi IP gọi nằm trong METRICS_ALLOWED_IPS (phân cách bằng dấu phẩy), hoặc cho
+# admin đã đăng nhập. Đứng sau reverse proxy cùng máy thì mọi request đều đến từ
+# 127.0.0.1: khi đó dùng METRICS_TOKEN thay vì METRICS_ALLOWED_IPS.
+METRICS_DIR = Path(os.getenv('METRICS_DIR', BASE_DIR / 'metrics'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
+# Công việc định kỳ do run_scheduler chạy (chu kỳ tính bằng giây). Chỉ dùng để
+# tạo công việc còn thiếu; sau đó chu kỳ / bật-tắt chỉnh trong admin.
+SCHEDULED_JOBS = {
+    'send_due_notifications': {'command': 'send_due_notifications', 'interval': 24 * 3600},
+    'rollup_popularity': {'command': 'rollup_popularity', 'interval': 24 * 3600},
+    'mine_rules': {'command': 'mine_rules', 'interval': 24 * 3600},
+    'archive_borrows': {'command': 'archive_borrows', 'interval': 24 * 3600},
+    'expire_reservations': {'command': 'expire_reservations', 'interval': 3600},
+}
+# Số công việc chạy song song trong một run_scheduler, thời hạn khóa (lease) và
+# chu kỳ kiểm tra công việc đến hạn
+SCHEDULER_WORKERS = 2
+SCHEDULER_LEASE_SECONDS = 300
+SCHEDULER_POLL_SECONDS = 5
+
+# Số ngày giữ sách cho một lượt đặt trước (tính cả ngày đặt); quá hạn thì
+# expire_reservations chuyển phiếu sang 'expired' và nhường bản cho hàng chờ
+RESERVATION_HOLD_DAYS = 3
+
+# Phiếu đã trả quá số ngày này được archive_borrows chuyển sang BorrowArchive
+BORROW_ARCHIVE_AFTER_DAYS = 365
+
+# Số giây mỗi worker giữ Account của session trong bộ nhớ (library/middleware.py)
+ACCOUNT_CACHE_TTL = 30
+
+# Định dạng ảnh thu nhỏ của sách (library/renditions.py): 'webp' hoặc 'jpeg'
+RENDITION_FORMAT = os.getenv('RENDITION_FORMAT', 'webp')
+
+# Thư mục lưu chỉ mục TF-IDF (build_content_index), được các worker memory-map
+CONTENT_INDEX_DIR = BASE_DIR / 'content_index'
+
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'login'
 X_FRAME_OPTIONS = 'ALLOWALL'
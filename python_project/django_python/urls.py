@@ -26,11 +26,14 @@ urlpatterns = [
     path('borrow/return/<int:borrow_id>/', views.confirm_return, name='confirm_return'),
     path('borrow/pending/cancel/<int:borrow_id>/', views.cancel_pending_borrow, name='cancel_pending_borrow'),
     path('borrow/returned/delete/<int:borrow_id>/', views.delete_returned_borrow, name='delete_returned_borrow'),
+    path('borrow/waitlist/leave/<int:entry_id>/', views.leave_waitlist, name='leave_waitlist'),
 
     path('admin/get-pending/', views.get_pending_requests, name='get_pending_requests'),
     path('user/get-active-borrows/', views.get_user_active_borrows, name='get_user_active_borrows'),
     path('user/get-returned-history/', views.get_user_returned_history, name='get_user_returned_history'),
     path('user/get-reserved-books/', views.get_user_reserved_books, name='get_user_reserved_books'),
+    path('stats/cache/', views.cache_stats, name='cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
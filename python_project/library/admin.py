@@ -10,9 +10,44 @@ from django.core.cache import cache
 from datetime import date
 from datetime import datetime, timedelta
 from .models import get_max_borrow_days
-from .models import Account, Author, Category, Publisher, Book, Borrow
+from .models import (
+    Account, Author, Category, Publisher, Book, Borrow, BorrowArchive, JobRun, ScheduledJob, WaitlistEntry,
+)
+from .exports import streaming_export_response
+from .db_router import read_from_replica
+from django.db import transaction
 from django.db.models import Q
 
+
+class StreamingExportMixin:
+    """Admin actions + /export/ endpoint streaming CSV/JSONL (?format=, ?gzip=1)."""
+    export_kind = None
+
+    def get_urls(self):
+        urls = super().get_urls()
+        opts = self.model._meta
+        custom = [
+            path("export/", self.admin_site.admin_view(self.export_view),
+                 name=f"{opts.app_label}_{opts.model_name}_export"),
+        ]
+        return custom + urls
+
+    def export_view(self, request):
+        fmt = request.GET.get("format", "csv")
+        if fmt not in ("csv", "jsonl"):
+            fmt = "csv"
+        compress = request.GET.get("gzip") == "1"
+        return streaming_export_response(self.export_kind, fmt, compress=compress)
+
+    @admin.action(description="Xuất CSV (các dòng đã chọn)")
+    def export_csv(self, request, queryset):
+        return streaming_export_response(self.export_kind, "csv", queryset=queryset)
+
+    @admin.action(description="Xuất JSONL (các dòng đã chọn)")
+    def export_jsonl(self, request, queryset):
+        return streaming_export_response(self.export_kind, "jsonl", queryset=queryset)
+
+
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ("account_name", "account_id", "email", "username", "phone", "status", "user_type")
@@ -31,12 +66,17 @@ class AccountAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
-        extra_context["stats"] = [
+        extra_context["stats"] = self.get_stats(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
+        return [
             {"label": "Tổng người dùng", "value": Account.objects.count()},
             {"label": "Kích hoạt", "value": Account.objects.filter(status="active").count()},
             {"label": "Chưa kích hoạt", "value": Account.objects.filter(status="inactive").count()},
         ]
-        return super().changelist_view(request, extra_context=extra_context)
 
     def account_id_display(self, obj):
         return obj.pk if obj and obj.pk else "Sẽ được tạo sau khi lưu"
@@ -65,16 +105,21 @@ class AuthorAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        extra_context["stats"] = self.get_stats(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
         from .models import Author
         total_authors = Author.objects.count()
         authors_with_books = Author.objects.filter(book__isnull=False).distinct().count()
         authors_without_books = total_authors - authors_with_books
-        extra_context["stats"] = [
+        return [
             {"label": "Tổng tác giả", "value": total_authors},
             {"label": "Có sách", "value": authors_with_books},
             {"label": "Chưa có sách", "value": authors_without_books},
         ]
-        return super().changelist_view(request, extra_context=extra_context)
 
 
 @admin.register(Category)
@@ -85,16 +130,21 @@ class CategoryAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        extra_context["stats"] = self.get_stats(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
         from .models import Category
         total_categories = Category.objects.count()
         categories_with_books = Category.objects.filter(books__isnull=False).distinct().count()
         categories_without_books = total_categories - categories_with_books
-        extra_context["stats"] = [
+        return [
             {"label": "Tổng thể loại", "value": total_categories},
             {"label": "Có sách", "value": categories_with_books},
             {"label": "Chưa có sách", "value": categories_without_books},
         ]
-        return super().changelist_view(request, extra_context=extra_context)
 
 
 @admin.register(Publisher)
@@ -105,16 +155,21 @@ class PublisherAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        extra_context["stats"] = self.get_stats(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
         from .models import Publisher
         total_publishers = Publisher.objects.count()
         publishers_with_books = Publisher.objects.filter(book__isnull=False).distinct().count()
         publishers_without_books = total_publishers - publishers_with_books
-        extra_context["stats"] = [
+        return [
             {"label": "Tổng nhà xuất bản", "value": total_publishers},
             {"label": "Có sách", "value": publishers_with_books},
             {"label": "Chưa có sách", "value": publishers_without_books},
         ]
-        return super().changelist_view(request, extra_context=extra_context)
 
 class AddDateRangeFilter(SimpleListFilter):
     title = "Thời gian"
@@ -144,7 +199,9 @@ class AddDateRangeFilter(SimpleListFilter):
         return queryset
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_kind = "books"
+    actions = ["export_csv", "export_jsonl"]
     list_display = (
         "book_name", "get_author", "get_categories", "get_publisher", "dateAdd",
     )
@@ -199,7 +256,12 @@ class BookAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        extra_context["stats"] = self.get_stats(request)
+        return super().changelist_view(request, extra_context=extra_context)
 
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
         qs = self.get_queryset(request)
 
         # ---- APPLY DATE RANGE FILTER (dateAdd) ----
@@ -231,15 +293,13 @@ class BookAdmin(admin.ModelAdmin):
         today = timezone.now().date()
         recent_days = today - timedelta(days=30)
 
-        extra_context["stats"] = [
+        return [
             {"label": "Tổng số sách", "value": qs.count()},
             {"label": "Sách đang có", "value": qs.filter(available__gt=0).count()},
             {"label": "Sách hết hàng", "value": qs.filter(available=0).count()},
             {"label": "Sách mới 30 ngày", "value": qs.filter(dateAdd__gte=recent_days).count()},
         ]
 
-        return super().changelist_view(request, extra_context=extra_context)
-
 
 
 BORROW_VERSION_KEY = "borrows_version"
@@ -291,14 +351,15 @@ class BorrowDateRangeFilter(SimpleListFilter):
 
 
 @admin.register(Borrow)
-class BorrowAdmin(admin.ModelAdmin):
+class BorrowAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_kind = "borrows"
     change_list_template = "partials/change_list.html"
     list_display = ("user_display", "user_id_display", "book", "borrow_date", "due_date", "status_display",
                     "damage_status_view")
     list_filter = (BorrowDateRangeFilter,"status", "damage_status")
     search_fields = ("user__account_name", "book__book_name")
 
-    actions = ["confirm_borrow", "cancel_reservation"]
+    actions = ["confirm_borrow", "cancel_reservation", "export_csv", "export_jsonl"]
 
     fieldsets = (
         ('Thông tin mượn', {
@@ -364,7 +425,13 @@ class BorrowAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        extra_context["stats"] = self.get_stats(request)
+        extra_context["initial_version"] = get_borrows_version()
+        return super().changelist_view(request, extra_context=extra_context)
 
+    @read_from_replica()
+    def get_stats(self, request):
+        """Thống kê chỉ đọc cho đầu trang danh sách: lấy từ replica nếu có."""
         qs = self.get_queryset(request)
         
         # Manually apply the date range filter
@@ -392,7 +459,7 @@ class BorrowAdmin(admin.ModelAdmin):
         today = timezone.now().date()
         last_30_days = today - timedelta(days=30)
 
-        extra_context["stats"] = [
+        return [
             {"label": "Tổng lượt mượn", "value": qs.count()},
             {
                 "label": "30 ngày gần đây",
@@ -403,9 +470,6 @@ class BorrowAdmin(admin.ModelAdmin):
             {"label": "Đã trả", "value": qs.filter(status="returned").count()},
         ]
 
-        extra_context["initial_version"] = get_borrows_version()
-        return super().changelist_view(request, extra_context=extra_context)
-
 
     def get_urls(self):
         urls = super().get_urls()
@@ -432,7 +496,12 @@ class BorrowAdmin(admin.ModelAdmin):
 
     @admin.action(description="Hủy đặt trước (Từ chối)")
     def cancel_reservation(self, request, queryset):
-        deleted_count, _ = queryset.filter(status='reserved').delete()
+        reserved = queryset.filter(status='reserved')
+        books = list(Book.objects.filter(borrow__in=reserved).distinct())
+        with transaction.atomic():
+            deleted_count, _ = reserved.delete()
+            # Suất vừa trống chuyển cho hàng chờ của từng sách
+            WaitlistEntry.promote(*books)
         self.message_user(request, f"Đã hủy {deleted_count} yêu cầu đặt trước.")
         bump_borrows_version()
 
@@ -471,6 +540,70 @@ class BorrowAdmin(admin.ModelAdmin):
         super().message_user(request, message, level, extra_tags, fail_silently)
 
 
-
-
-
+@admin.register(BorrowArchive)
+class BorrowArchiveAdmin(admin.ModelAdmin):
+    """Chỉ xem: phiếu đã trả được archive_borrows chuyển khỏi bảng Borrow."""
+    list_display = ("borrow_id", "user", "book", "borrow_date", "return_date", "fine", "archived_at")
+    list_select_related = ("user", "book")
+    search_fields = ("user__account_name", "user__account_id", "book__book_name")
+    list_filter = ("damage_status",)
+    date_hierarchy = "return_date"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ("book", "user", "created_at")
+    list_select_related = ("book", "user")
+    search_fields = ("user__account_name", "user__account_id", "book__book_name")
+    ordering = ("book", "created_at")
+    raw_id_fields = ("book", "user")
+
+
+class JobRunInline(admin.TabularInline):
+    model = JobRun
+    fields = ("started_at", "status", "duration", "worker")
+    readonly_fields = fields
+    ordering = ("-started_at",)
+    extra = 0
+    max_num = 0
+    can_delete = False
+    show_change_link = True
+
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ("name", "command", "interval_seconds", "enabled", "next_run_at", "last_run_at", "locked_by")
+    list_editable = ("interval_seconds", "enabled")
+    readonly_fields = ("last_run_at", "locked_by", "locked_until")
+    actions = ["run_now"]
+    inlines = [JobRunInline]
+
+    def get_inline_instances(self, request, obj=None):
+        # Chỉ hiện lịch sử khi xem một công việc đã có
+        return super().get_inline_instances(request, obj) if obj else []
+
+    @admin.action(description="Chạy ngay ở lần kiểm tra tới")
+    def run_now(self, request, queryset):
+        updated = queryset.update(next_run_at=timezone.now())
+        self.message_user(request, f"Đã xếp {updated} công việc chạy ngay.")
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    """Chỉ xem: lịch sử chạy của run_scheduler."""
+    list_display = ("job", "status", "started_at", "duration", "worker")
+    list_select_related = ("job",)
+    list_filter = ("status", "job")
+    date_hierarchy = "started_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
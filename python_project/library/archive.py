@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from library.models import Borrow, BorrowArchive
+
+
+# Các cột chung của Borrow và BorrowArchive
+ARCHIVE_FIELDS = (
+    'borrow_id', 'user_id', 'book_id', 'is_notified', 'borrow_date', 'due_date',
+    'return_date', 'updated_at', 'damage_status', 'fine', 'status',
+)
+
+
+def archive_borrows(older_than_days=None, batch_size=1000):
+    """Move returned (and expired) borrows older than ``older_than_days`` into BorrowArchive.
+
+    Each batch is copied and deleted in one transaction. Borrow's delete signals
+    are deliberately not sent: archiving is not un-borrowing, so popularity
+    counts and notifications must not change. Returns the number of rows moved.
+    """
+    if older_than_days is None:
+        older_than_days = settings.BORROW_ARCHIVE_AFTER_DAYS
+    cutoff = date.today() - timedelta(days=older_than_days)
+    candidates = (
+        Borrow.objects
+        .filter(Q(status='returned', return_date__lt=cutoff) | Q(status='expired', borrow_date__lt=cutoff))
+        .order_by('borrow_id')
+    )
+
+    moved = 0
+    last_id = 0
+    while True:
+        rows = list(candidates.filter(borrow_id__gt=last_id).values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            break
+        ids = [row['borrow_id'] for row in rows]
+        archived_at = timezone.now()
+
+        with transaction.atomic():
+            BorrowArchive.objects.bulk_create(
+                [BorrowArchive(archived_at=archived_at, **row) for row in rows],
+                ignore_conflicts=True,
+            )
+            with connection.cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f"DELETE FROM {Borrow._meta.db_table} WHERE borrow_id IN ({placeholders})", ids
+                )
+
+        moved += len(ids)
+        last_id = ids[-1]
+        print(f"   Archived {moved} borrows (up to #{last_id})")
+
+    if moved:
+        from library.signals import bump
+        bump()
+    return moved
+
+
+def borrow_values(*fields, all=True, where=None, **filters):
+    """values_list(*fields) over Borrow and BorrowArchive together.
+
+    ``all`` keeps duplicates (UNION ALL); pass all=False for distinct rows.
+    ``where`` (a Q) and ``filters`` are applied to both tables.
+    """
+    where = where or Q()
+    hot = Borrow.objects.filter(where, **filters).order_by().values_list(*fields)
+    cold = BorrowArchive.objects.filter(where, **filters).order_by().values_list(*fields)
+    return hot.union(cold, all=all)
+
+
+def returned_history(user, statuses=('await_return', 'returned')):
+    """Returned borrows of ``user`` from both tables, newest return first."""
+    related = ('book', 'book__author')
+    hot = list(Borrow.objects.select_related(*related).filter(user=user, status__in=statuses))
+    cold = list(BorrowArchive.objects.select_related(*related).filter(user=user, status__in=statuses))
+    return sorted(
+        hot + cold,
+        key=lambda b: (b.return_date or date.min, b.borrow_id),
+        reverse=True,
+    )
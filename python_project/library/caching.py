@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from library.metrics import CACHE_REQUESTS
+
+
+# Số liệu hit/miss của worker hiện tại (mỗi process một bộ đếm).
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def _count(namespace, outcome):
+    with _stats_lock:
+        _stats[(namespace, outcome)] += 1
+    CACHE_REQUESTS.inc(namespace=namespace, result=outcome)
+
+
+def get_cache_stats():
+    """Return {namespace: {'hit': n, 'stale': n, 'miss': n, 'wait': n}} for this worker."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    stats = {}
+    for (namespace, outcome), count in snapshot.items():
+        stats.setdefault(namespace, {'hit': 0, 'stale': 0, 'miss': 0, 'wait': 0})[outcome] = count
+    return stats
+
+
+def _lock_path(backend, key):
+    return backend._key_to_file(key) + '.lock'
+
+
+def _acquire(backend, key, timeout):
+    """``backend.add(key)`` that is also atomic on FileBasedCache; the lock lapses after ``timeout`` s.
+
+    FileBasedCache.add() is has_key() followed by set(), so two processes can
+    both win it. There the lock is a file created with O_EXCL next to the
+    cache entries instead; a lock file older than ``timeout`` was left by a
+    holder that died and is taken over.
+    """
+    if not isinstance(backend, FileBasedCache):
+        return backend.add(key, 1, timeout)
+    backend._createdir()
+    path = _lock_path(backend, key)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < timeout:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _release(backend, key):
+    if not isinstance(backend, FileBasedCache):
+        backend.delete(key)
+        return
+    try:
+        os.remove(_lock_path(backend, key))
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _serialized(backend, key, timeout=2.0):
+    # Chờ khóa; khóa của process đã chết tự hết hạn sau ``timeout`` giây
+    lock_key = f"{key}:update"
+    while not _acquire(backend, lock_key, timeout):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        _release(backend, lock_key)
+
+
+def _versions():
+    # Khóa phiên bản nằm ở cache riêng không bao giờ cull (settings.CACHES['versions']):
+    # mất khóa phiên bản thì các mục cũ cùng số phiên bản lại được dùng
+    return caches['versions'] if 'versions' in settings.CACHES else caches['default']
+
+
+def get_version(key):
+    backend = _versions()
+    version = backend.get(key)
+    if version is None:
+        with _serialized(backend, key):
+            backend.add(key, 1)
+            version = backend.get(key, 1)
+    return int(version)
+
+
+def bump_version(key):
+    backend = _versions()
+    if isinstance(backend, FileBasedCache):
+        # incr() của FileBasedCache là get() rồi set(): hai lần bump đồng thời chỉ tăng 1
+        with _serialized(backend, key):
+            backend.set(key, int(backend.get(key, 1)) + 1)
+        return
+    try:
+        backend.incr(key)
+    except ValueError:
+        backend.set(key, 2)
+
+
+def cached_call(namespace, key, compute, ttl=60, stale_ttl=600, lock_timeout=30, wait=2.0):
+    """Return ``compute()`` cached under ``key`` with single-flight stale-while-revalidate.
+
+    - fresh entry: returned as is;
+    - stale entry (older than ``ttl`` but younger than ``ttl + stale_ttl``):
+      one caller takes the lock and recomputes, everyone else keeps getting
+      the stale value meanwhile;
+    - no entry: one caller computes, the others wait up to ``wait`` seconds
+      for its result before computing themselves.
+    """
+    cache = caches['default']
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None:
+        if entry['fresh_until'] > now:
+            _count(namespace, 'hit')
+            return entry['value']
+        if not _acquire(cache, lock_key, lock_timeout):
+            _count(namespace, 'stale')
+            return entry['value']
+        _count(namespace, 'miss')
+        return _refresh(cache, key, lock_key, compute, ttl, stale_ttl)
+
+    if _acquire(cache, lock_key, lock_timeout):
+        _count(namespace, 'miss')
+        return _refresh(cache, key, lock_key, compute, ttl, stale_ttl)
+
+    # Someone else is already computing this key.
+    _count(namespace, 'wait')
+    value = _wait_for(cache, key, wait)
+    if value is not _MISSING:
+        return value
+    return compute()
+
+
+def _refresh(cache, key, lock_key, compute, ttl, stale_ttl):
+    try:
+        value = compute()
+        cache.set(key, {'value': value, 'fresh_until': time.time() + ttl}, ttl + stale_ttl)
+        return value
+    finally:
+        _release(cache, lock_key)
+
+
+def _wait_for(cache, key, wait):
+    deadline = time.monotonic() + wait
+    delay = 0.02
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+        delay = min(delay * 2, 0.2)
+    return _MISSING
@@ -0,0 +1,206 @@
+import json
+import os
+from pathlib import Path
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from library.archive import borrow_values
+from library.models import Account, Book, Borrow, BorrowArchive, Category
+
+
+BATCH_SIZE = 50000
+WATERMARK_FILE = "_watermark.json"
+FORMATS = ("parquet", "arrow")
+
+
+def _schemas():
+    import pyarrow as pa
+
+    ts = pa.timestamp("us", tz="UTC")
+    return {
+        "books": (
+            Book.objects.order_by("book_id"),
+            [
+                ("book_id", pa.int64()),
+                ("book_name", pa.string()),
+                ("author_id", pa.int64()),
+                ("publisher_id", pa.int64()),
+                ("publishYear", pa.int32()),
+                ("dateAdd", pa.date32()),
+                ("quantity", pa.int32()),
+                ("available", pa.int32()),
+                ("price", pa.int64()),
+            ],
+        ),
+        "categories": (
+            Category.objects.order_by("category_id"),
+            [
+                ("category_id", pa.int64()),
+                ("category_name", pa.string()),
+            ],
+        ),
+        "book_categories": (
+            Book.categories.through.objects.order_by("id"),
+            [
+                ("book_id", pa.int64()),
+                ("category_id", pa.int64()),
+            ],
+        ),
+        # Không xuất mật khẩu / thông tin liên hệ.
+        "accounts": (
+            Account.objects.order_by("id"),
+            [
+                ("id", pa.int64()),
+                ("account_id", pa.string()),
+                ("user_type", pa.string()),
+                ("status", pa.string()),
+            ],
+        ),
+        # Borrow + BorrowArchive, đọc qua borrow_values() trong export_columnar
+        "borrows": (
+            None,
+            [
+                ("borrow_id", pa.int64()),
+                ("user_id", pa.int64()),
+                ("book_id", pa.int64()),
+                ("status", pa.string()),
+                ("borrow_date", pa.date32()),
+                ("due_date", pa.date32()),
+                ("return_date", pa.date32()),
+                ("damage_status", pa.string()),
+                ("fine", pa.int64()),
+                ("is_notified", pa.bool_()),
+                ("updated_at", ts),
+            ],
+        ),
+    }
+
+
+TABLES = ("books", "categories", "book_categories", "accounts", "borrows")
+
+
+def _iter_batches(queryset, fields, batch_size):
+    import pyarrow as pa
+
+    schema = pa.schema(fields)
+    names = [name for name, _ in fields]
+    columns = [[] for _ in names]
+    rows = queryset.values_list(*names).iterator(chunk_size=min(batch_size, 10000))
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= batch_size:
+            yield pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+            columns = [[] for _ in names]
+    if columns[0]:
+        yield pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+
+
+def _open_writer(path, schema, fmt):
+    import pyarrow as pa
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+def _write(path, fields, batches, fmt, skip_empty=False):
+    """Write batches to ``path`` atomically; returns the row count.
+
+    With ``skip_empty`` no file is created when there are no rows.
+    """
+    import pyarrow as pa
+
+    schema = pa.schema(fields)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    rows = 0
+    writer = None if skip_empty else _open_writer(tmp_path, schema, fmt)
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = _open_writer(tmp_path, schema, fmt)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is not None:
+        os.replace(tmp_path, path)
+    return rows
+
+
+def read_watermark(out_dir):
+    try:
+        return json.loads((Path(out_dir) / WATERMARK_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_watermark(out_dir, watermark):
+    path = Path(out_dir) / WATERMARK_FILE
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(watermark, indent=2))
+    os.replace(tmp_path, path)
+
+
+def export_columnar(out_dir, fmt="parquet", tables=TABLES, incremental=False, batch_size=BATCH_SIZE):
+    """Export the analytics tables to ``out_dir``; returns {table: rows written}.
+
+    Dimension tables are rewritten as full snapshots. Borrows (Borrow and
+    BorrowArchive together) are append-only parts: with ``incremental`` only rows with a borrow_id or updated_at past
+    the stored watermark are written (updated rows re-appear in a later part;
+    readers keep the row with the greatest updated_at per borrow_id).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format: {fmt}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    extension = "parquet" if fmt == "parquet" else "arrow"
+    schemas = _schemas()
+    watermark = read_watermark(out_dir) if incremental else {}
+    started_at = timezone.now()
+    written = {}
+
+    for table in tables:
+        queryset, fields = schemas[table]
+
+        if table != "borrows":
+            written[table] = _write(
+                out_dir / f"{table}.{extension}", fields, _iter_batches(queryset, fields, batch_size), fmt
+            )
+            continue
+
+        # Chốt mốc trước khi đọc để không bỏ sót dòng ghi trong lúc xuất.
+        # archive_borrows giữ nguyên borrow_id / updated_at nên mốc dùng chung cho cả hai bảng.
+        high = max(
+            Borrow.objects.aggregate(max_id=Max("borrow_id"))["max_id"] or 0,
+            BorrowArchive.objects.aggregate(max_id=Max("borrow_id"))["max_id"] or 0,
+        )
+        where = Q(borrow_id__lte=high)
+        mark = watermark.get("borrows")
+        if mark:
+            changed = Q(borrow_id__gt=mark["borrow_id"])
+            if mark.get("updated_at"):
+                changed |= Q(updated_at__gt=mark["updated_at"])
+            where &= changed
+        queryset = borrow_values(*(name for name, _ in fields), where=where).order_by("borrow_id")
+
+        parts_dir = out_dir / "borrows"
+        parts_dir.mkdir(exist_ok=True)
+        if not mark:
+            # Full export: start the part series over.
+            for old in parts_dir.glob(f"part-*.{extension}"):
+                old.unlink()
+        part = parts_dir / f"part-{started_at:%Y%m%dT%H%M%S}.{extension}"
+        written[table] = _write(
+            part, fields, _iter_batches(queryset, fields, batch_size), fmt, skip_empty=True
+        )
+        watermark["borrows"] = {"borrow_id": high, "updated_at": started_at.isoformat()}
+
+    watermark["exported_at"] = started_at.isoformat()
+    _write_watermark(out_dir, watermark)
+    return written
@@ -0,0 +1,307 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+from library.models import Book
+
+
+# Từ dừng phổ biến (tiếng Việt + tiếng Anh), không mang nghĩa phân biệt.
+STOPWORDS = {
+    'và', 'của', 'là', 'các', 'những', 'cho', 'với', 'trong', 'một', 'được',
+    'này', 'có', 'không', 'khi', 'đến', 'từ', 'về', 'theo', 'như', 'người',
+    'đã', 'sẽ', 'thì', 'mà', 'để', 'ở', 'ra', 'vào', 'lại', 'cũng', 'nhiều',
+    'the', 'a', 'an', 'of', 'and', 'or', 'to', 'in', 'on', 'for', 'with', 'is',
+}
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Field weights: a match in the title or on the author/category says more
+# about similarity than a word somewhere in a long description.
+NAME_WEIGHT = 3
+META_WEIGHT = 2
+
+
+def tokenize(text):
+    """Split Vietnamese/English text into syllables plus syllable bigrams.
+
+    Vietnamese words are written as space-separated syllables ("lập trình"),
+    so adjacent syllable pairs are kept as extra terms to capture compounds.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFC', text).lower()
+    syllables = [w for w in WORD_RE.findall(text) if not w.isdigit()]
+
+    terms = [w for w in syllables if w not in STOPWORDS and len(w) > 1]
+    terms.extend(
+        f"{a}_{b}" for a, b in zip(syllables, syllables[1:])
+        if a not in STOPWORDS and b not in STOPWORDS
+    )
+    return terms
+
+
+def book_terms(name, description, author_name, category_names):
+    counts = Counter()
+    for term in tokenize(name):
+        counts[term] += NAME_WEIGHT
+    counts.update(tokenize(description))
+    if author_name:
+        counts[f"author:{unicodedata.normalize('NFC', author_name).lower()}"] += META_WEIGHT
+    for category_name in category_names:
+        counts[f"cat:{unicodedata.normalize('NFC', category_name).lower()}"] += META_WEIGHT
+    return counts
+
+
+def get_index_dir():
+    return Path(getattr(settings, 'CONTENT_INDEX_DIR', settings.BASE_DIR / 'content_index'))
+
+
+def _iter_book_documents():
+    categories = defaultdict(list)
+    through = Book.categories.through.objects.values_list('book_id', 'category__category_name')
+    for book_id, category_name in through.iterator(chunk_size=5000):
+        categories[book_id].append(category_name)
+
+    books = (
+        Book.objects
+        .order_by('book_id')
+        .values_list('book_id', 'book_name', 'description', 'author__author_name')
+    )
+    for book_id, name, description, author_name in books.iterator(chunk_size=2000):
+        yield book_id, book_terms(name, description, author_name, categories.get(book_id, ()))
+
+
+def build_index(min_df=1, max_df_ratio=0.5):
+    """Build the TF-IDF matrix for the whole catalogue and persist it to disk.
+
+    Returns the number of indexed books.
+    """
+    import numpy as np
+
+    doc_ids = []
+    doc_terms = []
+    df = Counter()
+    for book_id, counts in _iter_book_documents():
+        doc_ids.append(book_id)
+        doc_terms.append(counts)
+        df.update(counts.keys())
+
+    n_docs = len(doc_ids)
+    if not n_docs:
+        return 0
+
+    max_df = max(1, int(max_df_ratio * n_docs)) if n_docs > 10 else n_docs
+    vocabulary = {
+        term: i for i, term in enumerate(
+            sorted(t for t, d in df.items() if min_df <= d <= max_df)
+        )
+    }
+    idf = np.zeros(len(vocabulary), dtype=np.float32)
+    for term, col in vocabulary.items():
+        idf[col] = math.log((1 + n_docs) / (1 + df[term])) + 1
+
+    indptr = [0]
+    indices = []
+    data = []
+    for counts in doc_terms:
+        cols, weights = _weigh(counts, vocabulary, idf)
+        indices.extend(cols)
+        data.extend(weights)
+        indptr.append(len(indices))
+
+    csr_indptr = np.asarray(indptr, dtype=np.int64)
+    csr_indices = np.asarray(indices, dtype=np.int32)
+    csr_data = np.asarray(data, dtype=np.float32)
+
+    # Posting lists (CSC) let a query touch only the books sharing a term.
+    rows = np.repeat(np.arange(n_docs, dtype=np.int32), np.diff(csr_indptr))
+    order = np.argsort(csr_indices, kind='stable')
+    csc_indices = rows[order]
+    csc_data = csr_data[order]
+    csc_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(csr_indices, minlength=len(vocabulary)), out=csc_indptr[1:])
+
+    arrays = {
+        'book_ids': np.asarray(doc_ids, dtype=np.int64),
+        'idf': idf,
+        'csr_indptr': csr_indptr,
+        'csr_indices': csr_indices,
+        'csr_data': csr_data,
+        'csc_indptr': csc_indptr,
+        'csc_indices': csc_indices,
+        'csc_data': csc_data,
+    }
+    _write_index(arrays, vocabulary)
+
+    from library.recommendation import invalidate_recommendations
+    invalidate_recommendations()
+    return n_docs
+
+
+def _weigh(counts, vocabulary, idf):
+    cols = []
+    weights = []
+    for term, tf in counts.items():
+        col = vocabulary.get(term)
+        if col is not None:
+            cols.append(col)
+            weights.append((1 + math.log(tf)) * float(idf[col]))
+    norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+    return cols, [w / norm for w in weights]
+
+
+def _write_index(arrays, vocabulary):
+    import numpy as np
+
+    root = get_index_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    version = time.strftime('%Y%m%d%H%M%S') + f"-{os.getpid()}"
+    target = root / version
+    target.mkdir()
+
+    for name, array in arrays.items():
+        np.save(target / f"{name}.npy", array)
+    with (target / 'vocabulary.json').open('w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+
+    # Swap the pointer atomically so running workers never see half an index.
+    pointer = root / 'current.json'
+    tmp_pointer = root / f".current.{os.getpid()}.json"
+    tmp_pointer.write_text(json.dumps({'version': version, 'books': len(arrays['book_ids'])}))
+    os.replace(tmp_pointer, pointer)
+
+    for old in root.iterdir():
+        if old.is_dir() and old.name != version:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+class ContentIndex:
+    """Read-only view of a persisted index; the arrays are memory-mapped."""
+
+    def __init__(self, path, version):
+        import numpy as np
+
+        self.version = version
+        self.book_ids = np.load(path / 'book_ids.npy', mmap_mode='r')
+        self.idf = np.load(path / 'idf.npy', mmap_mode='r')
+        self.csr_indptr = np.load(path / 'csr_indptr.npy', mmap_mode='r')
+        self.csr_indices = np.load(path / 'csr_indices.npy', mmap_mode='r')
+        self.csr_data = np.load(path / 'csr_data.npy', mmap_mode='r')
+        self.csc_indptr = np.load(path / 'csc_indptr.npy', mmap_mode='r')
+        self.csc_indices = np.load(path / 'csc_indices.npy', mmap_mode='r')
+        self.csc_data = np.load(path / 'csc_data.npy', mmap_mode='r')
+        self._vocabulary_path = path / 'vocabulary.json'
+        self._vocabulary = None
+
+    @property
+    def vocabulary(self):
+        # Only needed for books added after the last build.
+        if self._vocabulary is None:
+            with self._vocabulary_path.open(encoding='utf-8') as f:
+                self._vocabulary = json.load(f)
+        return self._vocabulary
+
+    def _row_of(self, book_id):
+        import numpy as np
+
+        pos = int(np.searchsorted(self.book_ids, book_id))
+        if pos < len(self.book_ids) and self.book_ids[pos] == book_id:
+            return pos
+        return None
+
+    def _vector_for_book(self, book_id):
+        row = self._row_of(book_id)
+        if row is not None:
+            start, end = self.csr_indptr[row], self.csr_indptr[row + 1]
+            return list(self.csr_indices[start:end]), list(self.csr_data[start:end])
+
+        # Book added after the index was built: project it with the stored
+        # vocabulary and idf.
+        book = (
+            Book.objects
+            .select_related('author')
+            .prefetch_related('categories')
+            .filter(pk=book_id)
+            .first()
+        )
+        if book is None:
+            return [], []
+        counts = book_terms(
+            book.book_name,
+            book.description,
+            book.author.author_name if book.author_id else '',
+            [c.category_name for c in book.categories.all()],
+        )
+        return _weigh(counts, self.vocabulary, self.idf)
+
+    def similar_to_books(self, book_ids, limit=5, exclude=()):
+        """Return up to ``limit`` book ids most similar to ``book_ids`` (cosine, summed)."""
+        import numpy as np
+
+        query = defaultdict(float)
+        for book_id in book_ids:
+            for col, weight in zip(*self._vector_for_book(book_id)):
+                query[int(col)] += float(weight)
+        if not query:
+            return []
+
+        rows = []
+        scores = []
+        for col, weight in query.items():
+            start, end = self.csc_indptr[col], self.csc_indptr[col + 1]
+            rows.append(self.csc_indices[start:end])
+            scores.append(self.csc_data[start:end] * weight)
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+        if not rows.size:
+            return []
+
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        totals = np.zeros(candidates.size, dtype=np.float64)
+        np.add.at(totals, inverse, scores)
+
+        skip = set(book_ids) | set(exclude)
+        result = []
+        for pos in np.argsort(-totals, kind='stable'):
+            book_id = int(self.book_ids[candidates[pos]])
+            if book_id in skip:
+                continue
+            result.append(book_id)
+            if len(result) >= limit:
+                break
+        return result
+
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def get_content_index():
+    """Return the current on-disk index, reloading it after a rebuild; None if never built."""
+    global _loaded
+
+    pointer = get_index_dir() / 'current.json'
+    try:
+        version = json.loads(pointer.read_text())['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if _loaded is not None and _loaded.version == version:
+        return _loaded
+
+    with _lock:
+        if _loaded is None or _loaded.version != version:
+            try:
+                _loaded = ContentIndex(get_index_dir() / version, version)
+            except OSError:
+                return None
+    return _loaded
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+REPLICA_ALIAS = 'replica'
+# Chỉ model của các app này được đọc từ replica; session/auth luôn ở primary
+# (session mới tạo chưa có trên bản sao).
+REPLICA_APP_LABELS = {'library'}
+
+# Đọc từ replica chỉ khi được bật tường minh (read_from_replica) cho view/service
+# chỉ đọc; sau khi request đã ghi thì mọi lần đọc tiếp theo quay về primary.
+_use_replica = ContextVar('use_replica', default=False)
+_sticky_primary = ContextVar('sticky_primary', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def read_from_replica():
+    """Send reads in this block (or decorated view) to the replica, if one is configured."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary_scope(sticky=False):
+    """Fresh per-request routing state; ``sticky`` pins all reads to the primary."""
+    tokens = (_use_replica.set(False), _sticky_primary.set(sticky), _wrote.set(False))
+    try:
+        yield
+    finally:
+        for var, token in zip((_use_replica, _sticky_primary, _wrote), tokens):
+            var.reset(token)
+
+
+def mark_primary_sticky():
+    _sticky_primary.set(True)
+    _wrote.set(True)
+
+
+def has_written():
+    return _wrote.get()
+
+
+class ReplicaRouter:
+    """Writes always go to 'default'; reads go to the replica only inside read_from_replica()."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or _sticky_primary.get() or not replica_enabled():
+            return 'default'
+        if model._meta.app_label not in REPLICA_APP_LABELS:
+            return 'default'
+        # Đang trong transaction trên primary: đọc cùng kết nối đó
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        mark_primary_sticky()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replica là bản sao do sync_replica chép từ primary
+        return db != REPLICA_ALIAS
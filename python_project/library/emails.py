@@ -0,0 +1,105 @@
+import time
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.html import escape, strip_tags
+
+from library.metrics import EMAIL_SECONDS, EMAILS
+
+
+# Style dùng chung cho mọi email của thư viện (inline vì nhiều trình đọc mail bỏ <style>)
+STYLE_CONTAINER = "font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e5e7eb; border-radius: 10px; background-color: #ffffff;"
+STYLE_TEXT = "font-size: 16px; line-height: 1.6; color: #333333; margin-bottom: 15px;"
+STYLE_HIGHLIGHT = "color: #1851A8; font-weight: 600;"
+STYLE_FOOTER = "margin-top: 30px; font-size: 14px; color: #6b7280; border-top: 1px solid #e5e7eb; padding-top: 15px;"
+
+
+def header_style(color):
+    return f"color: {color}; font-size: 24px; font-weight: 700; margin-bottom: 20px; border-bottom: 2px solid {color}; padding-bottom: 10px;"
+
+
+def render_email(title, color, user_name, intro, details, closing, background='#f3f4f6'):
+    """HTML of a library email: coloured title, greeting, a box of detail lines, closing and signature.
+
+    ``intro``, ``details`` and ``closing`` are HTML; ``user_name`` is escaped.
+    """
+    lines = "\n".join(f'<p style="{STYLE_TEXT} margin: 5px 0;">{line}</p>' for line in details)
+    return f"""
+    <div style="{STYLE_CONTAINER}">
+        <h1 style="{header_style(color)}">{title}</h1>
+        <p style="{STYLE_TEXT}">Chào <strong>{escape(user_name)}</strong>,</p>
+        <p style="{STYLE_TEXT}">{intro}</p>
+
+        <div style="background-color: {background}; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 5px solid {color};">
+            {lines}
+        </div>
+
+        <p style="{STYLE_TEXT}">{closing}</p>
+
+        <div style="{STYLE_FOOTER}">
+            Trân trọng,<br>
+            <strong>Đội ngũ Thư viện Education</strong>
+        </div>
+    </div>
+    """
+
+
+def send_email(kind, user_email, subject, html_content, connection=None):
+    """Send one HTML email (plain-text part from strip_tags), counted under ``kind`` in /metrics.
+
+    Failures are logged, never raised. Returns True when the email was sent.
+    """
+    started = time.perf_counter()
+    try:
+        send_mail(
+            subject=subject,
+            message=strip_tags(html_content),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[user_email],
+            html_message=html_content,
+            fail_silently=False,
+            connection=connection,
+        )
+        EMAILS.inc(kind=kind, result='sent')
+        print(f"HTML Email sent successfully to {user_email}")
+        return True
+    except Exception as e:
+        EMAILS.inc(kind=kind, result='failed')
+        print(f"Lỗi gửi email cho {user_email}: {e}")
+        return False
+    finally:
+        EMAIL_SECONDS.observe(time.perf_counter() - started, kind=kind)
+
+
+def book_line(book_name):
+    return f'📖 Sách: <span style="{STYLE_HIGHLIGHT}">{escape(book_name)}</span>'
+
+
+def send_waitlist_email(borrow, connection=None):
+    if not borrow.user.email:
+        return False
+    html_content = render_email(
+        "Sách Bạn Chờ Đã Có", "#059669", borrow.user.account_name,
+        "Một bản của cuốn sách bạn đang chờ vừa được trả. Thư viện đã tự động <strong>đặt trước</strong> cho bạn.",
+        [book_line(borrow.book.book_name)],
+        "Vui lòng đến thư viện để nhận sách. Nếu không còn nhu cầu, bạn có thể hủy đặt trước "
+        "trong mục \"Sách đã đặt trước\".",
+        background="#ecfdf5",
+    )
+    subject = f"🔔 Thông báo: Sách '{borrow.book.book_name}' bạn chờ đã có"
+    return send_email('waitlist', borrow.user.email, subject, html_content, connection)
+
+
+def send_expired_email(borrow, connection=None):
+    if not borrow.user.email:
+        return False
+    html_content = render_email(
+        "Đặt Trước Đã Hết Hạn", "#6b7280", borrow.user.account_name,
+        f"Sách bạn đặt trước ngày {borrow.borrow_date.strftime('%d/%m/%Y')} không được nhận trong "
+        f"{settings.RESERVATION_HOLD_DAYS} ngày giữ sách, nên lượt đặt trước đã bị hủy và bản sách "
+        "được chuyển cho người khác.",
+        [book_line(borrow.book.book_name)],
+        "Nếu vẫn cần cuốn sách này, bạn có thể đặt trước lại trên trang thư viện.",
+    )
+    subject = f"⌛ Thông báo: Lượt đặt trước sách '{borrow.book.book_name}' đã hết hạn"
+    return send_email('reservation_expired', borrow.user.email, subject, html_content, connection)
@@ -0,0 +1,169 @@
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+from django.db.models import Aggregate, CharField, Value
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from library.archive import borrow_values
+from library.models import Book
+
+
+CHUNK_SIZE = 2000
+
+BOOK_COLUMNS = (
+    ("book_id", "book_id"),
+    ("book_name", "book_name"),
+    ("author_name", "author__author_name"),
+    ("categories", "categories_joined"),
+    ("publisher_name", "publisher__publish_name"),
+    ("publishYear", "publishYear"),
+    ("price", "price"),
+    ("quantity", "quantity"),
+    ("available", "available"),
+    ("dateAdd", "dateAdd"),
+    ("description", "description"),
+)
+
+BORROW_COLUMNS = (
+    ("borrow_id", "borrow_id"),
+    ("account_id", "user__account_id"),
+    ("account_name", "user__account_name"),
+    ("book_id", "book_id"),
+    ("book_name", "book__book_name"),
+    ("status", "status"),
+    ("borrow_date", "borrow_date"),
+    ("due_date", "due_date"),
+    ("return_date", "return_date"),
+    ("damage_status", "damage_status"),
+    ("fine", "fine"),
+)
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+class GroupConcat(Aggregate):
+    """GROUP_CONCAT / STRING_AGG: join a column across the grouped rows."""
+    function = "GROUP_CONCAT"
+    output_field = CharField()
+
+    def __init__(self, expression, separator=", ", **extra):
+        super().__init__(expression, Value(separator), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="STRING_AGG", **extra_context)
+
+
+def book_rows(queryset=None):
+    """Yield one dict per book, with categories joined in SQL (no prefetch)."""
+    qs = Book.objects.all()
+    if queryset is not None:
+        # Re-select by pk so filters joined on categories cannot restrict
+        # which categories get concatenated.
+        qs = qs.filter(pk__in=queryset.values("pk"))
+    qs = (
+        qs.order_by("book_id")
+        .values(*(field for _, field in BOOK_COLUMNS if field != "categories_joined"))
+        .annotate(categories_joined=GroupConcat("categories__category_name"))
+    )
+    for row in qs.iterator(chunk_size=CHUNK_SIZE):
+        yield {name: row[field] for name, field in BOOK_COLUMNS}
+
+
+def borrow_rows(queryset=None):
+    """Yield one dict per borrow: all of Borrow + BorrowArchive, or the rows of ``queryset``."""
+    fields = [field for _, field in BORROW_COLUMNS]
+    if queryset is None:
+        # Phiếu đã lưu trữ vẫn là lịch sử mượn: xuất cả hai bảng
+        qs = borrow_values(*fields).order_by("borrow_id")
+    else:
+        qs = queryset.order_by("borrow_id").values_list(*fields)
+    names = [name for name, _ in BORROW_COLUMNS]
+    for row in qs.iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(names, row))
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(columns, rows, bom=False):
+    writer = csv.writer(_Echo())
+    if bom:
+        yield "\ufeff"
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(["" if row[name] is None else _plain(row[name]) for name, _ in columns])
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps({k: _plain(v) for k, v in row.items()}, ensure_ascii=False) + "\n"
+
+
+def iter_encoded(lines, compress=False, flush_every=64 * 1024):
+    """Encode text chunks to UTF-8 bytes, optionally as a gzip stream.
+
+    Output is batched so the response is not sent one tiny row at a time.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= flush_every:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def iter_export(kind, fmt, queryset=None):
+    if kind == "books":
+        columns, rows = BOOK_COLUMNS, book_rows(queryset)
+    elif kind == "borrows":
+        columns, rows = BORROW_COLUMNS, borrow_rows(queryset)
+    else:
+        raise ValueError(f"Unknown export: {kind}")
+
+    if fmt == "csv":
+        return iter_csv(columns, rows)
+    if fmt == "jsonl":
+        return iter_jsonl(rows)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def streaming_export_response(kind, fmt="csv", compress=False, queryset=None):
+    lines = iter_export(kind, fmt, queryset)
+    filename = f"{kind}-{timezone.localdate():%Y%m%d}.{fmt}"
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+    else:
+        content_type = CONTENT_TYPES[fmt]
+
+    response = StreamingHttpResponse(iter_encoded(lines, compress=compress), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,26 @@
+import io
+import traceback
+
+
+# Điểm vào của các process con chạy job (run_scheduler --processes). Module này
+# không import Django khi nạp, để process "spawn" unpickle được trước django.setup().
+
+
+def init_process():
+    import django
+    django.setup()
+
+
+def execute_command(command, args):
+    """Run one management command and return (ok, output). Used in threads and child processes."""
+    from django.core.management import call_command
+    from django.db import connections
+
+    out = io.StringIO()
+    try:
+        call_command(command, *args, stdout=out, stderr=out)
+        return True, out.getvalue()
+    except BaseException:
+        return False, out.getvalue() + traceback.format_exc()
+    finally:
+        connections.close_all()
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.archive import archive_borrows
+
+
+class Command(BaseCommand):
+    help = 'Move old returned borrows from Borrow into BorrowArchive (run daily/weekly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.BORROW_ARCHIVE_AFTER_DAYS,
+            help=f'Archive borrows returned more than N days ago (default: {settings.BORROW_ARCHIVE_AFTER_DAYS}).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows moved per transaction (default: 1000).'
+        )
+
+    def handle(self, *args, **options):
+        moved = archive_borrows(options['older_than_days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} borrows.'))
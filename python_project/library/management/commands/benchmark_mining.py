@@ -0,0 +1,125 @@
+import random
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management.base import BaseCommand
+
+from library.recommendation import MINING_ALGORITHMS, RecommendationService
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rule mining algorithms on synthetic borrow histories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--baskets',
+            type=int,
+            default=5000,
+            help='Number of synthetic monthly baskets (default: 5000)'
+        )
+        parser.add_argument(
+            '--books',
+            type=int,
+            default=500,
+            help='Catalogue size (default: 500)'
+        )
+        parser.add_argument(
+            '--basket-size',
+            type=int,
+            default=4,
+            help='Average number of books per basket (default: 4)'
+        )
+        parser.add_argument(
+            '--min-support',
+            type=float,
+            nargs='+',
+            default=[0.01],
+            help='One or more minimum support thresholds to try (default: 0.01)'
+        )
+        parser.add_argument(
+            '--min-confidence',
+            type=float,
+            default=0.1,
+            help='Minimum confidence threshold (default: 0.1)'
+        )
+        parser.add_argument(
+            '--min-lift',
+            type=float,
+            default=1.0,
+            help='Minimum lift threshold (default: 1.0)'
+        )
+        parser.add_argument(
+            '--algorithms',
+            nargs='+',
+            choices=MINING_ALGORITHMS,
+            default=list(MINING_ALGORITHMS),
+            help='Algorithms to compare (default: all)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic data (default: 42)'
+        )
+
+    def handle(self, *args, **options):
+        # Mining imports pandas/mlxtend/scipy lazily; load them up front so the
+        # first algorithm measured does not pay for the imports.
+        import mlxtend.frequent_patterns  # noqa: F401
+        import pandas  # noqa: F401
+        import scipy.sparse  # noqa: F401
+
+        transactions = self.generate_transactions(
+            options['baskets'],
+            options['books'],
+            options['basket_size'],
+            options['seed'],
+        )
+        self.stdout.write(self.style.NOTICE(
+            f"Generated {len(transactions)} baskets over {options['books']} books"
+        ))
+
+        header = f"{'algorithm':<14}{'min_support':>12}{'time (s)':>12}{'peak (MB)':>12}{'rules':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for min_support in options['min_support']:
+            for algorithm in options['algorithms']:
+                service = RecommendationService(
+                    min_support=min_support,
+                    min_confidence=options['min_confidence'],
+                    min_lift=options['min_lift'],
+                    algorithm=algorithm
+                )
+                elapsed, peak, num_rules = self.run_once(service, transactions)
+                self.stdout.write(
+                    f"{algorithm:<14}{min_support:>12g}{elapsed:>12.3f}{peak / 1024 / 1024:>12.1f}{num_rules:>10}"
+                )
+
+    def run_once(self, service, transactions):
+        tracemalloc.start()
+        start = time.perf_counter()
+        # The service logs its progress with print(); keep the table readable.
+        with redirect_stdout(StringIO()):
+            rules = service.mine_rules_from_transactions(transactions)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak, len(rules)
+
+    @staticmethod
+    def generate_transactions(num_baskets, num_books, basket_size, seed):
+        rng = random.Random(seed)
+        # Zipf-like popularity: a few books are borrowed far more than the rest.
+        weights = [1.0 / (rank + 1) for rank in range(num_books)]
+        book_ids = list(range(1, num_books + 1))
+
+        transactions = []
+        for _ in range(num_baskets):
+            size = max(2, int(rng.expovariate(1.0 / basket_size)) + 1)
+            basket = set(rng.choices(book_ids, weights=weights, k=size))
+            if len(basket) >= 2:
+                transactions.append(list(basket))
+        return transactions
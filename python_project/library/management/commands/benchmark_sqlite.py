@@ -0,0 +1,144 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+READ_QUERIES = (
+    # Danh sách sách (trang catalog)
+    "SELECT book_id, book_name, available FROM library_book ORDER BY book_name LIMIT 30",
+    # Panel "đang mượn" của một người dùng
+    "SELECT b.borrow_id, b.status, b.due_date, k.book_name FROM library_borrow b "
+    "JOIN library_book k ON k.book_id = b.book_id "
+    "WHERE b.user_id = ? AND b.status IN ('pending', 'borrowed') ORDER BY b.borrow_date DESC",
+)
+
+
+class Profile:
+    """How the benchmark opens connections: like the old settings, or like the current ones."""
+
+    def __init__(self, name, pragmas, persistent, begin):
+        self.name = name
+        self.pragmas = pragmas
+        self.persistent = persistent
+        self.begin = begin
+
+    def connect(self, path):
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        for key, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {key}={value}")
+        return conn
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite read throughput / write latency with default vs tuned connection settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run (default: 5).")
+        parser.add_argument("--readers", type=int, default=4, help="Reader threads (default: 4).")
+        parser.add_argument("--writers", type=int, default=2, help="Writer threads (default: 2).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only applies to SQLite databases.")
+
+        profiles = [
+            Profile("default", {"journal_mode": "DELETE"}, persistent=False, begin="BEGIN"),
+            Profile("tuned", settings.SQLITE_PRAGMAS, persistent=True, begin="BEGIN IMMEDIATE"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            for profile in profiles:
+                # Mỗi cấu hình chạy trên một bản sao riêng của CSDL
+                path = Path(tmp) / f"{profile.name}.sqlite3"
+                self.copy_database(path)
+                result = self.run(profile, str(path), options)
+                self.report(profile.name, result)
+
+    def copy_database(self, path):
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        with target:
+            connection.connection.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+        target.close()
+
+    def run(self, profile, path, options):
+        setup = sqlite3.connect(path)
+        user_ids = [r[0] for r in setup.execute("SELECT id FROM library_account")] or [0]
+        book_ids = [r[0] for r in setup.execute("SELECT book_id FROM library_book")] or [0]
+        setup.close()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        result = {"reads": 0, "write_latencies": [], "errors": 0}
+
+        def with_connection(op):
+            def loop():
+                conn = profile.connect(path) if profile.persistent else None
+                while not stop.is_set():
+                    c = conn or profile.connect(path)
+                    try:
+                        op(c)
+                    except sqlite3.OperationalError:
+                        with lock:
+                            result["errors"] += 1
+                    finally:
+                        if conn is None:
+                            c.close()
+                if conn is not None:
+                    conn.close()
+            return loop
+
+        def read(conn):
+            conn.execute(READ_QUERIES[0]).fetchall()
+            conn.execute(READ_QUERIES[1], (random.choice(user_ids),)).fetchall()
+            with lock:
+                result["reads"] += 2
+
+        def write(conn):
+            # Giống Borrow.save: đọc số lượng còn lại rồi ghi lại trong cùng giao dịch
+            book_id = random.choice(book_ids)
+            started = time.perf_counter()
+            try:
+                conn.execute(profile.begin)
+                row = conn.execute("SELECT available FROM library_book WHERE book_id = ?", (book_id,)).fetchone()
+                conn.execute(
+                    "UPDATE library_book SET available = ? WHERE book_id = ?", (row[0] if row else 0, book_id)
+                )
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            with lock:
+                result["write_latencies"].append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+        threads = [threading.Thread(target=with_connection(read)) for _ in range(options["readers"])]
+        threads += [threading.Thread(target=with_connection(write)) for _ in range(options["writers"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for t in threads:
+            t.join()
+        result["elapsed"] = time.perf_counter() - started
+        return result
+
+    def report(self, name, result):
+        latencies = sorted(result["write_latencies"]) or [0.0]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{name:8} reads/s={result['reads'] / result['elapsed']:,.0f} "
+            f"writes={len(result['write_latencies'])} "
+            f"write p50={statistics.median(latencies) * 1000:.2f}ms p95={p95 * 1000:.2f}ms "
+            f"locked errors={result['errors']}"
+        ))
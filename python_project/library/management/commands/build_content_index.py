@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from library.content_index import build_index, get_index_dir
+
+
+class Command(BaseCommand):
+    help = 'Build the TF-IDF content similarity index over book name, description, author and categories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-df',
+            type=int,
+            default=1,
+            help='Ignore terms that appear in fewer books than this (default: 1)'
+        )
+        parser.add_argument(
+            '--max-df',
+            type=float,
+            default=0.5,
+            help='Ignore terms that appear in more than this fraction of books (default: 0.5)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Building content index...'))
+
+        count = build_index(min_df=options['min_df'], max_df_ratio=options['max_df'])
+
+        if count > 0:
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} books into {get_index_dir()}'))
+        else:
+            self.stdout.write(self.style.WARNING('No books to index.'))
@@ -0,0 +1,74 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from library.models import Book
+from library.renditions import (
+    RENDITIONS, cache_key, get_format, render_file, rendition_cache, rendition_name, rendition_targets,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail/card/detail renditions for existing book images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            choices=sorted(RENDITIONS),
+            default=list(RENDITIONS),
+            help="Rendition sizes to build (default: all).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (default: CPU count).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render even if an up-to-date rendition exists.",
+        )
+
+    def handle(self, *args, **options):
+        fmt = get_format()
+        sizes = options["sizes"]
+        names = sorted(set(
+            Book.objects.exclude(image="").exclude(image__isnull=True).values_list("image", flat=True)
+        ))
+        cache = rendition_cache()
+        started = time.perf_counter()
+        done = failed = 0
+
+        # Ảnh được xử lý ở các process con (Pillow giữ GIL khi resize/nén)
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            futures = {
+                pool.submit(
+                    render_file, default_storage.path(name), rendition_targets(name, sizes, fmt), fmt, options["force"]
+                ): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    dimensions = future.result()
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stderr.write(f"  {name}: {e}")
+                    continue
+                for size, (width, height) in dimensions.items():
+                    cache.set(cache_key(name, size), {
+                        "url": default_storage.url(rendition_name(name, size, fmt)),
+                        "width": width,
+                        "height": height,
+                    }, None)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {done} images ({', '.join(sizes)} as {fmt}), {failed} failed "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Compute item-item collaborative filtering neighbours from borrow history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=20,
+            help='Number of neighbours stored per book (default: 20)'
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=512,
+            help='Books per similarity block; bounds peak memory (default: 512)'
+        )
+        parser.add_argument(
+            '--min-score',
+            type=float,
+            default=0.0,
+            help='Discard neighbours with cosine similarity at or below this value (default: 0.0)'
+        )
+
+    def handle(self, *args, **options):
+        from library.mining import ItemSimilarityBuilder
+
+        self.stdout.write(self.style.NOTICE('Building item-item similarities...'))
+
+        builder = ItemSimilarityBuilder(
+            neighbours=options['neighbours'],
+            block_size=options['block_size'],
+            min_score=options['min_score']
+        )
+        count = builder.build()
+
+        if count > 0:
+            self.stdout.write(self.style.SUCCESS(f'Stored {count} neighbours.'))
+        else:
+            self.stdout.write(self.style.WARNING('No similarities computed. You may need more borrow data.'))
@@ -0,0 +1,223 @@
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.archive import borrow_values
+from library.mining import MINING_ALGORITHMS
+from library.models import Account, Book
+from library.recommendation import RecommendationService, _get_engine
+
+
+class Command(BaseCommand):
+    help = 'Offline evaluation (temporal split) and serving latency benchmark for recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine',
+            choices=('rules', 'itemcf', 'popular'),
+            default='rules',
+            help='Engine trained on the train split (default: rules)'
+        )
+        parser.add_argument(
+            '--algorithm',
+            choices=MINING_ALGORITHMS,
+            default='sparse-pairs',
+            help='Mining algorithm for the rules engine (default: sparse-pairs)'
+        )
+        parser.add_argument('--min-support', type=float, default=0.01)
+        parser.add_argument('--min-confidence', type=float, default=0.1)
+        parser.add_argument('--min-lift', type=float, default=1.0)
+        parser.add_argument(
+            '--test-fraction',
+            type=float,
+            default=0.2,
+            help='Most recent fraction of borrows held out for testing (default: 0.2)'
+        )
+        parser.add_argument(
+            '-k',
+            type=int,
+            nargs='+',
+            default=[5, 10],
+            help='Cut-offs for hit-rate@K (default: 5 10)'
+        )
+        parser.add_argument(
+            '--latency-samples',
+            type=int,
+            default=200,
+            help='Requests per serving method in the latency benchmark; 0 to skip (default: 200)'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        split_date = self.get_split_date(options['test_fraction'])
+        # Borrow + BorrowArchive: archived history belongs to the train/test data too
+        train = {'borrow_date__lt': split_date}
+        test = {'borrow_date__gte': split_date}
+
+        self.stdout.write(self.style.NOTICE(
+            f"Split at {split_date}: {borrow_values('borrow_id', **train).count()} train / "
+            f"{borrow_values('borrow_id', **test).count()} test borrows"
+        ))
+
+        history = defaultdict(set)
+        popularity = Counter()
+        for user_id, book_id in borrow_values('user_id', 'book_id', **train).iterator(chunk_size=5000):
+            history[user_id].add(book_id)
+            popularity[book_id] += 1
+
+        held_out = defaultdict(set)
+        for user_id, book_id in borrow_values('user_id', 'book_id', **test).iterator(chunk_size=5000):
+            if book_id not in history[user_id]:
+                held_out[user_id].add(book_id)
+
+        popular = [book_id for book_id, _ in popularity.most_common()]
+
+        with redirect_stdout(StringIO()):
+            neighbours = self.train(options, train)
+
+        self.report_quality(options, history, held_out, neighbours, popular)
+
+        if options['latency_samples'] > 0:
+            self.report_latency(options['latency_samples'], options['seed'])
+
+    def get_split_date(self, test_fraction):
+        if not 0 < test_fraction < 1:
+            raise CommandError('--test-fraction must be between 0 and 1.')
+
+        dates = borrow_values('borrow_date')
+        total = dates.count()
+        if total < 10:
+            raise CommandError('Not enough borrows to evaluate.')
+
+        position = int(total * (1 - test_fraction))
+        return dates.order_by('borrow_date')[position][0]
+
+    def train(self, options, train):
+        """Return {book_id: [(neighbour_id, score), ...]} learned from the train split."""
+        neighbours = defaultdict(list)
+
+        if options['engine'] == 'rules':
+            service = RecommendationService(
+                min_support=options['min_support'],
+                min_confidence=options['min_confidence'],
+                min_lift=options['min_lift'],
+                algorithm=options['algorithm'],
+            )
+            miner = service._get_miner()
+            transactions = miner._get_monthly_baskets(**train)
+            for ant, cons, _, confidence, lift in miner.mine_rules_from_transactions(transactions):
+                neighbours[ant].append((cons, lift * confidence))
+
+        elif options['engine'] == 'itemcf':
+            from library.mining import ItemSimilarityBuilder
+
+            builder = ItemSimilarityBuilder()
+            matrix, book_ids = builder._build_matrix(**train)
+            if matrix.nnz:
+                for book_id, similar_id, score in builder.iter_neighbours(matrix, book_ids):
+                    neighbours[book_id].append((similar_id, score))
+
+        return neighbours
+
+    def recommend(self, seen, neighbours, popular, limit):
+        # Same scoring as the serving path: sum of neighbour scores over the
+        # user's history, then popularity to fill the list.
+        scores = defaultdict(float)
+        for book_id in seen:
+            for neighbour_id, score in neighbours.get(book_id, ()):
+                if neighbour_id not in seen:
+                    scores[neighbour_id] += score
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        if len(ranked) < limit:
+            chosen = set(ranked)
+            for book_id in popular:
+                if book_id not in seen and book_id not in chosen:
+                    ranked.append(book_id)
+                    if len(ranked) >= limit:
+                        break
+        return ranked
+
+    def report_quality(self, options, history, held_out, neighbours, popular):
+        ks = sorted(options['k'])
+        max_k = ks[-1]
+
+        hits = Counter()
+        reciprocal_ranks = []
+        recommended = set()
+        from_model = 0
+
+        for user_id, relevant in held_out.items():
+            seen = history.get(user_id, set())
+            ranked = self.recommend(seen, neighbours, popular, max_k)
+            recommended.update(ranked)
+            if any(neighbours.get(book_id) for book_id in seen):
+                from_model += 1
+
+            rank = next((i + 1 for i, book_id in enumerate(ranked) if book_id in relevant), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+            for k in ks:
+                if rank and rank <= k:
+                    hits[k] += 1
+
+        users = len(held_out)
+        if not users:
+            self.stdout.write(self.style.WARNING('No test users with unseen books; nothing to evaluate.'))
+            return
+
+        catalogue = Book.objects.count() or 1
+        self.stdout.write(f"Engine: {options['engine']}  ({len(neighbours)} books with neighbours)")
+        self.stdout.write(f"Test users: {users}  (served by model: {from_model}, popularity only: {users - from_model})")
+        for k in ks:
+            self.stdout.write(f"  hit-rate@{k}: {hits[k] / users:.4f}")
+        self.stdout.write(f"  MRR@{max_k}:     {sum(reciprocal_ranks) / users:.4f}")
+        self.stdout.write(f"  coverage:    {len(recommended) / catalogue:.4f} ({len(recommended)}/{catalogue} books)")
+
+    def report_latency(self, samples, seed):
+        rng = random.Random(seed)
+        account_ids = list(Account.objects.values_list('pk', flat=True))
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        if not account_ids or not book_ids:
+            return
+
+        # Synthetic request population: uniformly sampled users and books,
+        # with repeats, like real traffic hitting the cache.
+        accounts = {a.pk: a for a in Account.objects.filter(pk__in=set(rng.choices(account_ids, k=samples)))}
+        user_requests = [accounts[pk] for pk in rng.choices(list(accounts), k=samples)]
+        book_requests = rng.choices(book_ids, k=samples)
+
+        engine = _get_engine(None)
+        self.stdout.write('')
+        self.stdout.write(f"Serving engine: {engine}")
+        self.stdout.write(f"{'method':<34}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+        self.print_latency(
+            'get_recommendations_for_user (raw)',
+            [lambda a=a: RecommendationService._compute_recommendations_for_user(a, 6, engine) for a in user_requests],
+        )
+        self.print_latency(
+            'get_recommendations_for_user',
+            [lambda a=a: RecommendationService.get_recommendations_for_user(a, limit=6) for a in user_requests],
+        )
+        self.print_latency(
+            'get_recommendations_for_book (raw)',
+            [lambda b=b: RecommendationService._compute_recommendations_for_book(b, 5, engine) for b in book_requests],
+        )
+        self.print_latency(
+            'get_recommendations_for_book',
+            [lambda b=b: RecommendationService.get_recommendations_for_book(b, limit=5) for b in book_requests],
+        )
+
+    def print_latency(self, label, calls):
+        timings = []
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"{label:<34}{p50:>10.2f}{p95:>10.2f}")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.reservations import expire_reservations
+
+
+class Command(BaseCommand):
+    help = 'Expire reservations not picked up within the hold period and promote the waitlists (run hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hold-days',
+            type=int,
+            default=settings.RESERVATION_HOLD_DAYS,
+            help=f'Expire reservations made more than N days ago (default: {settings.RESERVATION_HOLD_DAYS}).'
+        )
+
+    def handle(self, *args, **options):
+        expired, promoted = expire_reservations(options['hold_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} reservations, {promoted} waitlisted users got a copy.'
+        ))
@@ -1,7 +1,6 @@
-import csv
 from pathlib import Path
 from django.core.management.base import BaseCommand
-from library.models import Book
+from library.exports import BOOK_COLUMNS, book_rows, iter_csv, iter_encoded, iter_jsonl
 
 class Command(BaseCommand):
     help = "Export all books to a CSV file for analysis/TF-IDF."
@@ -18,57 +17,44 @@ class Command(BaseCommand):
             action="store_true",
             help="Write UTF-8 BOM for Excel compatibility (Windows).",
         )
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            default="csv",
+            help="Output format (default: csv).",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Gzip-compress the output.",
+        )
 
     def handle(self, *args, **options):
         output = options["output"]
         bom = options["bom"]
 
-        # Chọn encoding: utf-8-sig (có BOM) để mở bằng Excel đỡ lỗi font
-        encoding = "utf-8-sig" if bom else "utf-8"
-
         # Bảo đảm thư mục đích tồn tại
         out_path = Path(output)
         out_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Tối ưu truy vấn
-        qs = (
-            Book.objects
-            .select_related("author", "publisher")
-            .prefetch_related("categories")
-            .all()
-            .order_by("book_name")
-        )
-
-        with out_path.open("w", newline="", encoding=encoding) as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "book_id",
-                "book_name",
-                "author_name",
-                "categories",
-                "publisher_name",
-                "publishYear",
-                "price",
-                "quantity",
-                "available",
-                "dateAdd",
-            ])
+        # Đọc theo từng khối, thể loại được gộp bằng SQL nên bộ nhớ không tăng theo số sách
+        count = 0
 
-            count = 0
-            for b in qs:
-                cats = ", ".join(c.category_name for c in b.categories.all())
-                writer.writerow([
-                    b.book_id,
-                    b.book_name,
-                    b.author.author_name if b.author_id else "",
-                    cats,
-                    b.publisher.publish_name if b.publisher_id else "",
-                    b.publishYear or "",
-                    b.price or 0,
-                    b.quantity or 0,
-                    b.available or 0,
-                    b.dateAdd.isoformat() if b.dateAdd else "",
-                ])
+        def counted(rows):
+            nonlocal count
+            for row in rows:
                 count += 1
+                yield row
+
+        rows = counted(book_rows())
+        if options["format"] == "jsonl":
+            lines = iter_jsonl(rows)
+        else:
+            # utf-8-sig (có BOM) để mở bằng Excel đỡ lỗi font
+            lines = iter_csv(BOOK_COLUMNS, rows, bom=bom)
+
+        with out_path.open("wb") as f:
+            for chunk in iter_encoded(lines, compress=options["gzip"]):
+                f.write(chunk)
 
-        self.stdout.write(self.style.SUCCESS(f"Exported {count} books to {out_path.resolve()} (encoding={encoding})"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} books to {out_path.resolve()} (format={options['format']})"))
@@ -0,0 +1,193 @@
+import csv
+import gzip
+import io
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.models import Account
+
+
+FIELDS = ("account_name", "email", "username", "password", "phone", "status", "user_type")
+USER_TYPES = {code for code, _ in Account.USER_TYPE_CHOICES}
+STATUSES = {code for code, _ in Account.STATUS_CHOICES}
+
+
+def _open_text(path):
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig")
+    return path.open(encoding="utf-8-sig", newline="")
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert accounts from an enrollment CSV/JSONL keyed on account_id. "
+        "New accounts without a password get a random one, written to --password-file "
+        "(never to the console). Admin rows are refused unless --allow-admin is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, optionally .gz")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Input format (default: guessed from the file extension).",
+        )
+        parser.add_argument(
+            "--user-type",
+            choices=sorted(USER_TYPES - {"admin"}),
+            help="Default user_type for rows without one; also limits --deactivate-missing to this type.",
+        )
+        parser.add_argument(
+            "--deactivate-missing",
+            action="store_true",
+            help="Set status=inactive on accounts (never admins) that are not in the file.",
+        )
+        parser.add_argument(
+            "--allow-admin",
+            action="store_true",
+            help="Accept rows that create admins or touch existing admin accounts (refused by default).",
+        )
+        parser.add_argument(
+            "--password-file",
+            help="CSV receiving the generated passwords (account_id, username, password); "
+                 "must not exist yet (default: <input>-passwords.csv next to the input file).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Rows per bulk insert/update (default: 2000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would change.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+        fmt = options["format"] or ("jsonl" if ".jsonl" in path.suffixes or ".json" in path.suffixes else "csv")
+        password_file = Path(options["password_file"] or path.with_name(f"{path.name.split('.')[0]}-passwords.csv"))
+        if password_file.exists() and not options["dry_run"]:
+            raise CommandError(f"{password_file} already exists: move it away or pass another --password-file.")
+        started = time.perf_counter()
+
+        # Một lần đọc: account_id -> (id, các trường hiện tại)
+        existing = {
+            row[0]: (row[1], row[2:])
+            for row in Account.objects.values_list("account_id", "id", *FIELDS).iterator(chunk_size=5000)
+        }
+
+        to_create = []
+        to_update = []
+        seen = set()
+        invalid = []
+        refused_admins = []
+        self.generated = []
+
+        with _open_text(path) as f:
+            rows = csv.DictReader(f) if fmt == "csv" else (json.loads(line) for line in f if line.strip())
+            for line_no, raw in enumerate(rows, start=1):
+                account_id = str(raw.get("account_id") or "").strip()
+                if not account_id or account_id in seen:
+                    invalid.append(line_no)
+                    continue
+
+                current = existing.get(account_id)
+                values = self.clean(raw, account_id, current, options["user_type"])
+                if values is None:
+                    invalid.append(line_no)
+                    continue
+                is_admin = values["user_type"] == "admin" or (
+                    current is not None and current[1][FIELDS.index("user_type")] == "admin"
+                )
+                if is_admin and not options["allow_admin"]:
+                    refused_admins.append(line_no)
+                    continue
+                seen.add(account_id)
+
+                if current is None:
+                    to_create.append(Account(account_id=account_id, **values))
+                elif tuple(values[f] for f in FIELDS) != tuple(current[1]):
+                    to_update.append(Account(id=current[0], account_id=account_id, **values))
+
+        to_deactivate = []
+        if options["deactivate_missing"]:
+            scope = options["user_type"]
+            to_deactivate = [
+                pk for account_id, (pk, fields) in existing.items()
+                if account_id not in seen
+                and fields[FIELDS.index("status")] != "inactive"
+                and fields[FIELDS.index("user_type")] != "admin"
+                and (scope is None or fields[FIELDS.index("user_type")] == scope)
+            ]
+
+        if not options["dry_run"]:
+            batch_size = options["batch_size"]
+            with transaction.atomic():
+                Account.objects.bulk_create(to_create, batch_size=batch_size)
+                Account.objects.bulk_update(to_update, FIELDS, batch_size=batch_size)
+                for start in range(0, len(to_deactivate), batch_size):
+                    Account.objects.filter(id__in=to_deactivate[start:start + batch_size]).update(status="inactive")
+            if self.generated:
+                self.write_passwords(password_file, self.generated)
+                self.stdout.write(f"{len(self.generated)} generated passwords written to {password_file}")
+
+        if invalid:
+            preview = ", ".join(str(n) for n in invalid[:10])
+            self.stdout.write(self.style.WARNING(f"{len(invalid)} invalid or duplicate rows (lines {preview}...)"))
+
+        if refused_admins:
+            preview = ", ".join(str(n) for n in refused_admins[:10])
+            self.stdout.write(self.style.WARNING(
+                f"{len(refused_admins)} admin rows refused (lines {preview}...): pass --allow-admin to import them"
+            ))
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}created {len(to_create)}, updated {len(to_update)}, "
+            f"deactivated {len(to_deactivate)}, unchanged {len(seen) - len(to_create) - len(to_update)} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def clean(self, raw, account_id, current, default_user_type):
+        old = dict(zip(FIELDS, current[1])) if current else {}
+
+        def pick(field, limit):
+            value = str(raw.get(field) or "").strip()
+            return value[:limit] if value else old.get(field, "")
+
+        values = {
+            "account_name": pick("account_name", 100),
+            "email": pick("email", 254),
+            "username": pick("username", 50) or account_id[:50],
+            "password": pick("password", 128),
+            "phone": pick("phone", 20),
+            "status": pick("status", 10) or "active",
+            "user_type": pick("user_type", 20) or default_user_type or "student",
+        }
+        if not values["account_name"]:
+            return None
+        if values["status"] not in STATUSES or values["user_type"] not in USER_TYPES:
+            return None
+        if not values["password"] and current is None:
+            # Không dùng account_id làm mật khẩu: ai biết mã sinh viên cũng đăng nhập được
+            values["password"] = secrets.token_urlsafe(12)
+            self.generated.append((account_id, values["username"], values["password"]))
+        return values
+
+    def write_passwords(self, path, rows):
+        # Tạo mới với quyền 0600: file chứa mật khẩu dạng rõ
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("account_id", "username", "password"))
+            writer.writerows(rows)
@@ -0,0 +1,184 @@
+import csv
+import gzip
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.models import Author, Book, Category, Publisher
+
+
+def _open_text(path):
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig")
+    return path.open(encoding="utf-8-sig", newline="")
+
+
+def _int_or_none(value):
+    if value in (None, ""):
+        return None
+    return int(float(value))
+
+
+class Command(BaseCommand):
+    help = "Bulk import books from CSV/JSONL (same columns as export_books_csv)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, optionally .gz")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Input format (default: guessed from the file extension).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Rows per transaction (default: 2000).",
+        )
+        parser.add_argument(
+            "--allow-duplicates",
+            action="store_true",
+            help="Import rows even if a book with the same name and author exists.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+
+        fmt = options["format"] or ("jsonl" if ".jsonl" in path.suffixes or ".json" in path.suffixes else "csv")
+        self.skip_existing = not options["allow_duplicates"]
+
+        # Bộ nhớ đệm tra cứu: tên -> id, nạp một lần cho cả lần import.
+        self.authors = dict(Author.objects.values_list("author_name", "author_id").order_by("-author_id"))
+        self.publishers = dict(Publisher.objects.values_list("publish_name", "publish_id"))
+        self.categories = dict(Category.objects.values_list("category_name", "category_id"))
+        self.existing = set()
+        if self.skip_existing:
+            self.existing = set(Book.objects.values_list("book_name", "author__author_name"))
+
+        self.stats = {"created": 0, "skipped": 0, "invalid": 0}
+        started = time.perf_counter()
+
+        with _open_text(path) as f:
+            rows = csv.DictReader(f) if fmt == "csv" else (json.loads(line) for line in f if line.strip())
+            processed = 0
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                processed += len(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {processed} rows, {self.stats['created']} created "
+                    f"({processed / elapsed:,.0f} rows/s)"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.stats['created']} books "
+            f"({self.stats['skipped']} duplicates skipped, {self.stats['invalid']} invalid rows) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def parse_row(self, row):
+        name = (row.get("book_name") or "").strip()
+        author = (row.get("author_name") or "").strip()
+        publisher = (row.get("publisher_name") or "").strip()
+        if not name or not author or not publisher:
+            return None
+
+        categories = row.get("categories") or []
+        if isinstance(categories, str):
+            categories = categories.split(",")
+        categories = [c.strip() for c in categories if c and c.strip()]
+
+        quantity = _int_or_none(row.get("quantity"))
+        available = _int_or_none(row.get("available"))
+        return {
+            "book_name": name[:200],
+            "author_name": author[:100],
+            "publisher_name": publisher[:200],
+            "categories": categories,
+            "publishYear": _int_or_none(row.get("publishYear")),
+            "price": _int_or_none(row.get("price")) or 0,
+            "quantity": 5 if quantity is None else quantity,
+            "available": available if available is not None else (5 if quantity is None else quantity),
+            "description": row.get("description") or "",
+        }
+
+    @staticmethod
+    def resolve(cache, model, name_field, pk_field, names):
+        """Create the names missing from ``cache`` in bulk and record their ids."""
+        missing = sorted({n for n in names if n not in cache})
+        if not missing:
+            return
+        created = model.objects.bulk_create(
+            [model(**{name_field: n}) for n in missing],
+            ignore_conflicts=model is not Author,
+        )
+        if all(getattr(obj, pk_field) is not None for obj in created):
+            for obj in created:
+                cache[getattr(obj, name_field)] = getattr(obj, pk_field)
+        else:
+            # Backend không trả về khóa chính sau bulk_create: tra lại một lần.
+            cache.update(model.objects.filter(**{f"{name_field}__in": missing}).values_list(name_field, pk_field))
+
+    def import_batch(self, raw_rows):
+        rows = []
+        for raw in raw_rows:
+            try:
+                row = self.parse_row(raw)
+            except (TypeError, ValueError):
+                row = None
+            if row is None:
+                self.stats["invalid"] += 1
+                continue
+            key = (row["book_name"], row["author_name"])
+            if self.skip_existing and key in self.existing:
+                self.stats["skipped"] += 1
+                continue
+            self.existing.add(key)
+            rows.append(row)
+
+        if not rows:
+            return
+
+        with transaction.atomic():
+            self.resolve(self.authors, Author, "author_name", "author_id", (r["author_name"] for r in rows))
+            self.resolve(self.publishers, Publisher, "publish_name", "publish_id", (r["publisher_name"] for r in rows))
+            self.resolve(
+                self.categories, Category, "category_name", "category_id",
+                (c for r in rows for c in r["categories"]),
+            )
+
+            books = Book.objects.bulk_create([
+                Book(
+                    book_name=r["book_name"],
+                    author_id=self.authors[r["author_name"]],
+                    publisher_id=self.publishers[r["publisher_name"]],
+                    publishYear=r["publishYear"],
+                    price=r["price"],
+                    quantity=r["quantity"],
+                    available=r["available"],
+                    description=r["description"],
+                )
+                for r in rows
+            ])
+
+            Through = Book.categories.through
+            Through.objects.bulk_create(
+                [
+                    Through(book_id=book.book_id, category_id=self.categories[name])
+                    for book, r in zip(books, rows)
+                    for name in set(r["categories"])
+                ],
+                ignore_conflicts=True,
+            )
+
+        self.stats["created"] += len(books)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.rule_store import RuleSet, import_rules
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load association rules exported with `mine_rules --export`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Rule file (.npz) to import')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert (default: 5000)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only open the file and print its metadata.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rule_set = RuleSet(options['path'])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read rule file: {e}')
+
+        self.stdout.write(f"{len(rule_set)} rules, exported at {rule_set.meta.get('exported_at')}")
+        if options['check']:
+            return
+
+        imported, skipped = import_rules(options['path'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} rules ({skipped} skipped: unknown books).'))
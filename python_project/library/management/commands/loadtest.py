@@ -0,0 +1,304 @@
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from library.models import Account, Book, Borrow
+
+
+# Các panel HTMX của trang "sách của tôi" (hx-trigger="every 2s")
+USER_POLLS = (
+    ("poll:active_borrows", "/user/get-active-borrows/"),
+    ("poll:returned_history", "/user/get-returned-history/"),
+    ("poll:reserved_books", "/user/get-reserved-books/"),
+)
+# Trang danh sách phiếu mượn của admin hỏi poll/ định kỳ
+ADMIN_POLLS = (
+    ("admin:borrow_poll", "/admin/library/borrow/poll/"),
+)
+CHANGELISTS = (
+    ("admin:borrow_changelist", "/admin/library/borrow/"),
+    ("admin:book_changelist", "/admin/library/book/"),
+    ("admin:account_changelist", "/admin/library/account/"),
+)
+# Hành động của người dùng giữa hai lần poll: (tên, trọng số)
+USER_ACTIONS = (("search", 6), ("reserve", 1), ("borrowed_page", 2))
+ADMIN_ACTIONS = (("approve", 2), ("changelist", 3))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+class InProcessClient:
+    """Drive the views through django.test.Client (no server needed)."""
+
+    def __init__(self):
+        self.client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+
+    def login_account(self, account):
+        session = self.client.session
+        session["account_id"] = account.account_id
+        session.save()
+
+    def login_admin(self, user, password):
+        self.client.force_login(user)
+
+    def get(self, path, headers=None):
+        return self.client.get(path, headers=headers).status_code
+
+    def post(self, path, data=None, headers=None):
+        return self.client.post(path, data or {}, headers=headers).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Drive a running server over HTTP, with its own cookie jar (one browser)."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect
+        )
+
+    def _csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == "csrftoken"), "")
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            # Redirect (302) cũng đi qua đây vì _NoRedirect không theo redirect
+            return e.code
+
+    def get(self, path, headers=None):
+        return self._open(urllib.request.Request(self.base_url + path, headers=headers or {}))
+
+    def post(self, path, data=None, headers=None):
+        headers = {"X-CSRFToken": self._csrf_token(), "Referer": self.base_url + path, **(headers or {})}
+        body = urllib.parse.urlencode(data or {}, doseq=True).encode()
+        return self._open(urllib.request.Request(self.base_url + path, data=body, headers=headers))
+
+    def _form_login(self, path, username, password, **extra):
+        self.get(path)  # lấy cookie csrftoken
+        status = self.post(path, {"username": username, "password": password, **extra})
+        if status != 302:
+            raise CommandError(f"Login as {username} via {path} failed (HTTP {status}).")
+
+    def login_account(self, account):
+        self._form_login("/login/", account.username, account.password)
+
+    def login_admin(self, user, password):
+        self._form_login("/admin/login/", user.get_username(), password, next="/admin/")
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate many users (catalog search, reserve, the 2s HTMX polls) and admins "
+        "(approve reservations, changelists) and report throughput and p50/p95/p99 latency. "
+        "Writes reservations/approvals to the configured database: run it on seeded data "
+        "(seed_library)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="Simulated library users (default: 20).")
+        parser.add_argument("--admins", type=int, default=1, help="Simulated admins (default: 1).")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run (default: 30).")
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds between HTMX polls of one open page (default: 2, as in the templates).",
+        )
+        parser.add_argument(
+            "--think-time",
+            type=float,
+            default=3.0,
+            help="Mean pause between user actions in seconds (default: 3).",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Load a running server (e.g. http://127.0.0.1:8000) instead of calling the views in-process.",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Use accounts created by seed_library with this prefix (default: seed).",
+        )
+        parser.add_argument("--admin-username", help="Admin user (default: first active superuser).")
+        parser.add_argument(
+            "--admin-password",
+            default="",
+            help="Admin password, only needed with --base-url.",
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+
+    def handle(self, *args, **options):
+        self.options = options
+        accounts = list(
+            Account.objects.filter(account_id__startswith=f"{options['prefix']}-", status="active")
+            .order_by("?")[:options["users"]]
+        )
+        if options["users"] and not accounts:
+            raise CommandError(f"No active '{options['prefix']}-' accounts: run seed_library first.")
+
+        admin = None
+        if options["admins"]:
+            users = get_user_model().objects.filter(is_active=True, is_staff=True)
+            if options["admin_username"]:
+                users = users.filter(username=options["admin_username"])
+            admin = users.order_by("-is_superuser", "pk").first()
+            if admin is None:
+                raise CommandError("No staff user for the admin scenarios (see --admin-username).")
+            if options["base_url"] and not options["admin_password"]:
+                raise CommandError("--admin-password is required with --base-url.")
+
+        self.book_ids = list(Book.objects.values_list("book_id", flat=True))
+        self.keywords = self.pick_keywords()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+        started = time.perf_counter()
+        deadline = started + options["duration"]
+        threads = [
+            threading.Thread(target=self.run_user, args=(account, deadline, options["seed"] + i))
+            for i, account in enumerate(accounts)
+        ]
+        threads += [
+            threading.Thread(target=self.run_admin, args=(admin, deadline, options["seed"] + 10_000 + i))
+            for i in range(options["admins"])
+        ]
+        target = options["base_url"] or "in-process"
+        self.stdout.write(f"Running {len(accounts)} users and {options['admins']} admins "
+                          f"for {options['duration']:.0f}s against {target}...")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report(time.perf_counter() - started)
+
+    def pick_keywords(self):
+        # Từ khóa tìm kiếm lấy từ tên sách thật để kết quả có số lượng thực tế
+        names = Book.objects.order_by("?").values_list("book_name", flat=True)[:200]
+        words = {word for name in names for word in name.split() if len(word) >= 4 and word.isalpha()}
+        return sorted(words) or ["sách"]
+
+    def make_client(self):
+        if self.options["base_url"]:
+            return HttpClient(self.options["base_url"])
+        return InProcessClient()
+
+    def timed(self, name, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            status = call(*args, **kwargs)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[name].append(elapsed)
+            if status is None or status >= 400:
+                self.errors[name] += 1
+        return status
+
+    def loop(self, deadline, rng, polls, actions, do_action, client):
+        """Poll every --poll-interval like an open page; act in between after a think time."""
+        interval = self.options["poll_interval"]
+        think = self.options["think_time"]
+        names = [name for name, _ in actions]
+        weights = [weight for _, weight in actions]
+        # Các trình duyệt không mở trang cùng lúc
+        next_poll = time.perf_counter() + rng.uniform(0, interval)
+        next_action = time.perf_counter() + rng.expovariate(1 / think) if think > 0 else 0
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_poll:
+                for name, path in polls:
+                    self.timed(name, client.get, path, headers={"HX-Request": "true"})
+                next_poll += interval
+            if now >= next_action:
+                do_action(client, rng, rng.choices(names, weights)[0])
+                next_action = time.perf_counter() + (rng.expovariate(1 / think) if think > 0 else 0)
+            time.sleep(max(0.0, min(next_poll, next_action, deadline) - time.perf_counter()))
+
+    def run_user(self, account, deadline, seed):
+        try:
+            client = self.make_client()
+            client.login_account(account)
+            self.loop(deadline, random.Random(seed), USER_POLLS, USER_ACTIONS, self.user_action, client)
+        finally:
+            connections.close_all()
+
+    def user_action(self, client, rng, action):
+        if action == "search":
+            keyword = urllib.parse.quote(rng.choice(self.keywords))
+            self.timed("search", client.get, f"/user/books/?keyword={keyword}")
+        elif action == "reserve":
+            self.timed("reserve", client.post, f"/borrow/reserve/{rng.choice(self.book_ids)}/")
+        else:
+            self.timed("borrowed_page", client.get, "/home-user/user-borrowed/")
+
+    def run_admin(self, admin, deadline, seed):
+        try:
+            client = self.make_client()
+            client.login_admin(admin, self.options["admin_password"])
+            self.loop(deadline, random.Random(seed), ADMIN_POLLS, ADMIN_ACTIONS, self.admin_action, client)
+        finally:
+            connections.close_all()
+
+    def admin_action(self, client, rng, action):
+        if action == "approve":
+            # Duyệt một phiếu đặt trước bất kỳ (action confirm_borrow của BorrowAdmin)
+            borrow_id = (
+                Borrow.objects.filter(status="reserved").order_by("?").values_list("pk", flat=True).first()
+            )
+            if borrow_id:
+                self.timed("admin:approve", client.post, "/admin/library/borrow/", {
+                    "action": "confirm_borrow",
+                    "_selected_action": [borrow_id],
+                    "index": 0,
+                    "select_across": 0,
+                })
+        else:
+            name, path = rng.choice(CHANGELISTS)
+            self.timed(name, client.get, path)
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.samples.values())
+        self.stdout.write(f"{'endpoint':26} {'count':>7} {'err':>5} {'req/s':>7} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name in sorted(self.samples):
+            values = sorted(self.samples[name])
+            self.stdout.write(
+                f"{name:26} {len(values):7} {self.errors[name]:5} {len(values) / elapsed:7.1f} "
+                f"{percentile(values, 50) * 1000:8.1f} {percentile(values, 95) * 1000:8.1f} "
+                f"{percentile(values, 99) * 1000:8.1f} {values[-1] * 1000:8.1f}"
+            )
+        everything = sorted(v for values in self.samples.values() for v in values)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} requests in {elapsed:.1f}s = {total / elapsed:.1f} req/s, "
+            f"{sum(self.errors.values())} errors, p50={percentile(everything, 50) * 1000:.1f}ms "
+            f"p95={percentile(everything, 95) * 1000:.1f}ms p99={percentile(everything, 99) * 1000:.1f}ms"
+        ))
@@ -0,0 +1,95 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter so that nothing already imported by manage.py
+# skews the numbers.
+# ``resource`` is Unix-only: on Windows peak memory comes from psutil (peak
+# working set) or, without psutil, from tracemalloc, which only sees Python
+# allocations.
+PROBE = """
+import json, os, sys, time
+try:
+    import resource
+    source = "rusage"
+except ImportError:
+    resource = None
+    try:
+        import psutil
+        source = "psutil"
+    except ImportError:
+        import tracemalloc
+        tracemalloc.start()
+        source = "tracemalloc"
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_python.settings")
+import django
+django.setup()
+for name in sys.argv[1:]:
+    __import__(name)
+elapsed = time.perf_counter() - start
+if source == "rusage":
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+elif source == "psutil":
+    memory = psutil.Process().memory_info()
+    peak = getattr(memory, "peak_wset", memory.rss)
+else:
+    peak = tracemalloc.get_traced_memory()[1]
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": peak / (1024 * 1024),
+    "memory_source": source,
+    "heavy": sorted(m for m in ("pandas", "mlxtend", "scipy", "numpy") if m in sys.modules),
+}))
+"""
+
+PROFILES = (
+    ("serving", ["library.urls", "library.views", "library.recommendation"]),
+    ("mining", ["library.views", "pandas", "mlxtend.frequent_patterns", "scipy.sparse"]),
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and peak RSS of a web worker vs. a mining process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of fresh interpreters per profile (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        header = f"{'profile':<10}{'median (s)':>12}{'rss (MB)':>10}  heavy modules loaded"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        sources = set()
+        for name, modules in PROFILES:
+            runs = [self.probe(modules) for _ in range(options['repeat'])]
+            sources.update(r['memory_source'] for r in runs)
+            seconds = sorted(r['seconds'] for r in runs)[len(runs) // 2]
+            rss_mb = max(r['rss_mb'] for r in runs)
+            heavy = ", ".join(runs[0]['heavy']) or "-"
+            self.stdout.write(f"{name:<10}{seconds:>12.3f}{rss_mb:>10.1f}  {heavy}")
+
+        if 'tracemalloc' in sources:
+            self.stdout.write(self.style.WARNING(
+                "No resource module or psutil: memory is the tracemalloc peak (Python allocations only)."
+            ))
+
+    def probe(self, modules):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, *modules],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
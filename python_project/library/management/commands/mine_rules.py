@@ -1,7 +1,7 @@
 # yourapp/management/commands/mine_rules.py
 
 from django.core.management.base import BaseCommand
-from library.recommendation import RecommendationService
+from library.recommendation import MINING_ALGORITHMS, RecommendationService
 
 
 class Command(BaseCommand):
@@ -26,6 +26,17 @@ class Command(BaseCommand):
             default=1.0,
             help='Minimum lift threshold (default: 1.0)'
         )
+        parser.add_argument(
+            '--algorithm',
+            choices=MINING_ALGORITHMS,
+            default='apriori',
+            help='Mining engine to use (default: apriori)'
+        )
+        parser.add_argument(
+            '--export',
+            metavar='PATH',
+            help='Also write the mined rules to a compact .npz file (see import_rules)'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style. NOTICE('Starting rule mining...'))
@@ -33,7 +44,8 @@ class Command(BaseCommand):
         service = RecommendationService(
             min_support=options['min_support'],
             min_confidence=options['min_confidence'],
-            min_lift=options['min_lift']
+            min_lift=options['min_lift'],
+            algorithm=options['algorithm']
         )
         
         num_rules = service.mine_association_rules()
@@ -42,6 +54,11 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully generated {num_rules} association rules!')
             )
+            if options['export']:
+                from library.rule_store import export_rules
+
+                exported = export_rules(options['export'])
+                self.stdout.write(self.style.SUCCESS(f'Exported {exported} rules to {options["export"]}'))
         else:
             self.stdout.write(
                 self.style.WARNING('No rules generated. You may need more borrow data or lower thresholds.')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from library.popularity import rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the 7/30 day book popularity windows (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Also recompute the all-time borrow counts from scratch.'
+        )
+
+    def handle(self, *args, **options):
+        count = rollup(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Updated popularity for {count} books.'))
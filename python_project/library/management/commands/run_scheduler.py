@@ -0,0 +1,71 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.scheduler import Scheduler, sync_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the periodic jobs (ScheduledJob) in the foreground. Several copies may run at "
+        "once, on one or more hosts sharing the database: each due job is leased to one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SCHEDULER_WORKERS,
+            help=f"Jobs run at the same time by this process (default: {settings.SCHEDULER_WORKERS}).",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Run jobs in child processes instead of threads (CPU-heavy jobs such as mine_rules).",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=settings.SCHEDULER_LEASE_SECONDS,
+            help="Seconds a claimed job stays locked without renewal "
+                 f"(default: {settings.SCHEDULER_LEASE_SECONDS}). Renewed while the job runs.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=settings.SCHEDULER_POLL_SECONDS,
+            help=f"Seconds between checks for due jobs (default: {settings.SCHEDULER_POLL_SECONDS}).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs that are due now, then exit (e.g. from cron).",
+        )
+
+    def handle(self, *args, **options):
+        created = sync_jobs()
+        if created:
+            self.stdout.write(f"Added jobs: {', '.join(created)}")
+
+        scheduler = Scheduler(
+            workers=options["workers"],
+            processes=options["processes"],
+            lease_seconds=options["lease"],
+            poll_seconds=min(options["poll"], options["lease"] / 3),
+            log=self.stdout.write,
+        )
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping: waiting for running jobs to finish...")
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scheduler {scheduler.worker} started ({options['workers']} "
+            f"{'processes' if options['processes'] else 'threads'})"
+        ))
+        scheduler.run(once=options["once"])
+        self.stdout.write(self.style.SUCCESS("Scheduler stopped."))
@@ -0,0 +1,269 @@
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from library.models import Account, Author, Book, Borrow, BorrowArchive, Category, Publisher
+from library.popularity import rollup
+from library.signals import bump
+
+
+LAST_NAMES = ("Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Ngô", "Dương")
+MIDDLE_NAMES = ("Văn", "Thị", "Hữu", "Minh", "Ngọc", "Thanh", "Quốc", "Gia", "Đức", "Thu", "Hoài", "Anh")
+FIRST_NAMES = ("An", "Bình", "Châu", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hùng", "Khánh", "Lan", "Linh",
+               "Long", "Mai", "Nam", "Nga", "Phúc", "Quân", "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy")
+# Tên thể loại có "Giáo trình" / "Tài liệu" để get_book_type() ra đủ các loại sách
+CATEGORY_NAMES = ("Giáo trình", "Tài liệu tham khảo", "Tiểu thuyết", "Khoa học", "Lịch sử", "Kinh tế",
+                  "Công nghệ thông tin", "Ngoại ngữ", "Kỹ năng sống", "Văn học thiếu nhi", "Triết học", "Y học")
+TITLE_WORDS = ("dữ liệu", "lập trình", "kinh tế", "lịch sử", "toán học", "vật lý", "hóa học", "văn hóa",
+               "mạng máy tính", "trí tuệ nhân tạo", "quản trị", "marketing", "tâm lý", "triết học",
+               "thiết kế", "kiến trúc", "sinh học", "điện tử", "ngôn ngữ", "xã hội", "pháp luật", "âm nhạc")
+TITLE_PATTERNS = ("Nhập môn {}", "Giáo trình {}", "Cơ sở {}", "{} nâng cao", "{} ứng dụng",
+                  "Lược sử {}", "Bài tập {}", "Tuyển tập {}", "{} cho người mới bắt đầu")
+USER_TYPE_WEIGHTS = {"student": 85, "staff": 10, "lecturer": 5}
+
+# Tỉ lệ kết cục của một lượt mượn trong quá khứ (phần còn lại: trả đúng hạn, không hư hại)
+LATE_RETURN_RATE = 0.12
+DAMAGE_RATES = {"light": 0.05, "heavy": 0.015, "lost": 0.005}
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic library (accounts, authors, publishers, categories, books and "
+        "borrow history) for local load and performance testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=2000, help="Accounts to create (default: 2000).")
+        parser.add_argument("--authors", type=int, default=500, help="Authors to create (default: 500).")
+        parser.add_argument("--publishers", type=int, default=50, help="Publishers to create (default: 50).")
+        parser.add_argument("--books", type=int, default=5000, help="Books to create (default: 5000).")
+        parser.add_argument(
+            "--borrows-per-account",
+            type=float,
+            default=8,
+            help="Average past borrows per account (default: 8).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="How far back the borrow history goes (default: 365).",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix of generated account ids and names, used by --clear and loadtest (default: seed).",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42).")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per bulk insert (default: 2000).")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete data generated earlier with the same --prefix first.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.prefix = options["prefix"]
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        if options["clear"]:
+            self.clear()
+        elif Account.objects.filter(account_id__startswith=f"{self.prefix}-").exists():
+            raise CommandError(
+                f"Accounts with prefix '{self.prefix}-' already exist; use --clear or another --prefix."
+            )
+
+        with transaction.atomic():
+            categories = self.create_categories()
+            publishers = self.create_named(Publisher, "publish_name", "publish_id", "NXB", options["publishers"])
+            authors = self.create_named(Author, "author_name", "author_id", "Tác giả", options["authors"])
+            books = self.create_books(options["books"], authors, publishers, categories)
+            accounts = self.create_accounts(options["accounts"])
+            counts = self.create_borrows(accounts, books, categories, options)
+
+        # Thống kê dựng lại từ dữ liệu mới, cache theo phiên bản bị vô hiệu
+        rollup(full=True)
+        bump()
+
+        summary = ", ".join(f"{status}={count}" for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(accounts)} accounts, {len(authors)} authors, {len(publishers)} publishers, "
+            f"{len(books)} books and {sum(counts.values())} borrows ({summary}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def clear(self):
+        prefix = self.prefix
+        accounts = Account.objects.filter(account_id__startswith=f"{prefix}-")
+        books = Book.objects.filter(book_name__startswith=self.label(""))
+        with transaction.atomic():
+            # Xóa phiếu mượn bằng SQL thô như archive_borrows: signal xóa của Borrow
+            # chạy từng dòng (popularity, gợi ý, bump) và rất chậm với hàng chục nghìn dòng.
+            with connection.cursor() as cursor:
+                for model in (Borrow, BorrowArchive):
+                    subquery, params = (
+                        model.objects.filter(Q(user__in=accounts) | Q(book__in=books)).values("pk").query.sql_with_params()
+                    )
+                    cursor.execute(
+                        f"DELETE FROM {model._meta.db_table} WHERE {model._meta.pk.column} IN ({subquery})", params
+                    )
+            # Phần còn lại (sách, liên kết thể loại, popularity...) xóa theo cascade
+            accounts.delete()
+            Author.objects.filter(author_name__startswith=self.label("")).delete()
+            Publisher.objects.filter(publish_name__startswith=self.label("")).delete()
+            Category.objects.filter(category_name__startswith=self.label("")).delete()
+        self.stdout.write(f"Removed data generated with prefix '{prefix}'")
+
+    def label(self, text):
+        return f"[{self.prefix}] {text}"
+
+    def person_name(self):
+        rng = self.rng
+        return f"{rng.choice(LAST_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(FIRST_NAMES)}"
+
+    def create_categories(self):
+        Category.objects.bulk_create([Category(category_name=self.label(name)) for name in CATEGORY_NAMES])
+        return list(Category.objects.filter(category_name__startswith=self.label("")).order_by("category_id"))
+
+    def create_named(self, model, field, pk_field, noun, count):
+        names = [self.label(f"{noun} {self.person_name()} {i + 1}") for i in range(count)]
+        model.objects.bulk_create([model(**{field: name}) for name in names], batch_size=self.batch_size)
+        return list(model.objects.filter(**{f"{field}__startswith": self.label("")}).order_by(pk_field))
+
+    def create_books(self, count, authors, publishers, categories):
+        rng = self.rng
+        this_year = date.today().year
+        new_books = []
+        for i in range(count):
+            title = rng.choice(TITLE_PATTERNS).format(rng.choice(TITLE_WORDS))
+            quantity = rng.randint(2, 10)
+            new_books.append(Book(
+                book_name=self.label(f"{title} {i + 1}"),
+                author=rng.choice(authors),
+                publisher=rng.choice(publishers),
+                publishYear=rng.randint(this_year - 40, this_year),
+                quantity=quantity,
+                available=quantity,
+                price=rng.randrange(50_000, 500_000, 5_000),
+                description="Sách sinh tự động cho kiểm thử tải.",
+            ))
+        Book.objects.bulk_create(new_books, batch_size=self.batch_size)
+        books = list(
+            Book.objects.filter(book_name__startswith=self.label(""))
+            .only("book_id", "quantity", "price")
+            .order_by("book_id")
+        )
+
+        through = Book.categories.through
+        links = []
+        self.books_by_category = {category.category_id: [] for category in categories}
+        for book in books:
+            for category in rng.sample(categories, rng.choice((1, 1, 2))):
+                links.append(through(book_id=book.book_id, category_id=category.category_id))
+                self.books_by_category[category.category_id].append(book)
+        through.objects.bulk_create(links, batch_size=self.batch_size)
+
+        # Trọng số kiểu Zipf: sách đứng trước trong thể loại được mượn nhiều hơn
+        self.category_weights = {
+            category_id: list(itertools.accumulate(1 / (rank + 1) ** 0.9 for rank in range(len(members))))
+            for category_id, members in self.books_by_category.items()
+        }
+        return books
+
+    def create_accounts(self, count):
+        rng = self.rng
+        types = list(USER_TYPE_WEIGHTS)
+        weights = list(USER_TYPE_WEIGHTS.values())
+        accounts = []
+        for i in range(count):
+            account_id = f"{self.prefix}-{i + 1:06d}"
+            accounts.append(Account(
+                account_id=account_id,
+                account_name=self.person_name(),
+                email=f"{account_id}@example.com",
+                username=account_id,
+                # Dữ liệu giả cho loadtest (đăng nhập qua HTTP): mật khẩu là account_id
+                password=account_id,
+                phone=f"09{rng.randint(0, 99_999_999):08d}",
+                status="active" if rng.random() < 0.97 else "inactive",
+                user_type=rng.choices(types, weights)[0],
+            ))
+        Account.objects.bulk_create(accounts, batch_size=self.batch_size)
+        return list(Account.objects.filter(account_id__startswith=f"{self.prefix}-").order_by("id"))
+
+    def pick_book(self, category_ids):
+        category_id = self.rng.choice(category_ids)
+        candidates = self.books_by_category[category_id]
+        if not candidates:
+            return None
+        return self.rng.choices(candidates, cum_weights=self.category_weights[category_id])[0]
+
+    def create_borrows(self, accounts, books, categories, options):
+        """Past borrows plus the current reserved / borrowed / await_return state.
+
+        Rows are bulk inserted, so Borrow.save() and its signals do not run;
+        available and fine are computed here the same way save() would.
+        """
+        rng = self.rng
+        today = date.today()
+        category_ids = [category.category_id for category in categories]
+        per_account = options["borrows_per_account"]
+        on_loan = Counter()
+        counts = Counter()
+        borrows = []
+
+        for account in accounts:
+            # Mỗi người đọc tập trung vào 1-2 thể loại để dữ liệu có quan hệ cho khai phá luật
+            favourites = rng.sample(category_ids, 2)
+            n = round(rng.expovariate(1 / per_account)) if per_account > 0 else 0
+            for _ in range(n):
+                book = self.pick_book(favourites if rng.random() < 0.8 else category_ids)
+                if book is None:
+                    continue
+                borrow_date = today - timedelta(days=rng.randint(0, options["days"]))
+                due_date = borrow_date + timedelta(days=14)
+                borrow = Borrow(user=account, book=book, borrow_date=borrow_date, due_date=due_date)
+
+                age = (today - borrow_date).days
+                if age <= 3 and rng.random() < 0.5:
+                    borrow.status = "reserved"
+                    borrow.due_date = None
+                elif age <= 30 and on_loan[book.book_id] < book.quantity and rng.random() < 0.6:
+                    # Còn đang mượn; quá hạn nếu due_date đã qua
+                    borrow.status = "await_return" if rng.random() < 0.1 else "borrowed"
+                    if borrow.status == "await_return":
+                        borrow.return_date = today
+                    on_loan[book.book_id] += 1
+                else:
+                    borrow.status = "returned"
+                    late = rng.randint(1, 20) if rng.random() < LATE_RETURN_RATE else 0
+                    borrow.return_date = min(today, borrow_date + timedelta(days=rng.randint(1, 14) + late))
+                    roll = rng.random()
+                    for damage, rate in DAMAGE_RATES.items():
+                        if roll < rate:
+                            borrow.damage_status = damage
+                            break
+                        roll -= rate
+                    borrow.fine = borrow.calculate_fine()
+
+                borrow.is_notified = borrow.status != "reserved"
+                counts[borrow.status] += 1
+                borrows.append(borrow)
+
+        Borrow.objects.bulk_create(borrows, batch_size=self.batch_size)
+
+        changed = []
+        for book in books:
+            if on_loan[book.book_id]:
+                book.available = book.quantity - on_loan[book.book_id]
+                changed.append(book)
+        Book.objects.bulk_update(changed, ["available"], batch_size=self.batch_size)
+        return counts
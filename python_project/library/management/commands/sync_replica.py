@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from library.db_router import REPLICA_ALIAS, replica_enabled
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the read replica (DB_REPLICA_PATH)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and copy again every N seconds (default: copy once).",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=1024,
+            help="Pages copied per backup step; readers of the replica are not blocked between steps.",
+        )
+
+    def handle(self, *args, **options):
+        if not replica_enabled():
+            raise CommandError("No replica configured: set DB_REPLICA_PATH.")
+        primary = connections["default"]
+        replica = connections[REPLICA_ALIAS]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("sync_replica only supports SQLite databases.")
+
+        while True:
+            started = time.perf_counter()
+            primary.ensure_connection()
+            target = sqlite3.connect(replica.settings_dict["NAME"], timeout=30)
+            try:
+                # SQLite online backup: bản chụp nhất quán của primary, ghi đè replica
+                primary.connection.backup(target, pages=options["pages"])
+                target.execute("PRAGMA journal_mode=WAL")
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f"Replica synced in {time.perf_counter() - started:.2f}s"
+            ))
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
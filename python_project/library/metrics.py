@@ -0,0 +1,351 @@
+import atexit
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+
+# Bộ đếm trong process, ghi ra METRICS_DIR/<host>-<pid>-<ngẫu nhiên>.json (tối đa
+# mỗi FLUSH_INTERVAL giây). /metrics gộp file của mọi worker: counter và histogram
+# được cộng dồn, gauge lấy giá trị mới nhất. Khi scrape, file của worker đã chết
+# trên cùng máy được gộp vào RETIRED_FILE (chỉ counter và histogram) rồi xóa, để
+# tổng không bao giờ giảm.
+FLUSH_INTERVAL = 1.0
+RETIRED_FILE = 'retired.json'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+_file = (None, None)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.samples = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        return {
+            'kind': self.kind,
+            'help': self.help,
+            'labelnames': list(self.labelnames),
+            'samples': [[list(key), value] for key, value in self.samples.items()],
+        }
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with _lock:
+            # Lưu kèm thời điểm để khi gộp lấy giá trị mới nhất giữa các process
+            self.samples[self._key(labels)] = [value, time.time()]
+        _maybe_flush()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [số mẫu theo từng bucket..., +Inf, sum, count]
+            sample = self.samples.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[i] += 1
+                    break
+            else:
+                sample[len(self.buckets)] += 1
+            sample[-2] += value
+            sample[-1] += 1
+        _maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+REQUEST_SECONDS = Histogram(
+    'library_request_duration_seconds', 'Request latency by view.', ('view', 'method'))
+REQUESTS = Counter(
+    'library_requests_total', 'Requests by view and status code.', ('view', 'status'))
+POLL_REQUESTS = Counter(
+    'library_poll_requests_total', 'Requests to the HTMX polling endpoints.', ('view',))
+BORROW_TRANSITIONS = Counter(
+    'library_borrow_transitions_total', 'Borrow status changes.', ('from_status', 'to_status'))
+EMAILS = Counter(
+    'library_emails_total', 'Notification emails by kind and result.', ('kind', 'result'))
+EMAIL_SECONDS = Histogram(
+    'library_email_send_duration_seconds', 'Time spent in send_mail.', ('kind',))
+CACHE_REQUESTS = Counter(
+    'library_cache_requests_total', 'cached_call lookups by namespace and outcome.', ('namespace', 'result'))
+MINING_SECONDS = Histogram(
+    'library_mining_duration_seconds', 'Association rule mining duration.', ('algorithm',),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+RULES = Gauge('library_association_rules', 'Rules written by the last mining run.')
+JOB_RUNS = Counter('library_job_runs_total', 'Scheduled job runs by result.', ('job', 'result'))
+JOB_SECONDS = Histogram(
+    'library_job_duration_seconds', 'Scheduled job duration.', ('job',),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+POLL_VIEWS = {
+    'get_pending_requests', 'get_user_active_borrows',
+    'get_user_returned_history', 'get_user_reserved_books',
+}
+
+
+def get_metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'metrics'))
+
+
+def _file_name():
+    global _file
+    pid = os.getpid()
+    if _file[0] != pid:
+        # Thêm chuỗi ngẫu nhiên: pid được tái sử dụng không ghi đè file của worker cũ,
+        # và process fork ra không dùng lại tên của process cha
+        _file = (pid, f"{socket.gethostname()}-{pid}-{secrets.token_hex(4)}.json")
+    return _file[1]
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        # Trên Windows os.kill(pid, 0) gửi CTRL_C_EVENT: không kiểm tra, giữ file
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _merge(merged, data, kinds=('counter', 'gauge', 'histogram')):
+    """Add the snapshots in ``data`` into ``merged`` ({name: snapshot with samples keyed by tuple})."""
+    for name, metric in data.items():
+        if metric['kind'] not in kinds:
+            continue
+        target = merged.setdefault(name, {**metric, 'samples': {}})
+        for labels, value in metric['samples']:
+            key = tuple(labels)
+            current = target['samples'].get(key)
+            if current is None:
+                target['samples'][key] = value
+            elif metric['kind'] == 'counter':
+                target['samples'][key] = current + value
+            elif metric['kind'] == 'gauge':
+                target['samples'][key] = max(current, value, key=lambda v: v[1])
+            else:
+                target['samples'][key] = [a + b for a, b in zip(current, value)]
+    return merged
+
+
+@contextmanager
+def _prune_lock(directory, timeout=5.0, stale_after=60.0):
+    """Cross-process lock file; yields False if it could not be taken in ``timeout`` seconds."""
+    path = directory / '.prune.lock'
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                # Khóa bị bỏ lại bởi process đã chết giữa chừng
+                if time.time() - path.stat().st_mtime > stale_after:
+                    path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                yield False
+                return
+            time.sleep(0.01)
+    try:
+        yield True
+    finally:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _fold_dead_workers(directory):
+    """Fold the files of workers on this host that are no longer running into RETIRED_FILE.
+
+    Their counter and histogram totals are kept, so the merged series never go
+    backwards when a worker is recycled and the numbers of a finished
+    mine_rules run stay visible; their gauges are dropped. Call with the
+    prune lock held.
+    """
+    host = socket.gethostname()
+    dead = []
+    for path in directory.glob('*.json'):
+        parts = path.stem.rsplit('-', 2)
+        if len(parts) == 3:
+            file_host, pid = parts[0], parts[1]
+        else:
+            file_host, pid = host, path.stem  # tên cũ: <pid>.json
+        if file_host != host or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        if not _pid_alive(int(pid)):
+            dead.append(path)
+    if not dead:
+        return
+
+    retired_path = directory / RETIRED_FILE
+    totals = _merge({}, _read(retired_path) or {})
+    for path in dead:
+        _merge(totals, _read(path) or {}, kinds=('counter', 'histogram'))
+    try:
+        _write(retired_path, {
+            name: {**metric, 'samples': [[list(key), value] for key, value in metric['samples'].items()]}
+            for name, metric in totals.items()
+        })
+        for path in dead:
+            path.unlink()
+    except OSError as e:
+        print("Metrics prune error:", e)
+
+
+def flush():
+    global _last_flush
+    with _flush_lock:
+        with _lock:
+            data = {name: metric.snapshot() for name, metric in _registry.items() if metric.samples}
+            _last_flush = time.monotonic()
+        if not data:
+            return
+        directory = get_metrics_dir()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            _write(directory / _file_name(), data)
+        except OSError as e:
+            print("Metrics flush error:", e)
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL and not _flush_lock.locked():
+        flush()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Merge the files of every process into {name: snapshot}."""
+    flush()
+    directory = get_metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    merged = {}
+    # Đọc trong cùng khóa với việc gộp: không thấy một worker vừa ở RETIRED_FILE
+    # vừa còn file riêng (tổng sẽ nhảy lên rồi tụt xuống)
+    with _prune_lock(directory) as locked:
+        if locked:
+            _fold_dead_workers(directory)
+        for path in sorted(directory.glob('*.json')):
+            data = _read(path)
+            if data is not None:
+                _merge(merged, data)
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render():
+    """Prometheus text exposition format (0.0.4)."""
+    merged = collect()
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        names = metric['labelnames']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric['samples'].items()):
+            if metric['kind'] == 'counter':
+                lines.append(f"{name}{_labels(names, key)} {value}")
+            elif metric['kind'] == 'gauge':
+                lines.append(f"{name}{_labels(names, key)} {value[0]}")
+            else:
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, key)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(names, key)} {value[-1]}")
+
+    # Tỉ lệ hit của cache, tính sẵn từ bộ đếm đã gộp
+    cache_counts = merged.get(CACHE_REQUESTS.name, {}).get('samples', {})
+    if cache_counts:
+        totals = {}
+        for (namespace, result), count in cache_counts.items():
+            hits, total = totals.get(namespace, (0, 0))
+            totals[namespace] = (hits + (count if result in ('hit', 'stale') else 0), total + count)
+        lines.append("# HELP library_cache_hit_ratio Share of cached_call lookups served from cache (incl. stale).")
+        lines.append("# TYPE library_cache_hit_ratio gauge")
+        for namespace, (hits, total) in sorted(totals.items()):
+            lines.append(f'library_cache_hit_ratio{_labels(["namespace"], [namespace])} {hits / total:.4f}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,162 @@
+import copy
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .db_router import has_written, primary_scope, replica_enabled
+from .metrics import POLL_REQUESTS, POLL_VIEWS, REQUEST_SECONDS, REQUESTS
+from .models import Account
+from .profiling import RequestProfile, current_profile, install_template_timer
+
+profiling_logger = logging.getLogger('library.profiling')
+
+
+# Cache Account theo từng worker: account_id -> (hết hạn lúc, Account).
+# Signal post_save/post_delete của Account xóa mục tương ứng ở worker hiện tại;
+# các worker khác thấy thay đổi sau tối đa ACCOUNT_CACHE_TTL giây.
+_accounts = {}
+_lock = threading.Lock()
+
+
+def get_account(account_id):
+    if not account_id:
+        return None
+    now = time.monotonic()
+    entry = _accounts.get(account_id)
+    if entry is None or entry[0] <= now:
+        account = Account.objects.filter(account_id=account_id).first()
+        entry = (now + getattr(settings, 'ACCOUNT_CACHE_TTL', 30), account)
+        with _lock:
+            _accounts[account_id] = entry
+    # Bản sao riêng cho mỗi request để view không sửa chung một instance
+    return copy.copy(entry[1])
+
+
+def invalidate_account(account_id=None):
+    with _lock:
+        if account_id is None:
+            _accounts.clear()
+        else:
+            _accounts.pop(account_id, None)
+
+
+class AccountMiddleware:
+    """Set ``request.account`` to the logged-in Account, loaded on first access."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.account = SimpleLazyObject(lambda: get_account(request.session.get('account_id')))
+        return self.get_response(request)
+
+
+class PrimaryStickyMiddleware:
+    """Per-request replica routing state.
+
+    Once a request writes, its remaining reads use the primary, and a short-lived
+    cookie keeps the next requests (e.g. the redirect after a POST) on the primary
+    until the replica has caught up.
+    """
+    COOKIE_NAME = 'use_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_enabled():
+            return self.get_response(request)
+
+        with primary_scope(sticky=self.COOKIE_NAME in request.COOKIES):
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(
+                    self.COOKIE_NAME, '1',
+                    max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                    httponly=True, samesite='Lax',
+                )
+        return response
+
+
+class MetricsMiddleware:
+    """Count requests and time them per view for the /metrics endpoint."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        # Dùng tên view thay cho path để số nhãn không tăng theo id trong URL
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        if view == 'metrics':
+            return response
+        REQUEST_SECONDS.observe(duration, view=view, method=request.method)
+        REQUESTS.inc(view=view, status=response.status_code)
+        if view in POLL_VIEWS:
+            POLL_REQUESTS.inc(view=view)
+        return response
+
+
+class RequestProfilerMiddleware:
+    """Opt-in (REQUEST_PROFILING): query count/time, template and view time per request.
+
+    Results go to a Server-Timing header and one JSON log line per request;
+    SQL run at least REQUEST_PROFILING_REPEAT_THRESHOLD times is reported as
+    a likely N+1 at WARNING level.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'REQUEST_PROFILING_REPEAT_THRESHOLD', 5)
+        install_template_timer()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        total = profile.total_time
+        view_time = total - profile.template_time
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f'tpl;dur={profile.template_time * 1000:.1f}',
+            f'view;dur={view_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        repeated = profile.repeated(self.threshold)
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'view_ms': round(view_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        if repeated:
+            record['repeated_sql'] = [{'count': count, 'sql': sql[:300]} for sql, count in repeated]
+        profiling_logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(record, ensure_ascii=False))
+        return response
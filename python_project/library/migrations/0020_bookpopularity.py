@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:34
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_popularity(apps, schema_editor):
+    Borrow = apps.get_model('library', 'Borrow')
+    BookPopularity = apps.get_model('library', 'BookPopularity')
+
+    today = datetime.date.today()
+    counts = (
+        Borrow.objects
+        .values('book_id')
+        .annotate(
+            total=Count('borrow_id'),
+            last_30=Count('borrow_id', filter=Q(borrow_date__gte=today - datetime.timedelta(days=30))),
+            last_7=Count('borrow_id', filter=Q(borrow_date__gte=today - datetime.timedelta(days=7))),
+        )
+    )
+    BookPopularity.objects.bulk_create([
+        BookPopularity(
+            book_id=row['book_id'],
+            borrow_count=row['total'],
+            borrow_count_30d=row['last_30'],
+            borrow_count_7d=row['last_7'],
+        )
+        for row in counts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0019_booksimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPopularity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='library.book')),
+                ('borrow_count', models.PositiveIntegerField(default=0, verbose_name='Lượt mượn')),
+                ('borrow_count_30d', models.PositiveIntegerField(default=0, verbose_name='Lượt mượn 30 ngày')),
+                ('borrow_count_7d', models.PositiveIntegerField(default=0, verbose_name='Lượt mượn 7 ngày')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-borrow_count'], name='popularity_all_idx'), models.Index(fields=['-borrow_count_30d'], name='popularity_30d_idx'), models.Index(fields=['-borrow_count_7d'], name='popularity_7d_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0021_borrow_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['username'], name='account_username_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['book_name'], name='book_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookassociationrule',
+            index=models.Index(fields=['antecedent_book', '-lift', '-confidence'], name='rule_antecedent_lift_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['user', 'status', '-borrow_date'], name='borrow_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['book', 'status'], name='borrow_book_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ),
+    ]
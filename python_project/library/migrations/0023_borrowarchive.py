@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0022_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowArchive',
+            fields=[
+                ('borrow_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Id mượn')),
+                ('is_notified', models.BooleanField(default=False, verbose_name='Nhận thông báo')),
+                ('borrow_date', models.DateField(verbose_name='Ngày mượn')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='Ngày hết hạn')),
+                ('return_date', models.DateField(blank=True, null=True, verbose_name='Ngày trả')),
+                ('updated_at', models.DateTimeField(null=True, verbose_name='Cập nhật lúc')),
+                ('damage_status', models.CharField(choices=[('none', 'Không hư hại'), ('light', 'Hư nhẹ (20%)'), ('heavy', 'Hư nặng (50%)'), ('lost', 'Mất sách (100%)')], default='none', max_length=10, verbose_name='Trạng thái sách')),
+                ('fine', models.PositiveIntegerField(default=0, verbose_name='Tiền phạt')),
+                ('status', models.CharField(choices=[('reserved', 'Đã đặt trước'), ('borrowed', 'Đang mượn'), ('returned', 'Đã trả')], default='returned', max_length=16, verbose_name='Trạng thái')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Lưu trữ lúc')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to='library.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to='library.account')),
+            ],
+            options={
+                'verbose_name': 'Lưu trữ mượn/trả',
+                'verbose_name_plural': 'Lưu trữ mượn/trả',
+                'indexes': [models.Index(fields=['user', '-return_date'], name='archive_user_return_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0023_borrowarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Tên công việc')),
+                ('command', models.CharField(max_length=100, verbose_name='Lệnh manage.py')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Tham số')),
+                ('interval_seconds', models.PositiveIntegerField(verbose_name='Chu kỳ (giây)')),
+                ('enabled', models.BooleanField(default=True, verbose_name='Bật')),
+                ('next_run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Lần chạy tới')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='Lần chạy gần nhất')),
+                ('locked_by', models.CharField(blank=True, max_length=200, verbose_name='Đang chạy bởi')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Khóa đến')),
+            ],
+            options={
+                'verbose_name': 'Công việc định kỳ',
+                'verbose_name_plural': 'Công việc định kỳ',
+                'indexes': [models.Index(fields=['enabled', 'next_run_at'], name='job_due_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=200, verbose_name='Worker')),
+                ('status', models.CharField(choices=[('running', 'Đang chạy'), ('success', 'Thành công'), ('failed', 'Lỗi')], default='running', max_length=10, verbose_name='Trạng thái')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Bắt đầu')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Kết thúc')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='Thời gian chạy (giây)')),
+                ('output', models.TextField(blank=True, verbose_name='Kết quả')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='library.scheduledjob')),
+            ],
+            options={
+                'verbose_name': 'Lịch sử chạy',
+                'verbose_name_plural': 'Lịch sử chạy',
+                'indexes': [models.Index(fields=['job', '-started_at'], name='jobrun_job_started_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0024_scheduled_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Vào hàng chờ lúc')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='library.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='library.account')),
+            ],
+            options={
+                'verbose_name': 'Hàng chờ',
+                'verbose_name_plural': 'Hàng chờ',
+                'indexes': [models.Index(fields=['book', 'created_at'], name='waitlist_book_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'user'), name='waitlist_book_user_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0025_waitlist'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrow',
+            name='status',
+            field=models.CharField(choices=[('reserved', 'Đã đặt trước'), ('borrowed', 'Đang mượn'), ('returned', 'Đã trả'), ('expired', 'Hết hạn giữ sách')], default='reserved', max_length=16, verbose_name='Trạng thái'),
+        ),
+        migrations.AlterField(
+            model_name='borrowarchive',
+            name='status',
+            field=models.CharField(choices=[('reserved', 'Đã đặt trước'), ('borrowed', 'Đang mượn'), ('returned', 'Đã trả'), ('expired', 'Hết hạn giữ sách')], default='returned', max_length=16, verbose_name='Trạng thái'),
+        ),
+    ]
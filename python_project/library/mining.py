@@ -0,0 +1,316 @@
+import time
+from collections import defaultdict
+
+from django.db import transaction
+
+from library.archive import borrow_values
+from library.metrics import MINING_SECONDS, RULES
+from library.models import BookAssociationRule, BookSimilarity
+
+
+MINING_ALGORITHMS = ('apriori', 'fpgrowth', 'sparse-pairs')
+
+
+# pandas, mlxtend and scipy are imported inside the methods that need them so
+# that importing this module (e.g. for MINING_ALGORITHMS) stays cheap.
+class RuleMiner:
+    def __init__(self, min_support=0.01, min_confidence=0.1, min_lift=1.0, algorithm='apriori'):
+        if algorithm not in MINING_ALGORITHMS:
+            raise ValueError(f"Unknown mining algorithm: {algorithm}")
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.min_lift = min_lift
+        self.algorithm = algorithm
+
+    def _get_monthly_baskets(self, **filters):
+        # Cả phiếu đang hoạt động lẫn phiếu đã lưu trữ; ``filters`` thu hẹp cả hai bảng
+        borrows = borrow_values('user_id', 'book_id', 'borrow_date', **filters)
+
+        baskets = defaultdict(set)
+        
+        for user_id, book_id, borrow_date in borrows.iterator(chunk_size=2000):
+            baskets[(user_id, borrow_date.year, borrow_date.month)].add(book_id)
+
+        transactions = [
+            list(books) for books in baskets.values() 
+            if len(books) >= 2
+        ]
+        
+        return transactions
+    
+    def _create_transaction_matrix(self, transactions):
+        import pandas as pd
+        from mlxtend.preprocessing import TransactionEncoder
+
+        if not transactions:
+            return None
+            
+        te = TransactionEncoder()
+        te_array = te.fit_transform(transactions)
+        df = pd.DataFrame(te_array, columns=te.columns_)
+        return df
+    
+    def mine_association_rules(self):
+        with MINING_SECONDS.time(algorithm=self.algorithm):
+            count = self._mine_association_rules()
+        RULES.set(count)
+        return count
+
+    def _mine_association_rules(self):
+        transactions = self._get_monthly_baskets()
+        print(f"Found {len(transactions)} valid baskets")
+        
+        if len(transactions) < 5:
+            print("Go get more database record")
+            return 0
+
+        try:
+            rules = self.mine_rules_from_transactions(transactions)
+        except Exception as e:
+            print(f"Error during mining: {e}")
+            return 0
+
+        print(f"Generated {len(rules)} association rules ({self.algorithm})")
+        return self.save_rules(rules)
+
+    def mine_rules_from_transactions(self, transactions):
+        """Return 1 -> 1 rules as (antecedent_id, consequent_id, support, confidence, lift) tuples."""
+        if not transactions:
+            return []
+
+        if self.algorithm == 'sparse-pairs':
+            return self._mine_sparse_pairs(transactions)
+
+        return self._mine_with_mlxtend(transactions)
+
+    def _mine_with_mlxtend(self, transactions):
+        from mlxtend.frequent_patterns import apriori, association_rules, fpgrowth
+
+        miner = fpgrowth if self.algorithm == 'fpgrowth' else apriori
+        df = self._create_transaction_matrix(transactions)
+        if df is None:
+            return []
+
+        print(f"   Transaction matrix shape: {df.shape}")
+
+        # Only single-book -> single-book rules are stored, so itemsets
+        # larger than pairs are never needed.
+        frequent_itemsets = miner(
+            df,
+            min_support=self.min_support,
+            use_colnames=True,
+            max_len=2
+        )
+
+        if frequent_itemsets.empty:
+            print("No frequent itemsets found.")
+            return []
+
+        print(f"Found {len(frequent_itemsets)} frequent itemsets")
+
+        rules_df = association_rules(
+            frequent_itemsets,
+            metric="lift",
+            min_threshold=self.min_lift
+        )
+        rules_df = rules_df[rules_df['confidence'] >= self.min_confidence]
+
+        rules = []
+        for row in rules_df.itertuples(index=False):
+            antecedents = list(row.antecedents)
+            consequents = list(row.consequents)
+            if len(antecedents) == 1 and len(consequents) == 1:
+                rules.append((
+                    int(antecedents[0]),
+                    int(consequents[0]),
+                    float(row.support),
+                    float(row.confidence),
+                    float(row.lift),
+                ))
+        return rules
+
+    def _mine_sparse_pairs(self, transactions):
+        import numpy as np
+        from scipy import sparse
+
+        # Count pair co-occurrences with a sparse basket x book matrix
+        # (X^T X) instead of materialising a dense one-hot DataFrame.
+        book_ids = sorted({book_id for basket in transactions for book_id in basket})
+        column_of = {book_id: i for i, book_id in enumerate(book_ids)}
+
+        indptr = [0]
+        indices = []
+        for basket in transactions:
+            indices.extend(column_of[book_id] for book_id in set(basket))
+            indptr.append(len(indices))
+
+        n_baskets = len(transactions)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr),
+            shape=(n_baskets, len(book_ids))
+        )
+
+        item_counts = np.asarray(matrix.sum(axis=0)).ravel()
+        min_count = self.min_support * n_baskets
+
+        # Drop infrequent books before the product: a pair can never be more
+        # frequent than either of its members.
+        frequent = np.flatnonzero(item_counts >= min_count)
+        if frequent.size < 2:
+            print("No frequent itemsets found.")
+            return []
+
+        matrix = matrix[:, frequent]
+        item_counts = item_counts[frequent]
+        pair_counts = sparse.triu(matrix.T @ matrix, k=1).tocoo()
+
+        keep = pair_counts.data >= min_count
+        rows = pair_counts.row[keep]
+        cols = pair_counts.col[keep]
+        counts = pair_counts.data[keep].astype(np.float64)
+
+        print(f"Found {frequent.size + counts.size} frequent itemsets")
+
+        item_support = item_counts / n_baskets
+        pair_support = counts / n_baskets
+
+        rules = []
+        for ant, cons in ((rows, cols), (cols, rows)):
+            confidence = pair_support / item_support[ant]
+            lift = confidence / item_support[cons]
+            mask = (confidence >= self.min_confidence) & (lift >= self.min_lift)
+            for a, c, sup, conf, lf in zip(
+                ant[mask], cons[mask], pair_support[mask], confidence[mask], lift[mask]
+            ):
+                rules.append((
+                    int(book_ids[frequent[a]]),
+                    int(book_ids[frequent[c]]),
+                    float(sup),
+                    float(conf),
+                    float(lf),
+                ))
+        return rules
+    
+    def save_rules(self, rules):
+        BookAssociationRule.objects.all().delete()
+        
+        rules_to_create = [
+            BookAssociationRule(
+                antecedent_book_id=ant_book_id,
+                consequent_book_id=cons_book_id,
+                support=support,
+                confidence=confidence,
+                lift=lift
+            )
+            for ant_book_id, cons_book_id, support, confidence, lift in rules
+        ]
+
+        with transaction.atomic():
+            BookAssociationRule.objects.bulk_create(
+                rules_to_create, 
+                ignore_conflicts=True
+            )
+        
+        print(f"   ✅ Saved {len(rules_to_create)} rules to database")
+
+        from library.recommendation import invalidate_recommendations
+        invalidate_recommendations()
+        return len(rules_to_create)
+
+
+class ItemSimilarityBuilder:
+    """Item-item cosine similarity over the user x book borrow matrix.
+
+    Similarities are computed one block of books at a time, so peak memory
+    is bounded by ``block_size`` rows of the similarity matrix rather than
+    the full books x books product.
+    """
+
+    def __init__(self, neighbours=20, block_size=512, min_score=0.0):
+        self.neighbours = neighbours
+        self.block_size = block_size
+        self.min_score = min_score
+
+    def _build_matrix(self, **filters):
+        import numpy as np
+        from scipy import sparse
+
+        pairs = borrow_values('user_id', 'book_id', all=False, **filters)
+
+        user_index = {}
+        book_index = {}
+        rows = []
+        cols = []
+        for user_id, book_id in pairs.iterator(chunk_size=5000):
+            rows.append(user_index.setdefault(user_id, len(user_index)))
+            cols.append(book_index.setdefault(book_id, len(book_index)))
+
+        matrix = sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(user_index), len(book_index))
+        )
+        book_ids = np.empty(len(book_index), dtype=np.int64)
+        for book_id, col in book_index.items():
+            book_ids[col] = book_id
+        return matrix, book_ids
+
+    def iter_neighbours(self, matrix, book_ids):
+        """Yield (book_id, similar_book_id, score) for the top neighbours of every book."""
+        import numpy as np
+        from scipy import sparse
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+        normalized_t = normalized.T.tocsr()
+
+        n_books = normalized.shape[1]
+        for start in range(0, n_books, self.block_size):
+            stop = min(start + self.block_size, n_books)
+            block = (normalized_t[start:stop] @ normalized).tocsr()
+
+            for offset in range(stop - start):
+                row_start, row_end = block.indptr[offset], block.indptr[offset + 1]
+                cols = block.indices[row_start:row_end]
+                scores = block.data[row_start:row_end]
+
+                keep = (cols != start + offset) & (scores > self.min_score)
+                cols, scores = cols[keep], scores[keep]
+                if cols.size > self.neighbours:
+                    top = np.argpartition(-scores, self.neighbours - 1)[:self.neighbours]
+                    cols, scores = cols[top], scores[top]
+
+                book_id = int(book_ids[start + offset])
+                for col, score in zip(cols, scores):
+                    yield book_id, int(book_ids[col]), float(score)
+
+    def build(self, batch_size=2000):
+        matrix, book_ids = self._build_matrix()
+        print(f"   Borrow matrix shape: {matrix.shape}, {matrix.nnz} non-zeros")
+
+        if matrix.nnz == 0:
+            return 0
+
+        count = 0
+        batch = []
+        with transaction.atomic():
+            BookSimilarity.objects.all().delete()
+            for book_id, similar_book_id, score in self.iter_neighbours(matrix, book_ids):
+                batch.append(BookSimilarity(
+                    book_id=book_id,
+                    similar_book_id=similar_book_id,
+                    score=score
+                ))
+                if len(batch) >= batch_size:
+                    BookSimilarity.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                BookSimilarity.objects.bulk_create(batch)
+                count += len(batch)
+
+        print(f"   ✅ Saved {count} book neighbours to database")
+
+        from library.recommendation import invalidate_recommendations
+        invalidate_recommendations()
+        return count
@@ -1,5 +1,5 @@
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from datetime import timedelta, date
 from django.urls import reverse
 from django.utils import timezone
@@ -25,6 +25,10 @@ class Account(models.Model):
     class Meta:
         verbose_name = "Quản lý tài khoản"
         verbose_name_plural = "Quản lý tài khoản"
+        indexes = [
+            # Đăng nhập: tra theo username
+            models.Index(fields=['username'], name='account_username_idx'),
+        ]
 
     STATUS_CHOICES = (
         ('active', 'Kích hoạt'),
@@ -98,6 +102,9 @@ class Book(models.Model):
     class Meta:
         verbose_name = "Quản lý sách"
         verbose_name_plural = "Quản lý sách"
+        indexes = [
+            models.Index(fields=['book_name'], name='book_name_idx'),
+        ]
 
     def __str__(self):
         return self.book_name
@@ -141,10 +148,21 @@ class Borrow(models.Model):
     borrow_date = models.DateField("Ngày mượn", default=date.today)
     due_date = models.DateField("Ngày hết hạn", null=True, blank=True)
     return_date = models.DateField("Ngày trả", null=True, blank=True)
+    # Mốc cho xuất dữ liệu tăng dần; các lệnh .update() hàng loạt phải tự gán trường này
+    updated_at = models.DateTimeField("Cập nhật lúc", auto_now=True, null=True, db_index=True)
 
     class Meta:
         verbose_name = "Quản lý mượn/trả"
         verbose_name_plural = "Quản lý mượn/trả"
+        indexes = [
+            # Các panel của người dùng: user + status, mới nhất trước
+            models.Index(fields=['user', 'status', '-borrow_date'], name='borrow_user_status_idx'),
+            # Đếm lượt đặt trước / đang mượn của một sách
+            models.Index(fields=['book', 'status'], name='borrow_book_status_idx'),
+            # Nhắc hạn / quá hạn. Không dùng partial index (status IN ...):
+            # Django truyền status dưới dạng tham số nên SQLite không chọn được nó.
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ]
 
     DAMAGE_CHOICES = (
         ('none', 'Không hư hại'),
@@ -159,6 +177,7 @@ class Borrow(models.Model):
         ('reserved', 'Đã đặt trước'),
         ('borrowed', 'Đang mượn'),
         ('returned', 'Đã trả'),
+        ('expired', 'Hết hạn giữ sách'),
     )
     status = models.CharField("Trạng thái", max_length=16, choices=STATUS_CHOICES, default='reserved')
 
@@ -231,45 +250,120 @@ class Borrow(models.Model):
         is_new = self.pk is None
         old_status = None
 
-        if not is_new:
-            try:
-                old_status = Borrow.objects.get(pk=self.pk).status
-            except Borrow.DoesNotExist:
-                pass
-
         # Đảm bảo due_date luôn được gán nếu đang mượn (Fix lỗi logic khi tạo từ view thường)
         if self.status == 'borrowed' and not self.due_date:
             self.due_date = (self.borrow_date or date.today()) + timedelta(days=14)
 
-        # Logic cập nhật số lượng sách tồn kho khi duyệt mượn
-        if ((is_new and self.status == 'borrowed') or
-                (old_status == 'reserved' and self.status == 'borrowed')):
-            reserved_count = Borrow.objects.filter(
-                book=self.book, status='reserved'
-            ).exclude(pk=self.pk).count()
+        # Trạng thái cũ, tồn kho, phiếu và hàng chờ đọc / ghi trong cùng một giao dịch
+        with transaction.atomic():
+            if not is_new:
+                try:
+                    old_status = Borrow.objects.get(pk=self.pk).status
+                except Borrow.DoesNotExist:
+                    pass
+
+            # Logic cập nhật số lượng sách tồn kho khi duyệt mượn
+            if ((is_new and self.status == 'borrowed') or
+                    (old_status == 'reserved' and self.status == 'borrowed')):
+                reserved_count = Borrow.objects.filter(
+                    book=self.book, status='reserved'
+                ).exclude(pk=self.pk).count()
+
+                if self.book.available <= reserved_count:
+                    raise ValidationError("Hiện đã có người dùng khác đặt trước.")
+
+            if ((is_new and self.status == 'borrowed') or
+                    (old_status == 'reserved' and self.status == 'borrowed')):
+                self.book.available -= 1
+                self.book.save(update_fields=['available'])
+
+            # Logic cập nhật số lượng sách tồn kho khi trả (await_return: người dùng đã báo trả,
+            # sách vẫn tính là đang mượn cho tới khi admin xác nhận)
+            returned = old_status in ('borrowed', 'await_return') and self.status == 'returned'
+            if returned:
+                self.book.available += 1
+                self.book.save(update_fields=['available'])
+
+            # Logic tính phạt khi trả sách
+            if self.status == 'returned':
+                if not self.return_date:
+                    self.return_date = date.today()
+                self.fine = self.calculate_fine()
+            else:
+                self.fine = 0
+
+            super().save(*args, **kwargs)
+
+            # Bản vừa trả được giữ ngay cho người đứng đầu hàng chờ
+            if returned:
+                WaitlistEntry.promote(self.book)
 
-            if self.book.available <= reserved_count:
-                raise ValidationError("Hiện đã có người dùng khác đặt trước.")
+    def __str__(self):
+        return f"{self.user.account_name} - {self.book.book_name}"
 
-        if ((is_new and self.status == 'borrowed') or
-                (old_status == 'reserved' and self.status == 'borrowed')):
-            self.book.available -= 1
-            self.book.save(update_fields=['available'])
 
-        # Logic cập nhật số lượng sách tồn kho khi trả
-        if old_status == 'borrowed' and self.status == 'returned':
-            self.book.available += 1
-            self.book.save(update_fields=['available'])
+class WaitlistEntry(models.Model):
+    """A user queued for a book with no free copy, served first come first served."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='waitlist')
+    created_at = models.DateTimeField("Vào hàng chờ lúc", default=timezone.now)
 
-        # Logic tính phạt khi trả sách
-        if self.status == 'returned':
-            if not self.return_date:
-                self.return_date = date.today()
-            self.fine = self.calculate_fine()
-        else:
-            self.fine = 0
+    class Meta:
+        verbose_name = "Hàng chờ"
+        verbose_name_plural = "Hàng chờ"
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'user'], name='waitlist_book_user_uniq'),
+        ]
+        indexes = [
+            # Đầu hàng chờ của một sách
+            models.Index(fields=['book', 'created_at'], name='waitlist_book_created_idx'),
+        ]
 
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"{self.user} ⏳ {self.book}"
+
+    @classmethod
+    def position_of(cls, entry):
+        return cls.objects.filter(book_id=entry.book_id).filter(
+            models.Q(created_at__lt=entry.created_at) |
+            models.Q(created_at=entry.created_at, pk__lt=entry.pk)
+        ).count() + 1
+
+    @classmethod
+    def promote(cls, *books):
+        """Reserve free copies of ``books`` for the heads of their queues; returns the new Borrows.
+
+        Must run inside the transaction that freed the copies; the users are
+        emailed once it commits (see reservations.promote_waitlists).
+        """
+        from library.reservations import promote_and_notify
+        return promote_and_notify(book.pk for book in books)
+
+
+class BorrowArchive(models.Model):
+    """Phiếu mượn đã trả từ lâu, được archive_borrows chuyển khỏi bảng Borrow (giữ nguyên borrow_id)."""
+    borrow_id = models.IntegerField("Id mượn", primary_key=True)
+    user = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='archived_borrows')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_borrows')
+    is_notified = models.BooleanField("Nhận thông báo", default=False)
+    borrow_date = models.DateField("Ngày mượn")
+    due_date = models.DateField("Ngày hết hạn", null=True, blank=True)
+    return_date = models.DateField("Ngày trả", null=True, blank=True)
+    updated_at = models.DateTimeField("Cập nhật lúc", null=True)
+    damage_status = models.CharField("Trạng thái sách", max_length=10, choices=Borrow.DAMAGE_CHOICES, default='none')
+    fine = models.PositiveIntegerField("Tiền phạt", default=0)
+    status = models.CharField("Trạng thái", max_length=16, choices=Borrow.STATUS_CHOICES, default='returned')
+    archived_at = models.DateTimeField("Lưu trữ lúc", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lưu trữ mượn/trả"
+        verbose_name_plural = "Lưu trữ mượn/trả"
+        indexes = [
+            models.Index(fields=['user', '-return_date'], name='archive_user_return_idx'),
+        ]
+
+    # Phiếu lưu trữ luôn đã trả: không còn hạn
+    days_until_due = None
 
     def __str__(self):
         return f"{self.user.account_name} - {self.book.book_name}"
@@ -288,10 +382,51 @@ class BookAssociationRule(models.Model):
     class Meta:
         unique_together = ('antecedent_book', 'consequent_book')
         ordering = ['-lift', '-confidence']
+        indexes = [
+            models.Index(fields=['antecedent_book', '-lift', '-confidence'], name='rule_antecedent_lift_idx'),
+        ]
 
     def __str__(self):
         return f"{self.antecedent_book.book_name} -> {self.consequent_book.book_name}"
 
+class BookPopularity(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    borrow_count = models.PositiveIntegerField("Lượt mượn", default=0)
+    borrow_count_30d = models.PositiveIntegerField("Lượt mượn 30 ngày", default=0)
+    borrow_count_7d = models.PositiveIntegerField("Lượt mượn 7 ngày", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    WINDOW_FIELDS = {
+        'all': 'borrow_count',
+        '30d': 'borrow_count_30d',
+        '7d': 'borrow_count_7d',
+    }
+    WINDOW_DAYS = {'30d': 30, '7d': 7}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-borrow_count'], name='popularity_all_idx'),
+            models.Index(fields=['-borrow_count_30d'], name='popularity_30d_idx'),
+            models.Index(fields=['-borrow_count_7d'], name='popularity_7d_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id}: {self.borrow_count}"
+
+
+class BookSimilarity(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similarities')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('book', 'similar_book')
+        ordering = ['-score']
+
+    def __str__(self):
+        return f"{self.book_id} ~ {self.similar_book_id} ({self.score:.3f})"
+
 class BorrowRule(models.Model):
     user_type = models.ForeignKey(UserType, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -303,3 +438,56 @@ class BorrowRule(models.Model):
     def __str__(self):
         return f"{self.user_type} - {self.category}: {self.max_days} ngày"
 
+
+
+class ScheduledJob(models.Model):
+    """A management command run periodically by run_scheduler.
+
+    ``locked_by`` / ``locked_until`` form a lease: a scheduler process claims a
+    due job with a conditional UPDATE, so each run happens in one worker only;
+    a crashed worker's lease simply expires.
+    """
+    name = models.CharField("Tên công việc", max_length=100, unique=True)
+    command = models.CharField("Lệnh manage.py", max_length=100)
+    args = models.JSONField("Tham số", default=list, blank=True)
+    interval_seconds = models.PositiveIntegerField("Chu kỳ (giây)")
+    enabled = models.BooleanField("Bật", default=True)
+    next_run_at = models.DateTimeField("Lần chạy tới", default=timezone.now)
+    last_run_at = models.DateTimeField("Lần chạy gần nhất", null=True, blank=True)
+    locked_by = models.CharField("Đang chạy bởi", max_length=200, blank=True)
+    locked_until = models.DateTimeField("Khóa đến", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Công việc định kỳ"
+        verbose_name_plural = "Công việc định kỳ"
+        indexes = [
+            models.Index(fields=['enabled', 'next_run_at'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class JobRun(models.Model):
+    STATUS_CHOICES = (
+        ('running', 'Đang chạy'),
+        ('success', 'Thành công'),
+        ('failed', 'Lỗi'),
+    )
+    job = models.ForeignKey(ScheduledJob, on_delete=models.CASCADE, related_name='runs')
+    worker = models.CharField("Worker", max_length=200)
+    status = models.CharField("Trạng thái", max_length=10, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField("Bắt đầu", default=timezone.now)
+    finished_at = models.DateTimeField("Kết thúc", null=True, blank=True)
+    duration = models.FloatField("Thời gian chạy (giây)", null=True, blank=True)
+    output = models.TextField("Kết quả", blank=True)
+
+    class Meta:
+        verbose_name = "Lịch sử chạy"
+        verbose_name_plural = "Lịch sử chạy"
+        indexes = [
+            models.Index(fields=['job', '-started_at'], name='jobrun_job_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} @ {self.started_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
+
+from library.models import BookPopularity, Borrow, BorrowArchive
+
+
+def _window_start(window, today=None):
+    return (today or date.today()) - timedelta(days=BookPopularity.WINDOW_DAYS[window])
+
+
+def record_borrow(book_id, borrow_date, delta=1):
+    """Incrementally apply one Borrow row being created (+1) or deleted (-1)."""
+    borrow_date = borrow_date or date.today()
+    changes = {}
+    for window, field in BookPopularity.WINDOW_FIELDS.items():
+        if window != 'all' and borrow_date < _window_start(window):
+            continue
+        changes[field] = Greatest(F(field) + delta, Value(0))
+
+    if BookPopularity.objects.filter(book_id=book_id).update(**changes):
+        return
+    if delta < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            BookPopularity.objects.create(
+                book_id=book_id,
+                **{field: 1 for field in BookPopularity.WINDOW_FIELDS.values() if field in changes}
+            )
+    except IntegrityError:
+        # Another worker created the row first.
+        BookPopularity.objects.filter(book_id=book_id).update(**changes)
+
+
+def rollup(full=False, batch_size=1000):
+    """Recompute the sliding windows (and the all-time count when ``full``).
+
+    Incremental updates never age rows out of the 7/30 day windows, so this
+    is meant to run daily. Only borrows inside the 30 day window are scanned
+    unless ``full`` is set. Returns the number of rows written.
+    """
+    today = date.today()
+    window_filters = {
+        'borrow_count_30d': Q(borrow_date__gte=_window_start('30d', today)),
+        'borrow_count_7d': Q(borrow_date__gte=_window_start('7d', today)),
+    }
+    annotations = {
+        field: Count('borrow_id', filter=condition)
+        for field, condition in window_filters.items()
+    }
+    fields = list(window_filters)
+
+    if full:
+        annotations['borrow_count'] = Count('borrow_id')
+        fields.append('borrow_count')
+
+    # Đếm trên cả Borrow và BorrowArchive rồi cộng lại theo sách
+    totals = {}
+    for model in (Borrow, BorrowArchive):
+        counts = model.objects.values('book_id')
+        if not full:
+            counts = counts.filter(borrow_date__gte=_window_start('30d', today))
+        for row in counts.annotate(**annotations).order_by():
+            total = totals.setdefault(row['book_id'], dict.fromkeys(fields, 0))
+            for field in fields:
+                total[field] += row[field]
+
+    rows = [BookPopularity(book_id=book_id, **total) for book_id, total in totals.items()]
+
+    with transaction.atomic():
+        # Books with no borrows left in the scanned range drop to zero.
+        BookPopularity.objects.update(**{field: 0 for field in fields})
+        BookPopularity.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['book'],
+            update_fields=fields,
+        )
+    return len(rows)
+
+
+def get_popular_book_ids(limit=10, window='all', category_id=None):
+    field = BookPopularity.WINDOW_FIELDS[window]
+    qs = BookPopularity.objects.filter(**{f"{field}__gt": 0})
+    if category_id:
+        qs = qs.filter(book__categories=category_id)
+    return list(
+        qs.order_by(f"-{field}", 'book_id')
+        .values_list('book_id', flat=True)[:limit]
+    )
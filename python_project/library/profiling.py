@@ -0,0 +1,71 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+
+# Profile của request đang chạy (None khi không bật profiling)
+current_profile = ContextVar('current_profile', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_installed = False
+
+
+def sql_shape(sql):
+    """Normalise SQL so that queries differing only in IN-list length share a shape."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook: time and count every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        """SQL shapes executed at least ``threshold`` times (likely N+1)."""
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def install_template_timer():
+    """Wrap the Django template backend's render() once to time template rendering."""
+    global _installed
+    if _installed:
+        return
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return original_render(self, context, request)
+        # Template lồng nhau (render_to_string trong template) chỉ tính một lần
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            if profile.template_depth == 0:
+                profile.template_time += time.perf_counter() - started
+
+    Template.render = render
+    _installed = True
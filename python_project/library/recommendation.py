@@ -1,156 +1,173 @@
-import pandas as pd
-from datetime import datetime, timedelta
 from collections import defaultdict
-from mlxtend.frequent_patterns import apriori, association_rules
-from mlxtend. preprocessing import TransactionEncoder
-from django.db import transaction
-from django.db.models import Q
 
-from library.models import Borrow, Book, BookAssociationRule, Account
+from django.conf import settings
+from django.db.models import Sum
 
+from library.caching import bump_version, cached_call, get_version
+from library.db_router import read_from_replica
+from library.content_index import get_content_index
+from library.mining import MINING_ALGORITHMS
+from library.popularity import get_popular_book_ids
+from library.rule_store import get_rule_set
+from library.models import Borrow, Book, BookAssociationRule, BookSimilarity
 
+
+# 'rules': association rules from mine_rules.
+# 'itemcf': item-item cosine neighbours from build_similarity.
+# 'content': TF-IDF similarity over book text from build_content_index.
+RECOMMENDATION_ENGINES = ('rules', 'itemcf', 'content')
+
+
+def _get_engine(engine):
+    engine = engine or getattr(settings, 'RECOMMENDATION_ENGINE', 'rules')
+    if engine not in RECOMMENDATION_ENGINES:
+        raise ValueError(f"Unknown recommendation engine: {engine}")
+    return engine
+
+
+# Bumped whenever rules/similarities/content index are rebuilt, which
+# invalidates every cached recommendation at once.
+GENERATION_KEY = "recommendations_generation"
+
+
+def user_version_key(account_pk):
+    return f"recommendations_user_version:{account_pk}"
+
+
+def invalidate_recommendations(account_pk=None):
+    """Drop cached recommendations for one account, or for everyone."""
+    if account_pk is None:
+        bump_version(GENERATION_KEY)
+    else:
+        bump_version(user_version_key(account_pk))
+
+
+def _cached(namespace, key, compute):
+    return cached_call(
+        namespace,
+        key,
+        compute,
+        ttl=getattr(settings, 'RECOMMENDATION_CACHE_TTL', 300),
+        stale_ttl=getattr(settings, 'RECOMMENDATION_CACHE_STALE_TTL', 3600),
+    )
+
+
+def _books_in_order(book_ids):
+    books = (
+        Book.objects
+        .filter(book_id__in=book_ids)
+        .select_related('author', 'publisher')
+        .prefetch_related('categories')
+    )
+    book_dict = {book.book_id: book for book in books}
+    return [book_dict[bid] for bid in book_ids if bid in book_dict]
+
+
+# Serving path only: this module is imported by every web worker, so it must
+# not pull in pandas/mlxtend/scipy. Mining lives in library.mining and is
+# loaded on demand.
 class RecommendationService:
-    def __init__(self, min_support=0.01, min_confidence=0.1, min_lift=1.0):
+    def __init__(self, min_support=0.01, min_confidence=0.1, min_lift=1.0, algorithm='apriori'):
+        if algorithm not in MINING_ALGORITHMS:
+            raise ValueError(f"Unknown mining algorithm: {algorithm}")
         self.min_support = min_support
         self.min_confidence = min_confidence
         self.min_lift = min_lift
-    
-    def _get_monthly_baskets(self):
-        borrows = Borrow.objects.select_related('user', 'book').order_by('user', 'borrow_date')
+        self.algorithm = algorithm
 
-        baskets = defaultdict(set)
-        
-        for borrow in borrows:
-            year_month = borrow.borrow_date.strftime('%Y-%m')
-            basket_key = f"{borrow.user.id}_{year_month}"
-            baskets[basket_key].add(borrow.book.book_id)
-
-        transactions = [
-            list(books) for books in baskets.values() 
-            if len(books) >= 2
-        ]
-        
-        return transactions
-    
-    def _create_transaction_matrix(self, transactions):
-        if not transactions:
-            return None
-            
-        te = TransactionEncoder()
-        te_array = te.fit_transform(transactions)
-        df = pd.DataFrame(te_array, columns=te.columns_)
-        return df
-    
-    def mine_association_rules(self):
-        transactions = self._get_monthly_baskets()
-        print(f"Found {len(transactions)} valid baskets")
-        
-        if len(transactions) < 5:
-            print("Go get more database record")
-            return 0
+    def _get_miner(self):
+        from library.mining import RuleMiner
 
-        df = self._create_transaction_matrix(transactions)
-        if df is None: 
-            return 0
-        
-        print(f"   Transaction matrix shape: {df.shape}")
+        return RuleMiner(
+            min_support=self.min_support,
+            min_confidence=self.min_confidence,
+            min_lift=self.min_lift,
+            algorithm=self.algorithm
+        )
 
-        try:
-            frequent_itemsets = apriori(
-                df, 
-                min_support=self.min_support, 
-                use_colnames=True
-            )
-            
-            if frequent_itemsets.empty:
-                print("No frequent itemsets found.")
-                return 0
-            
-            print(f"Found {len(frequent_itemsets)} frequent itemsets")
-
-            rules = association_rules(
-                frequent_itemsets, 
-                metric="lift", 
-                min_threshold=self.min_lift
-            )
+    def mine_association_rules(self):
+        return self._get_miner().mine_association_rules()
 
-            rules = rules[rules['confidence'] >= self.min_confidence]
-            
-            print(f"Generated {len(rules)} association rules")
-            
-        except Exception as e:
-            print(f"Error during mining: {e}")
-            return 0
-        
-        return self._save_rules_to_db(rules)
-    
-    def _save_rules_to_db(self, rules_df):
-        BookAssociationRule.objects.all().delete()
-        
-        rules_to_create = []
-        
-        for _, row in rules_df.iterrows():
-            antecedents = list(row['antecedents'])
-            consequents = list(row['consequents'])
-            
-            if len(antecedents) == 1 and len(consequents) == 1:
-                ant_book_id = antecedents[0]
-                cons_book_id = consequents[0]
-                
-                try:
-                    rules_to_create.append(
-                        BookAssociationRule(
-                            antecedent_book_id=ant_book_id,
-                            consequent_book_id=cons_book_id,
-                            support=row['support'],
-                            confidence=row['confidence'],
-                            lift=row['lift']
-                        )
-                    )
-                except Exception as e:
-                    continue
-
-        with transaction.atomic():
-            BookAssociationRule.objects.bulk_create(
-                rules_to_create, 
-                ignore_conflicts=True
-            )
-        
-        print(f"   ✅ Saved {len(rules_to_create)} rules to database")
-        return len(rules_to_create)
+    def mine_rules_from_transactions(self, transactions):
+        return self._get_miner().mine_rules_from_transactions(transactions)
     
     @staticmethod
-    def get_recommendations_for_book(book_id, limit=5):
-        rules = BookAssociationRule.objects.filter(
-            antecedent_book_id=book_id
-        ).select_related('consequent_book').order_by('-lift', '-confidence')[:limit]
-        
-        rec_books = [rule.consequent_book for rule in rules]
+    def get_content_recommendations(book_ids, limit=5, exclude=()):
+        index = get_content_index()
+        if index is None:
+            return []
+        return _books_in_order(index.similar_to_books(book_ids, limit=limit, exclude=exclude))
+
+    @staticmethod
+    def get_recommendations_for_book(book_id, limit=5, engine=None):
+        engine = _get_engine(engine)
+        generation = get_version(GENERATION_KEY)
+        return _cached(
+            'book',
+            f"rec:book:{generation}:{engine}:{book_id}:{limit}",
+            lambda: RecommendationService._compute_recommendations_for_book(book_id, limit, engine),
+        )
+
+    @staticmethod
+    @read_from_replica()
+    def _compute_recommendations_for_book(book_id, limit, engine):
+        if engine == 'content':
+            rec_books = []
+        elif engine == 'itemcf':
+            neighbour_ids = list(
+                BookSimilarity.objects
+                .filter(book_id=book_id)
+                .order_by('-score')
+                .values_list('similar_book_id', flat=True)[:limit]
+            )
+            rec_books = _books_in_order(neighbour_ids)
+        elif get_rule_set() is not None:
+            rec_books = _books_in_order(get_rule_set().for_book(book_id, limit=limit))
+        else:
+            rules = BookAssociationRule.objects.filter(
+                antecedent_book_id=book_id
+            ).select_related('consequent_book').order_by('-lift', '-confidence')[:limit]
+
+            rec_books = [rule.consequent_book for rule in rules]
         
         if rec_books:
             return rec_books
 
+        # Fallback: content similarity, which also covers books with no
+        # borrow history yet
+        rec_books = RecommendationService.get_content_recommendations([book_id], limit=limit)
+        if rec_books:
+            return rec_books
+
         # Fallback: Suggest books from the same category
-        try:
-            book = Book.objects.get(pk=book_id)
-            similar_books = (
-                Book.objects.filter(categories__in=book.categories.all())
-                .exclude(book_id=book_id)
-                .distinct()[:limit]
-            )
-            if similar_books.exists():
-                return list(similar_books)
-        except Book.DoesNotExist:
-            pass
+        similar_books = list(
+            Book.objects.filter(categories__books=book_id)
+            .exclude(book_id=book_id)
+            .distinct()[:limit]
+        )
+        if similar_books:
+            return similar_books
         
         # Fallback: Suggest popular books
         return RecommendationService.get_popular_books(limit=limit)
     
     @staticmethod
-    def get_recommendations_for_user(account, limit=10):
+    def get_recommendations_for_user(account, limit=10, engine=None):
         if not account: 
             return []
 
+        engine = _get_engine(engine)
+        generation = get_version(GENERATION_KEY)
+        user_version = get_version(user_version_key(account.pk))
+        return _cached(
+            'user',
+            f"rec:user:{generation}:{engine}:{account.pk}:{user_version}:{limit}",
+            lambda: RecommendationService._compute_recommendations_for_user(account, limit, engine),
+        )
+
+    @staticmethod
+    @read_from_replica()
+    def _compute_recommendations_for_user(account, limit, engine):
         borrowed_book_ids = set(
             Borrow.objects.filter(user=account)
             .values_list('book_id', flat=True)
@@ -160,6 +177,20 @@ class RecommendationService:
             # fallback: suggest most popular books
             return RecommendationService.get_popular_books(limit=limit)
 
+        if engine == 'itemcf':
+            rec_books = RecommendationService._get_itemcf_recommendations(borrowed_book_ids, limit)
+            return rec_books or RecommendationService.get_popular_books(limit=limit)
+        if engine == 'content':
+            rec_books = RecommendationService.get_content_recommendations(
+                borrowed_book_ids, limit=limit, exclude=borrowed_book_ids
+            )
+            return rec_books or RecommendationService.get_popular_books(limit=limit)
+
+        rule_set = get_rule_set()
+        if rule_set is not None:
+            rec_books = _books_in_order(rule_set.for_books(borrowed_book_ids, limit=limit))
+            return rec_books or RecommendationService.get_popular_books(limit=limit)
+
         rules = BookAssociationRule.objects.filter(
             antecedent_book_id__in=borrowed_book_ids
         ).exclude(
@@ -195,18 +226,32 @@ class RecommendationService:
         return rec_books
     
     @staticmethod
-    def get_popular_books(limit=10):
-        from django.db.models import Count
-        
-        popular_book_ids = (
-            Borrow.objects
-            .values('book_id')
-            .annotate(borrow_count=Count('borrow_id'))
-            .order_by('-borrow_count')[:limit]
+    def _get_itemcf_recommendations(borrowed_book_ids, limit):
+        # Score each candidate by the summed similarity to everything the
+        # user has borrowed; the aggregation runs in SQL.
+        scored = (
+            BookSimilarity.objects
+            .filter(book_id__in=borrowed_book_ids)
+            .exclude(similar_book_id__in=borrowed_book_ids)
+            .values('similar_book_id')
+            .annotate(total=Sum('score'))
+            .order_by('-total')[:limit]
         )
-        
-        book_ids = [item['book_id'] for item in popular_book_ids]
-        books = Book.objects.filter(book_id__in=book_ids).select_related('author', 'publisher')
+        return _books_in_order([item['similar_book_id'] for item in scored])
 
-        book_dict = {book.book_id: book for book in books}
-        return [book_dict[bid] for bid in book_ids if bid in book_dict]
\ No newline at end of file
+    @staticmethod
+    def get_popular_books(limit=10, window='all', category_id=None):
+        return _cached(
+            'popular',
+            f"rec:popular:{window}:{category_id or ''}:{limit}",
+            lambda: RecommendationService._compute_popular_books(limit, window, category_id),
+        )
+
+    @staticmethod
+    @read_from_replica()
+    def _compute_popular_books(limit, window, category_id):
+        # Reads the BookPopularity counters kept up to date by signals and
+        # the rollup_popularity job instead of aggregating Borrow.
+        return _books_in_order(
+            get_popular_book_ids(limit=limit, window=window, category_id=category_id)
+        )
@@ -0,0 +1,144 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Khung tối đa (rộng, cao) của từng cỡ ảnh; tỉ lệ ảnh gốc được giữ nguyên.
+# thumb: ảnh nhỏ trong thông báo / thẻ mượn, card: lưới sách, detail: modal chi tiết.
+RENDITIONS = {
+    'thumb': (120, 180),
+    'card': (300, 400),
+    'detail': (600, 800),
+}
+RENDITION_DIR = 'renditions'
+CACHE_PREFIX = 'rendition'
+QUALITY = {'webp': 80, 'jpeg': 85}
+
+
+def get_format():
+    """WebP when this Pillow build supports it, JPEG otherwise."""
+    from PIL import features
+
+    fmt = getattr(settings, 'RENDITION_FORMAT', 'webp')
+    if fmt == 'webp' and not features.check('webp'):
+        return 'jpeg'
+    return fmt
+
+
+def rendition_name(source_name, size, fmt):
+    """books/c.jpg -> renditions/card/books/c.webp (relative to MEDIA_ROOT)."""
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    stem = os.path.splitext(source_name)[0]
+    return f"{RENDITION_DIR}/{size}/{stem}.{extension}"
+
+
+def render_file(source_path, targets, fmt, force=False):
+    """Write the renditions of one image; runs without Django so it can go to a worker process.
+
+    ``targets`` maps size -> output path. Returns {size: (width, height)}.
+    Renditions newer than the source are kept unless ``force``.
+    """
+    from PIL import Image, ImageOps
+
+    source_mtime = os.stat(source_path).st_mtime
+    results = {}
+    image = None
+    try:
+        for size, target in targets.items():
+            target = Path(target)
+            if not force and target.exists() and target.stat().st_mtime >= source_mtime:
+                with Image.open(target) as existing:
+                    results[size] = existing.size
+                continue
+
+            if image is None:
+                image = Image.open(source_path)
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            resized = image.copy()
+            resized.thumbnail(RENDITIONS[size], Image.LANCZOS)
+            if fmt == 'jpeg' and resized.mode != 'RGB':
+                # JPEG không có kênh alpha: đặt ảnh lên nền trắng
+                background = Image.new('RGB', resized.size, (255, 255, 255))
+                background.paste(resized, mask=resized.getchannel('A'))
+                resized = background
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            resized.save(tmp_path, format=fmt.upper(), quality=QUALITY.get(fmt, 85), optimize=True)
+            os.replace(tmp_path, target)
+            results[size] = resized.size
+    finally:
+        if image is not None:
+            image.close()
+    return results
+
+
+def rendition_targets(source_name, sizes, fmt):
+    media_root = Path(settings.MEDIA_ROOT)
+    return {size: media_root / rendition_name(source_name, size, fmt) for size in sizes}
+
+
+def rendition_cache():
+    # Cache riêng (settings.CACHES['renditions']): mỗi ảnh một mục cho mỗi cỡ, không
+    # được chen vào giới hạn 300 mục của cache mặc định và đẩy mục gợi ý ra ngoài
+    return caches['renditions'] if 'renditions' in settings.CACHES else caches['default']
+
+
+def cache_key(source_name, size):
+    return f"{CACHE_PREFIX}:{size}:{source_name}"
+
+
+def generate_renditions(image, sizes=None, force=False):
+    """Create (or refresh) the renditions of an ImageField file and cache their URL/dimensions."""
+    if not image:
+        return {}
+    from django.core.files.storage import default_storage
+
+    sizes = sizes or tuple(RENDITIONS)
+    fmt = get_format()
+    dimensions = render_file(image.path, rendition_targets(image.name, sizes, fmt), fmt, force=force)
+    renditions = {}
+    for size, (width, height) in dimensions.items():
+        info = {
+            'url': default_storage.url(rendition_name(image.name, size, fmt)),
+            'width': width,
+            'height': height,
+        }
+        rendition_cache().set(cache_key(image.name, size), info, None)
+        renditions[size] = info
+    return renditions
+
+
+def get_rendition(image, size='card'):
+    """Return {'url', 'width', 'height'} for the rendition, generating it on first use.
+
+    Falls back to the original upload (no size hints) if it cannot be rendered.
+    """
+    if not image:
+        return None
+    if size not in RENDITIONS:
+        raise ValueError(f"Unknown rendition size: {size}")
+
+    info = rendition_cache().get(cache_key(image.name, size))
+    if info is not None:
+        return info
+    try:
+        return generate_renditions(image, sizes=(size,))[size]
+    except (OSError, ValueError) as e:
+        print("Rendition error:", image.name, e)
+        return {'url': image.url, 'width': None, 'height': None}
+
+
+def delete_renditions(source_name):
+    media_root = Path(settings.MEDIA_ROOT)
+    for size in RENDITIONS:
+        for fmt in ('webp', 'jpeg'):
+            path = media_root / rendition_name(source_name, size, fmt)
+            if path.exists():
+                path.unlink()
+        rendition_cache().delete(cache_key(source_name, size))
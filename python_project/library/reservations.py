@@ -0,0 +1,138 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from library.emails import send_expired_email, send_waitlist_email
+from library.models import Book, Borrow, WaitlistEntry
+from library.popularity import record_borrow
+from library.recommendation import invalidate_recommendations
+
+
+def promote_waitlists(book_ids):
+    """Reserve the free copies (available - reserved) of ``book_ids`` for the heads of their queues.
+
+    Used for one book (a return or a cancelled reservation) and for many
+    (expire_reservations) alike: one bulk_create and one DELETE. Queued users
+    who already reserved, requested or borrowed the book are dropped from the
+    queue instead of getting a second copy. Borrow's save signals are not
+    sent, so popularity and recommendations are updated here, grouped by book
+    and user. Must run inside a transaction; returns the new reserved Borrows.
+    """
+    book_ids = set(
+        WaitlistEntry.objects.filter(book_id__in=set(book_ids))
+        .values_list('book_id', flat=True).distinct().order_by()
+    )
+    if not book_ids:
+        return []
+
+    reserved = dict(
+        Borrow.objects.filter(book_id__in=book_ids, status='reserved')
+        .values_list('book_id').annotate(n=Count('borrow_id')).order_by()
+    )
+    free = {
+        book_id: available - reserved.get(book_id, 0)
+        for book_id, available in Book.objects.filter(pk__in=book_ids).values_list('book_id', 'available')
+    }
+    free = {book_id: n for book_id, n in free.items() if n > 0}
+    if not free:
+        return []
+
+    # Người đã đặt / đang mượn chính sách đó thì bỏ khỏi hàng chờ, không giữ thêm bản
+    active = set(
+        Borrow.objects.filter(book_id__in=free, status__in=['reserved', 'borrowed', 'pending', 'await_return'])
+        .values_list('book_id', 'user_id')
+    )
+    heads, dropped = [], []
+    taken = Counter()
+    entries = (
+        WaitlistEntry.objects.select_for_update()
+        .filter(book_id__in=free)
+        .select_related('user', 'book')
+        .order_by('book_id', 'created_at', 'pk')
+    )
+    for entry in entries:
+        if (entry.book_id, entry.user_id) in active:
+            dropped.append(entry.pk)
+        elif taken[entry.book_id] < free[entry.book_id]:
+            taken[entry.book_id] += 1
+            heads.append(entry)
+    if not heads and not dropped:
+        return []
+
+    today = date.today()
+    promoted = Borrow.objects.bulk_create([
+        Borrow(user=entry.user, book=entry.book, status='reserved', borrow_date=today)
+        for entry in heads
+    ])
+    WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in heads] + dropped).delete()
+
+    for book_id, count in Counter(borrow.book_id for borrow in promoted).items():
+        record_borrow(book_id, today, count)
+    for user_pk in {borrow.user_id for borrow in promoted}:
+        invalidate_recommendations(user_pk)
+    return promoted
+
+
+def notify(expired=(), promoted=()):
+    """Bump the borrow version once and email everyone over a single SMTP connection."""
+    from library.signals import bump
+
+    bump()
+    if not expired and not promoted:
+        return
+    connection = get_connection()
+    try:
+        connection.open()
+        for borrow in expired:
+            send_expired_email(borrow, connection=connection)
+        for borrow in promoted:
+            send_waitlist_email(borrow, connection=connection)
+    except Exception as e:
+        print(f"Lỗi kết nối email: {e}")
+    finally:
+        connection.close()
+
+
+def promote_and_notify(book_ids):
+    """promote_waitlists(), emailing the promoted users once the transaction commits."""
+    promoted = promote_waitlists(book_ids)
+    if promoted:
+        transaction.on_commit(lambda: notify(promoted=promoted))
+    return promoted
+
+
+def expire_reservations(hold_days=None):
+    """Expire reservations older than ``hold_days`` and hand the copies to the waitlists.
+
+    The stale rows are flipped with a single UPDATE that stamps them with
+    this run's updated_at, which is then used to read back exactly the rows
+    this run expired. Promotions happen in the same transaction; afterwards
+    notify() bumps the borrow version once and sends all emails. Returns
+    (expired, promoted) counts.
+    """
+    if hold_days is None:
+        hold_days = settings.RESERVATION_HOLD_DAYS
+    cutoff = date.today() - timedelta(days=hold_days)
+    now = timezone.now()
+
+    with transaction.atomic():
+        expired = Borrow.objects.filter(status='reserved', borrow_date__lt=cutoff).update(
+            status='expired', updated_at=now
+        )
+        if not expired:
+            return 0, 0
+        expired_rows = list(
+            Borrow.objects.filter(status='expired', updated_at=now).select_related('user', 'book')
+        )
+        promoted = promote_waitlists({borrow.book_id for borrow in expired_rows})
+
+    notify(expired_rows, promoted)
+
+    books = len({borrow.book_id for borrow in expired_rows})
+    print(f"   Expired {expired} reservations on {books} books, promoted {len(promoted)} from waitlists")
+    return expired, len(promoted)
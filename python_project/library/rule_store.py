@@ -0,0 +1,207 @@
+import json
+import os
+import struct
+import threading
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from library.models import Book, BookAssociationRule
+
+
+# Columnar layout of an exported rule set (.npz, stored uncompressed so that
+# every column can be memory-mapped straight out of the archive).
+# Rows are sorted by antecedent, then by -lift, -confidence.
+COLUMNS = {
+    'antecedent': 'int64',
+    'consequent': 'int64',
+    'support': 'float32',
+    'confidence': 'float32',
+    'lift': 'float32',
+}
+FORMAT_VERSION = 1
+
+
+def export_rules(path):
+    """Write every BookAssociationRule to ``path``; returns the number of rules."""
+    import numpy as np
+
+    rows = (
+        BookAssociationRule.objects
+        .order_by('antecedent_book_id', '-lift', '-confidence')
+        .values_list('antecedent_book_id', 'consequent_book_id', 'support', 'confidence', 'lift')
+    )
+    columns = {name: [] for name in COLUMNS}
+    for row in rows.iterator(chunk_size=10000):
+        for name, value in zip(COLUMNS, row):
+            columns[name].append(value)
+
+    arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'rules': len(arrays['antecedent']),
+        'exported_at': timezone.now().isoformat(),
+    }
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open('wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return meta['rules']
+
+
+def _mmap_npz(path):
+    """Memory-map each member of an uncompressed .npz; None if it is compressed."""
+    import numpy as np
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            # Local file header: 30 fixed bytes, then name and extra field.
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-len('.npy')]
+            if not shape or shape[0] == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode='r', offset=f.tell(),
+                    shape=shape, order='F' if fortran_order else 'C'
+                )
+    return arrays
+
+
+class RuleSet:
+    """Read-only rule set served directly from an exported file."""
+
+    def __init__(self, path):
+        import numpy as np
+
+        arrays = _mmap_npz(path)
+        if arrays is None:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+
+        self.meta = json.loads(bytes(arrays['meta']).decode('utf-8'))
+        if self.meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported rule file version: {self.meta.get('format_version')}")
+
+        self.antecedent = arrays['antecedent']
+        self.consequent = arrays['consequent']
+        self.support = arrays['support']
+        self.confidence = arrays['confidence']
+        self.lift = arrays['lift']
+
+    def __len__(self):
+        return len(self.antecedent)
+
+    def _slice(self, book_id):
+        import numpy as np
+
+        start = int(np.searchsorted(self.antecedent, book_id, side='left'))
+        end = int(np.searchsorted(self.antecedent, book_id, side='right'))
+        return start, end
+
+    def for_book(self, book_id, limit=5):
+        start, end = self._slice(book_id)
+        end = min(end, start + limit)
+        return [int(book) for book in self.consequent[start:end]]
+
+    def for_books(self, book_ids, limit=10):
+        """Score consequents by summed lift * confidence, like the ORM user path."""
+        scores = defaultdict(float)
+        for book_id in book_ids:
+            start, end = self._slice(book_id)
+            for consequent, lift, confidence in zip(
+                self.consequent[start:end], self.lift[start:end], self.confidence[start:end]
+            ):
+                consequent = int(consequent)
+                if consequent not in book_ids:
+                    scores[consequent] += float(lift) * float(confidence)
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+
+def import_rules(path, batch_size=5000):
+    """Replace BookAssociationRule with the rules in ``path``.
+
+    Rules that reference books missing from this database are skipped.
+    Returns (imported, skipped).
+    """
+    rule_set = RuleSet(path)
+    existing = set(Book.objects.values_list('book_id', flat=True))
+
+    imported = 0
+    skipped = 0
+    with transaction.atomic():
+        BookAssociationRule.objects.all().delete()
+        batch = []
+        for start in range(0, len(rule_set), batch_size):
+            end = start + batch_size
+            for ant, cons, support, confidence, lift in zip(
+                rule_set.antecedent[start:end].tolist(),
+                rule_set.consequent[start:end].tolist(),
+                rule_set.support[start:end].tolist(),
+                rule_set.confidence[start:end].tolist(),
+                rule_set.lift[start:end].tolist(),
+            ):
+                if ant not in existing or cons not in existing:
+                    skipped += 1
+                    continue
+                batch.append(BookAssociationRule(
+                    antecedent_book_id=ant,
+                    consequent_book_id=cons,
+                    support=support,
+                    confidence=confidence,
+                    lift=lift,
+                ))
+            BookAssociationRule.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+            imported += len(batch)
+            batch = []
+
+    from library.recommendation import invalidate_recommendations
+    invalidate_recommendations()
+    return imported, skipped
+
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def get_rule_set():
+    """Return the RuleSet at settings.RULES_FILE, reloaded when the file changes; None if unset."""
+    global _loaded
+
+    path = getattr(settings, 'RULES_FILE', None)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if _loaded is not None and _loaded[0] == key:
+        return _loaded[1]
+
+    with _lock:
+        if _loaded is None or _loaded[0] != key:
+            _loaded = (key, RuleSet(path))
+    return _loaded[1]
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from library.job_runner import execute_command, init_process
+from library.metrics import JOB_RUNS, JOB_SECONDS
+from library.models import JobRun, ScheduledJob
+
+
+# Giữ tối đa bấy nhiêu ký tự output của mỗi lần chạy trong JobRun
+MAX_OUTPUT = 10_000
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def sync_jobs():
+    """Create the jobs of settings.SCHEDULED_JOBS that are not in the table yet.
+
+    Existing rows are left alone, so intervals changed in the admin are kept.
+    Returns the names of the jobs created.
+    """
+    definitions = getattr(settings, 'SCHEDULED_JOBS', {})
+    existing = set(ScheduledJob.objects.values_list('name', flat=True))
+    created = [
+        ScheduledJob(
+            name=name,
+            command=definition['command'],
+            args=list(definition.get('args', [])),
+            interval_seconds=definition['interval'],
+        )
+        for name, definition in definitions.items()
+        if name not in existing
+    ]
+    ScheduledJob.objects.bulk_create(created)
+    return [job.name for job in created]
+
+
+def _unlocked(now):
+    return Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+
+
+def due_jobs(limit):
+    now = timezone.now()
+    return list(
+        ScheduledJob.objects
+        .filter(enabled=True, next_run_at__lte=now)
+        .filter(_unlocked(now))
+        .order_by('next_run_at')[:limit]
+    )
+
+
+def claim(job, worker, lease_seconds):
+    """Take the lease on a due job; False if another worker got it first."""
+    now = timezone.now()
+    claimed = (
+        ScheduledJob.objects
+        .filter(pk=job.pk, enabled=True, next_run_at__lte=now)
+        .filter(_unlocked(now))
+        .update(locked_by=worker, locked_until=now + timedelta(seconds=lease_seconds))
+    )
+    if claimed:
+        # Lần chạy trước của worker đã chết (lease hết hạn) không bao giờ được đóng
+        JobRun.objects.filter(job=job, status='running').update(
+            status='failed', finished_at=now, output='Lease expired before the run finished.'
+        )
+    return bool(claimed)
+
+
+def renew(job_ids, worker, lease_seconds):
+    ScheduledJob.objects.filter(pk__in=job_ids, locked_by=worker).update(
+        locked_until=timezone.now() + timedelta(seconds=lease_seconds)
+    )
+
+
+def release(job, worker, started_at):
+    """Drop the lease and schedule the next run one interval after this one started."""
+    return ScheduledJob.objects.filter(pk=job.pk, locked_by=worker).update(
+        locked_by='',
+        locked_until=None,
+        last_run_at=started_at,
+        next_run_at=started_at + timedelta(seconds=job.interval_seconds),
+    )
+
+
+class Scheduler:
+    """Claim due jobs and run them on a bounded thread or process pool."""
+
+    def __init__(self, workers=2, processes=False, lease_seconds=300, poll_seconds=5, log=print):
+        self.workers = max(1, workers)
+        self.processes = processes
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.log = log
+        self.worker = worker_id()
+        self.stopping = threading.Event()
+        self.running = {}
+
+    def stop(self):
+        self.stopping.set()
+
+    def _pool(self):
+        if self.processes:
+            # spawn: không fork tiến trình đang giữ kết nối DB và luồng
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_process,
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def run(self, once=False):
+        """Loop until stop(); with ``once``, run the jobs due now and return."""
+        last_renew = time.monotonic()
+        with self._pool() as pool:
+            while True:
+                self._collect()
+
+                if self.running and time.monotonic() - last_renew >= self.lease_seconds / 3:
+                    renew([job.pk for job, _, _ in self.running.values()], self.worker, self.lease_seconds)
+                    last_renew = time.monotonic()
+
+                started = 0
+                if not self.stopping.is_set():
+                    started = self._start_due(pool)
+
+                if not self.running and (self.stopping.is_set() or (once and not started)):
+                    break
+                if self.running:
+                    wait(list(self.running), timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                elif not once:
+                    self.stopping.wait(self.poll_seconds)
+
+    def _start_due(self, pool):
+        free = self.workers - len(self.running)
+        if free <= 0:
+            return 0
+        started = 0
+        for job in due_jobs(free):
+            if not claim(job, self.worker, self.lease_seconds):
+                continue
+            run = JobRun.objects.create(job=job, worker=self.worker)
+            self.log(f"Starting {job.name} ({' '.join([job.command, *job.args])})")
+            future = pool.submit(execute_command, job.command, job.args)
+            self.running[future] = (job, run, time.perf_counter())
+            started += 1
+        return started
+
+    def _collect(self):
+        for future in [f for f in self.running if f.done()]:
+            job, run, started = self.running.pop(future)
+            duration = time.perf_counter() - started
+            try:
+                ok, output = future.result()
+            except Exception:
+                # Tiến trình con chết (BrokenProcessPool...) cũng là một lần chạy lỗi
+                ok, output = False, traceback.format_exc()
+
+            status = 'success' if ok else 'failed'
+            JobRun.objects.filter(pk=run.pk).update(
+                status=status,
+                finished_at=timezone.now(),
+                duration=duration,
+                output=output[-MAX_OUTPUT:],
+            )
+            if not release(job, self.worker, run.started_at):
+                self.log(f"Lease on {job.name} was lost while it ran; next run left to the new owner")
+            JOB_RUNS.inc(job=job.name, result=status)
+            JOB_SECONDS.observe(duration, job=job.name)
+            self.log(f"Finished {job.name}: {status} in {duration:.1f}s")
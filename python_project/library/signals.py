@@ -1,11 +1,15 @@
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
-from django.core.mail import send_mail
-from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.utils.html import strip_tags
-from .models import Borrow
+from django.db import transaction
+from .models import Account, Book, Borrow, WaitlistEntry
+from .emails import STYLE_CONTAINER, STYLE_FOOTER, STYLE_HIGHLIGHT, STYLE_TEXT, header_style, send_email
+from .metrics import BORROW_TRANSITIONS
+from .middleware import invalidate_account
+from .popularity import record_borrow
+from .recommendation import invalidate_recommendations
+from .renditions import delete_renditions, generate_renditions
 
 BORROW_VERSION_KEY = "borrows_version"
 
@@ -45,11 +49,33 @@ def track_status_change(sender, instance, **kwargs):
             instance._old_status = None
 
 
+@receiver(post_save, sender=Borrow)
+def update_popularity_on_create(sender, instance, created, **kwargs):
+    if created:
+        record_borrow(instance.book_id, instance.borrow_date, 1)
+        invalidate_recommendations(instance.user_id)
+
+
+@receiver(post_delete, sender=Borrow)
+def update_popularity_on_delete(sender, instance, **kwargs):
+    record_borrow(instance.book_id, instance.borrow_date, -1)
+    invalidate_recommendations(instance.user_id)
+
+
 @receiver(post_save, sender=Borrow)
 def borrow_changed(sender, instance, created, **kwargs):
     bump()
 
-    if not created:
+    if created:
+        BORROW_TRANSITIONS.inc(from_status='new', to_status=instance.status)
+    else:
+        old_status = getattr(instance, '_old_status', None)
+        new_status = instance.status
+
+        if old_status == new_status:
+            return
+        BORROW_TRANSITIONS.inc(from_status=old_status, to_status=new_status)
+
         user_email = instance.user.email
         if not user_email:
             return
@@ -57,21 +83,15 @@ def borrow_changed(sender, instance, created, **kwargs):
         book_name = instance.book.book_name
         user_name = instance.user.account_name
 
-        old_status = getattr(instance, '_old_status', None)
-        new_status = instance.status
-
-        if old_status == new_status:
-            return
-
         subject = ""
         html_content = ""
 
-        style_container = "font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e5e7eb; border-radius: 10px; background-color: #ffffff;"
-        style_header = "color: #1851A8; font-size: 24px; font-weight: 700; margin-bottom: 20px; border-bottom: 2px solid #1851A8; padding-bottom: 10px;"
-        style_text = "font-size: 16px; line-height: 1.6; color: #333333; margin-bottom: 15px;"
-        style_highlight = "color: #1851A8; font-weight: 600;"
+        style_container = STYLE_CONTAINER
+        style_header = header_style("#1851A8")
+        style_text = STYLE_TEXT
+        style_highlight = STYLE_HIGHLIGHT
         style_warning = "color: #d97706; font-weight: 600;"
-        style_footer = "margin-top: 30px; font-size: 14px; color: #6b7280; border-top: 1px solid #e5e7eb; padding-top: 15px;"
+        style_footer = STYLE_FOOTER
 
         if new_status == 'borrowed':
             display_date = instance.due_date.strftime('%d/%m/%Y') if instance.due_date else "Chưa xác định"
@@ -116,8 +136,7 @@ def borrow_changed(sender, instance, created, **kwargs):
                 overdue_status = f"Quá hạn ({days_late} ngày)"
                 style_overdue = "color: #dc2626; font-weight: bold;"  # Màu đỏ
 
-            header_color = "#dc2626" if instance.fine > 0 else "#059669"
-            style_header_return = f"color: {header_color}; font-size: 24px; font-weight: 700; margin-bottom: 20px; border-bottom: 2px solid {header_color}; padding-bottom: 10px;"
+            style_header_return = header_style("#dc2626" if instance.fine > 0 else "#059669")
 
             html_content = f"""
             <div style="{style_container}">
@@ -143,22 +162,51 @@ def borrow_changed(sender, instance, created, **kwargs):
             """
 
         if subject and html_content:
-            try:
-                text_content = strip_tags(html_content)
-
-                send_mail(
-                    subject=subject,
-                    message=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user_email],
-                    html_message=html_content,
-                    fail_silently=False
-                )
-                print(f"HTML Email sent successfully to {user_email}")
-            except Exception as e:
-                print(f"Lỗi gửi email: {e}")
+            # Gửi sau khi commit: không giữ khóa ghi của SQLite trong lúc chờ SMTP,
+            # và không gửi nếu giao dịch bị rollback
+            transaction.on_commit(lambda: send_email('borrow_status', user_email, subject, html_content))
 
 
 @receiver(post_delete, sender=Borrow)
 def borrow_deleted(sender, instance, **kwargs):
-    bump()
\ No newline at end of file
+    bump()
+
+
+@receiver(pre_save, sender=Book)
+def track_image_change(sender, instance, update_fields=None, **kwargs):
+    # Borrow.save chỉ cập nhật 'available': không cần đọc lại ảnh cũ
+    instance._image_unchanged = update_fields is not None and 'image' not in update_fields
+    instance._old_image = None
+    if instance.pk and not instance._image_unchanged:
+        instance._old_image = Book.objects.filter(pk=instance.pk).values_list('image', flat=True).first() or None
+
+
+@receiver(post_save, sender=Book)
+def build_image_renditions(sender, instance, **kwargs):
+    if getattr(instance, '_image_unchanged', False):
+        return
+    old_image = getattr(instance, '_old_image', None)
+    changed = old_image != (instance.image.name or None)
+    try:
+        if changed and old_image:
+            delete_renditions(old_image)
+        if instance.image and changed:
+            generate_renditions(instance.image, force=True)
+    except (OSError, ValueError) as e:
+        print("Rendition error:", e)
+
+
+@receiver(post_save, sender=Book)
+def promote_waitlist_on_restock(sender, instance, created, update_fields=None, **kwargs):
+    # Borrow.save (update_fields=['available']) tự chuyển bản vừa trả cho hàng chờ;
+    # ở đây là admin sửa / nhập thêm sách
+    if created or update_fields is not None:
+        return
+    with transaction.atomic():
+        WaitlistEntry.promote(instance)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def forget_cached_account(sender, instance, **kwargs):
+    invalidate_account(instance.account_id)
@@ -0,0 +1,17 @@
+from django import template
+
+from library.renditions import get_rendition
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(image, size='card'):
+    """{% rendition b.image 'card' as img %} -> img.url, img.width, img.height"""
+    return get_rendition(image, size)
+
+
+@register.filter
+def rendition_url(image, size='card'):
+    info = get_rendition(image, size)
+    return info['url'] if info else ''
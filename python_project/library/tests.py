@@ -1,3 +1,975 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from . import caching, metrics
+from .archive import archive_borrows, returned_history
+from .caching import bump_version, cached_call, get_version
+from .db_router import ReplicaRouter, has_written, primary_scope, read_from_replica
+from .middleware import PrimaryStickyMiddleware, invalidate_account
+from .models import (
+    Account, Author, Book, BookAssociationRule, BookPopularity, Borrow, BorrowArchive, Category, JobRun,
+    Publisher, ScheduledJob, WaitlistEntry,
+)
+from .popularity import rollup
+from .rule_store import RuleSet, export_rules, import_rules
+from .scheduler import Scheduler, claim, sync_jobs
+from .signals import BORROW_VERSION_KEY
+
+
+def explain(queryset):
+    """Return the EXPLAIN QUERY PLAN detail lines of a queryset (SQLite)."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def make_books(count, **fields):
+    author = Author.objects.create(author_name='Author')
+    publisher = Publisher.objects.create(publish_name='Publisher')
+    return [
+        Book.objects.create(book_name=f'Book {i}', author=author, publisher=publisher, **fields)
+        for i in range(count)
+    ]
+
+
+class IsolatedSettingsMixin:
+    """Cache trong bộ nhớ, chỉ mục nội dung và metrics trong thư mục tạm.
+
+    Chạy test không được ghi vào django_cache/, content_index/ hay metrics/
+    của máy đang chạy.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = TemporaryDirectory()
+        cls._isolated = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            CONTENT_INDEX_DIR=cls._tmp.name,
+            METRICS_DIR=cls._tmp.name,
+        )
+        cls._isolated.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            # Bộ đếm còn trong process sẽ được atexit ghi ra METRICS_DIR thật: bỏ đi
+            metrics.flush()
+            with metrics._lock:
+                for metric in metrics._registry.values():
+                    metric.samples.clear()
+            cls._isolated.disable()
+            cls._tmp.cleanup()
+
+
+class HotQueryIndexTests(IsolatedSettingsMixin, TestCase):
+    """Các truy vấn nóng phải dùng index, không quét toàn bảng."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite-specific")
+        plan = explain(queryset)
+        full_scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+        self.assertEqual(full_scans, [], f"full table scan in plan: {plan}")
+        self.assertTrue(any(index_name in line for line in plan), f"{index_name} not used: {plan}")
+
+    def test_user_borrow_panels(self):
+        self.assertUsesIndex(
+            Borrow.objects.filter(user_id=1, status__in=['pending', 'borrowed']).order_by('-borrow_date', '-borrow_id'),
+            'borrow_user_status_idx',
+        )
+        self.assertUsesIndex(
+            Borrow.objects.filter(user_id=1, status='reserved').order_by('-borrow_date'),
+            'borrow_user_status_idx',
+        )
+
+    def test_overdue_borrows(self):
+        self.assertUsesIndex(
+            Borrow.objects.filter(status__in=['reserved', 'borrowed'], due_date__lt=date.today()),
+            'borrow_status_due_idx',
+        )
+
+    def test_reserved_count_for_book(self):
+        self.assertUsesIndex(
+            Borrow.objects.filter(book_id=1, status='reserved').values('pk'),
+            'borrow_book_status_idx',
+        )
+
+    def test_books_ordered_by_name(self):
+        self.assertUsesIndex(Book.objects.order_by('book_name'), 'book_name_idx')
+
+    def test_login_lookup(self):
+        self.assertUsesIndex(
+            Account.objects.filter(username='u', password='p', status='active'),
+            'account_username_idx',
+        )
+
+    def test_rules_for_book(self):
+        self.assertUsesIndex(
+            BookAssociationRule.objects.filter(antecedent_book_id=1).order_by('-lift', '-confidence'),
+            'rule_antecedent_lift_idx',
+        )
+
+
+class SeedLibraryTests(IsolatedSettingsMixin, TestCase):
+    """seed_library sinh dữ liệu nhất quán với logic của Borrow.save()."""
+
+    def seed(self, **options):
+        options = {'accounts': 30, 'authors': 5, 'publishers': 3, 'books': 40, 'stdout': StringIO(), **options}
+        call_command('seed_library', **options)
+
+    def test_counts_and_stock(self):
+        self.seed()
+        self.assertEqual(Account.objects.filter(account_id__startswith='seed-').count(), 30)
+        self.assertEqual(Book.objects.filter(book_name__startswith='[seed] ').count(), 40)
+        self.assertTrue(Borrow.objects.filter(status='returned').exists())
+
+        on_loan = Count('borrow', filter=Q(borrow__status__in=['borrowed', 'await_return']))
+        for book in Book.objects.annotate(on_loan=on_loan):
+            self.assertEqual(book.available, book.quantity - book.on_loan)
+
+    def test_fines_match_model(self):
+        self.seed(accounts=200, books=100)
+        for borrow in Borrow.objects.filter(status='returned').select_related('book'):
+            self.assertEqual(borrow.fine, borrow.calculate_fine())
+
+    def test_clear_replaces_previous_run(self):
+        self.seed()
+        self.seed(clear=True, accounts=10)
+        self.assertEqual(Account.objects.filter(account_id__startswith='seed-').count(), 10)
+        self.assertEqual(Book.objects.filter(book_name__startswith='[seed] ').count(), 40)
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)')
+_COLUMNS = re.compile(r'^SELECT .*? FROM', re.S)
+
+
+def query_shape(sql):
+    """SQL with literals, IN-list lengths and the column list removed, so one N+1 query is one shape."""
+    sql = _IN_LIST.sub('IN (...)', _LITERAL.sub('?', sql))
+    return _COLUMNS.sub('SELECT ... FROM', sql)
+
+
+# Mỗi trang được đo ở hai cỡ dữ liệu; số truy vấn phải giữ nguyên khi dữ liệu tăng.
+# Mỗi mục: (tên, phương thức, tên URL, hàm lấy tham số URL từ dataset, kiểu đăng nhập, query string)
+QUERY_BUDGET_PAGES = [
+    ('login', 'get', 'login', None, None, ''),
+    ('login_view', 'get', 'login_view', None, None, ''),
+    ('logout', 'post', 'logout', None, 'account', ''),
+    ('home_page_user', 'get', 'home_page_user', None, 'account', ''),
+    ('user_books_author', 'get', 'user_books_author', None, 'account', ''),
+    ('user_books_type', 'get', 'user_books_type', None, 'account', ''),
+    ('user_borrowed', 'get', 'user_borrowed', None, 'account', ''),
+    ('borrowed_history', 'get', 'borrowed_history', None, 'account', ''),
+    ('library_rule', 'get', 'library_rule', None, 'account', ''),
+    ('library_card', 'get', 'library_card', None, 'account', ''),
+    ('notify', 'get', 'notify', None, 'account', ''),
+    ('must_return_book', 'get', 'must_return_book', None, 'account', ''),
+    ('user_books (no recommendations)', 'get', 'user_books', None, None, ''),
+    ('user_books (recommendations)', 'get', 'user_books', None, 'account', ''),
+    ('user_books (search)', 'get', 'user_books', None, 'account', '?keyword=Book&sort=popular'),
+    ('reserve_book', 'post', 'reserve_book', lambda d: [d['free_book'].pk], 'account', ''),
+    ('confirm_return', 'post', 'confirm_return', lambda d: [d['borrowed'].pk], 'account', ''),
+    ('confirm_return (htmx)', 'post', 'confirm_return', lambda d: [d['borrowed_htmx'].pk], 'account', ''),
+    ('cancel_pending_borrow', 'post', 'cancel_pending_borrow', lambda d: [d['reserved'].pk], 'account', ''),
+    ('delete_returned_borrow', 'post', 'delete_returned_borrow', lambda d: [d['returned'].pk], 'account', ''),
+    ('delete_returned_borrow (archived)', 'post', 'delete_returned_borrow', lambda d: [d['archived'].pk], 'account', ''),
+    ('leave_waitlist', 'post', 'leave_waitlist', lambda d: [d['waitlist'].pk], 'account', ''),
+    ('get_pending_requests', 'get', 'get_pending_requests', None, 'account', ''),
+    ('get_user_active_borrows', 'get', 'get_user_active_borrows', None, 'account', ''),
+    ('get_user_returned_history', 'get', 'get_user_returned_history', None, 'account', ''),
+    ('get_user_reserved_books', 'get', 'get_user_reserved_books', None, 'account', ''),
+    ('cache_stats', 'get', 'cache_stats', None, 'staff', ''),
+    ('metrics', 'get', 'metrics', None, 'staff', ''),
+]
+
+
+@override_settings(RULES_FILE='')
+class QueryBudgetTests(IsolatedSettingsMixin, TestCase):
+    """Số truy vấn của mỗi trang không được tăng theo lượng dữ liệu (bắt lỗi N+1)."""
+
+    SMALL, LARGE = 2, 6
+
+    def setUp(self):
+        self.account = Account.objects.create(
+            account_id='budget-user', account_name='Budget User', email='budget@example.com',
+            username='budget', password='pw', phone='0900000000', status='active',
+        )
+        self.staff = get_user_model().objects.create_user('budget-staff', password='pw', is_staff=True)
+        self.batches = 0
+
+    def grow(self, n):
+        """Add n of everything; return the objects the POST pages act on."""
+        today = date.today()
+        targets = {}
+        for _ in range(n):
+            self.batches += 1
+            i = self.batches
+            author = Author.objects.create(author_name=f'Author {i}')
+            publisher = Publisher.objects.create(publish_name=f'Publisher {i}')
+            category = Category.objects.create(category_name=f'Category {i}')
+            books = Book.objects.bulk_create([
+                Book(book_name=f'Book {i}-{k}', author=author, publisher=publisher, quantity=10, available=10)
+                for k in range(8)
+            ])
+            Book.categories.through.objects.bulk_create([
+                Book.categories.through(book_id=book.pk, category_id=category.pk) for book in books
+            ])
+
+            other = Account.objects.create(
+                account_id=f'budget-other-{i}', account_name=f'Other {i}', email=f'o{i}@example.com',
+                username=f'other{i}', password='pw', phone='0900000000', status='active',
+            )
+            rows = [
+                # Người dùng đang test: đủ mọi trạng thái, có phiếu quá hạn và trả trễ
+                Borrow(user=self.account, book=books[0], status='borrowed', due_date=today - timedelta(days=3)),
+                Borrow(user=self.account, book=books[1], status='borrowed', due_date=today + timedelta(days=5)),
+                Borrow(user=self.account, book=books[2], status='borrowed', due_date=today + timedelta(days=9)),
+                Borrow(user=self.account, book=books[3], status='reserved'),
+                Borrow(user=self.account, book=books[4], status='await_return', due_date=today, return_date=today),
+                Borrow(user=self.account, book=books[5], status='returned', borrow_date=today - timedelta(days=30),
+                       due_date=today - timedelta(days=16), return_date=today - timedelta(days=10), fine=18000),
+                Borrow(user=self.account, book=books[6], status='pending'),
+                Borrow(user=other, book=books[0], status='returned', return_date=today),
+                Borrow(user=other, book=books[7], status='returned', return_date=today),
+            ]
+            Borrow.objects.bulk_create(rows)
+            BorrowArchive.objects.create(
+                borrow_id=100000 + i, user=self.account, book=books[5], borrow_date=today - timedelta(days=800),
+                due_date=today - timedelta(days=786), return_date=today - timedelta(days=780), status='returned',
+            )
+            BookAssociationRule.objects.create(
+                antecedent_book=books[0], consequent_book=books[7], support=0.1, confidence=0.5, lift=2.0,
+            )
+            WaitlistEntry.objects.create(book=books[7], user=other)
+            waiting = WaitlistEntry.objects.create(book=books[7], user=self.account)
+            targets = {
+                'free_book': books[6], 'borrowed': rows[1], 'borrowed_htmx': rows[2], 'reserved': rows[3],
+                'returned': rows[5], 'archived': BorrowArchive.objects.get(pk=100000 + i), 'waitlist': waiting,
+            }
+        rollup(full=True)
+        return targets
+
+    def client_for(self, login):
+        client = Client()
+        if login == 'account':
+            session = client.session
+            session['account_id'] = self.account.account_id
+            session.save()
+        elif login == 'staff':
+            client.force_login(self.staff)
+        return client
+
+    def measure(self, targets):
+        """Query shapes per page, each request made with cold caches."""
+        results = {}
+        for name, method, url_name, args, login, query in QUERY_BUDGET_PAGES:
+            client = self.client_for(login)
+            url = reverse(url_name, args=args(targets) if args else None) + query
+            cache.clear()
+            invalidate_account()
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(client, method)(url)
+            self.assertIn(response.status_code, (200, 302), f"{name}: HTTP {response.status_code}")
+            results[name] = Counter(query_shape(q['sql']) for q in ctx.captured_queries)
+        return results
+
+    def test_every_url_is_covered(self):
+        # admin.site.urls là include (URLResolver) nên không nằm trong danh sách này
+        names = {p.name for p in get_resolver().url_patterns if isinstance(p, URLPattern)}
+        covered = {url_name for _, _, url_name, _, _, _ in QUERY_BUDGET_PAGES}
+        self.assertEqual(names - covered, set(), "URLs without a query budget")
+
+    def test_query_count_does_not_grow_with_data(self):
+        small = self.measure(self.grow(self.SMALL))
+        large = self.measure(self.grow(self.LARGE - self.SMALL))
+
+        for name, _, _, _, _, _ in QUERY_BUDGET_PAGES:
+            with self.subTest(page=name):
+                before, after = small[name], large[name]
+                if sum(before.values()) == sum(after.values()):
+                    continue
+                grown = [
+                    f"  {before[shape]} -> {after[shape]}x {shape[:300]}"
+                    for shape in sorted(set(before) | set(after), key=lambda s: after[s] - before[s], reverse=True)
+                    if before[shape] != after[shape]
+                ]
+                self.fail(
+                    f"{name}: {sum(before.values())} queries at scale {self.SMALL}, "
+                    f"{sum(after.values())} at scale {self.LARGE}. Query shapes that changed:\n" + "\n".join(grown)
+                )
+
+
+class SchedulerTests(IsolatedSettingsMixin, TransactionTestCase):
+    """Mỗi lần chạy của một công việc chỉ được một worker nhận (lease)."""
+
+    def setUp(self):
+        self.job = ScheduledJob.objects.create(
+            name='popularity', command='rollup_popularity', interval_seconds=3600,
+            next_run_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def test_lease_is_exclusive_until_it_expires(self):
+        self.assertTrue(claim(self.job, 'worker-a', lease_seconds=60))
+        self.assertFalse(claim(self.job, 'worker-b', lease_seconds=60))
+
+        JobRun.objects.create(job=self.job, worker='worker-a')
+        ScheduledJob.objects.filter(pk=self.job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(claim(self.job, 'worker-b', lease_seconds=60))
+        # Lần chạy bỏ dở của worker-a được đóng lại
+        self.assertEqual(JobRun.objects.get().status, 'failed')
+
+    def test_run_once_records_history_and_reschedules(self):
+        Scheduler(workers=1, log=lambda message: None).run(once=True)
+
+        run = JobRun.objects.get()
+        self.assertEqual(run.status, 'success')
+        self.assertIsNotNone(run.duration)
+        job = ScheduledJob.objects.get()
+        self.assertEqual(job.locked_by, '')
+        self.assertEqual(job.next_run_at, run.started_at + timedelta(seconds=3600))
+
+        # Chưa đến hạn: không chạy lại
+        Scheduler(workers=1, log=lambda message: None).run(once=True)
+        self.assertEqual(JobRun.objects.count(), 1)
+
+    @override_settings(SCHEDULED_JOBS={'popularity': {'command': 'other', 'interval': 60},
+                                       'mining': {'command': 'mine_rules', 'interval': 60}})
+    def test_sync_only_adds_missing_jobs(self):
+        self.assertEqual(sync_jobs(), ['mining'])
+        self.assertEqual(ScheduledJob.objects.get(name='popularity').interval_seconds, 3600)
+
+
+class WaitlistTests(IsolatedSettingsMixin, TestCase):
+    """Hết sách thì vào hàng chờ; bản được trả giữ ngay cho người đầu hàng."""
+
+    def setUp(self):
+        author = Author.objects.create(author_name='Author')
+        publisher = Publisher.objects.create(publish_name='Publisher')
+        self.book = Book.objects.create(
+            book_name='Book', author=author, publisher=publisher, quantity=1, available=1,
+        )
+        self.users = [
+            Account.objects.create(
+                account_id=f'wait-{i}', account_name=f'User {i}', email=f'wait{i}@example.com',
+                username=f'wait{i}', password='pw', phone='0900000000', status='active',
+            )
+            for i in range(3)
+        ]
+        self.loan = Borrow.objects.create(user=self.users[0], book=self.book, status='borrowed')
+
+    def reserve(self, user):
+        client = Client()
+        session = client.session
+        session['account_id'] = user.account_id
+        session.save()
+        return client.post(reverse('reserve_book', args=[self.book.pk]))
+
+    def test_full_book_queues_in_order(self):
+        self.reserve(self.users[1])
+        self.reserve(self.users[2])
+        self.assertFalse(Borrow.objects.filter(status='reserved').exists())
+        queue = WaitlistEntry.objects.filter(book=self.book).order_by('created_at', 'pk')
+        self.assertEqual([entry.user for entry in queue], self.users[1:])
+        self.assertEqual(WaitlistEntry.position_of(queue[1]), 2)
+
+    def test_return_promotes_head_of_queue(self):
+        self.reserve(self.users[1])
+        self.reserve(self.users[2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.loan.status = 'returned'
+            self.loan.save()
+
+        promoted = Borrow.objects.get(status='reserved')
+        self.assertEqual(promoted.user, self.users[1])
+        self.assertEqual(list(WaitlistEntry.objects.values_list('user', flat=True)), [self.users[2].pk])
+        self.assertEqual(len(mail.outbox), 2)  # email trả sách + email báo giữ sách
+        self.assertIn('bạn chờ', mail.outbox[-1].subject)
+        self.assertEqual(mail.outbox[-1].to, [self.users[1].email])
+
+    def test_status_email_is_sent_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.loan.status = 'returned'
+                self.loan.save()
+                raise RuntimeError
+        self.assertEqual(mail.outbox, [])
+
+        self.loan.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.loan.status = 'returned'
+            self.loan.save()
+            self.assertEqual(mail.outbox, [])
+        self.assertEqual([message.to for message in mail.outbox], [[self.loan.user.email]])
+
+    def test_promotion_skips_users_already_holding_the_book(self):
+        self.reserve(self.users[1])
+        self.reserve(self.users[2])
+        # Sau khi nhập thêm sách, quầy cho users[1] mượn trực tiếp dù họ vẫn trong hàng chờ
+        Book.objects.filter(pk=self.book.pk).update(quantity=2, available=1)
+        self.book.refresh_from_db()
+        Borrow.objects.create(user=self.users[1], book=self.book, status='borrowed')
+
+        self.loan.status = 'returned'
+        self.loan.save()
+
+        self.assertEqual(Borrow.objects.get(pk=self.loan.pk).status, 'returned')
+        self.assertEqual(Borrow.objects.get(status='reserved').user, self.users[2])
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_restock_promotes_before_queueing_new_readers(self):
+        self.reserve(self.users[1])
+        Book.objects.filter(pk=self.book.pk).update(quantity=3, available=2)
+        # Copy trống bị bỏ không: người đặt mới không phải xếp sau hàng chờ
+        self.reserve(self.users[2])
+        self.assertEqual(
+            set(Borrow.objects.filter(status='reserved').values_list('user', flat=True)),
+            {self.users[1].pk, self.users[2].pk},
+        )
+
+        self.reserve(Account.objects.create(
+            account_id='wait-9', account_name='User 9', email='wait9@example.com',
+            username='wait9', password='pw', phone='0900000000', status='active',
+        ))
+        self.assertEqual(WaitlistEntry.objects.count(), 1)
+
+        book = Book.objects.get(pk=self.book.pk)
+        book.quantity, book.available = 4, 3
+        book.save()
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(Borrow.objects.filter(status='reserved').count(), 3)
+
+    def test_confirmed_return_request_promotes(self):
+        self.reserve(self.users[1])
+        self.loan.status = 'await_return'
+        self.loan.save()
+        self.loan.status = 'returned'
+        self.loan.save()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available, 1)
+        self.assertEqual(Borrow.objects.get(status='reserved').user, self.users[1])
+
+    def test_cancelled_reservation_goes_to_queue(self):
+        self.loan.status = 'returned'
+        self.loan.save()
+        self.reserve(self.users[1])
+        self.reserve(self.users[2])
+        reservation = Borrow.objects.get(status='reserved')
+
+        client = Client()
+        session = client.session
+        session['account_id'] = self.users[1].account_id
+        session.save()
+        client.post(reverse('cancel_pending_borrow', args=[reservation.pk]))
+
+        self.assertEqual(Borrow.objects.get(status='reserved').user, self.users[2])
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+
+@override_settings(RESERVATION_HOLD_DAYS=3)
+class ExpireReservationsTests(IsolatedSettingsMixin, TestCase):
+    """Lượt đặt trước quá hạn giữ sách hết hạn trong một lần quét và nhường bản cho hàng chờ."""
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(author_name='Author')
+        publisher = Publisher.objects.create(publish_name='Publisher')
+        self.books = [
+            Book.objects.create(book_name=f'Book {i}', author=author, publisher=publisher, quantity=1, available=1)
+            for i in range(3)
+        ]
+        self.users = [
+            Account.objects.create(
+                account_id=f'hold-{i}', account_name=f'User {i}', email=f'hold{i}@example.com',
+                username=f'hold{i}', password='pw', phone='0900000000', status='active',
+            )
+            for i in range(4)
+        ]
+        old = date.today() - timedelta(days=4)
+        self.stale = [
+            Borrow.objects.create(user=self.users[0], book=self.books[0], status='reserved', borrow_date=old),
+            Borrow.objects.create(user=self.users[1], book=self.books[1], status='reserved', borrow_date=old),
+        ]
+        self.fresh = Borrow.objects.create(
+            user=self.users[0], book=self.books[2], status='reserved', borrow_date=date.today() - timedelta(days=3),
+        )
+        WaitlistEntry.objects.create(book=self.books[0], user=self.users[2])
+        WaitlistEntry.objects.create(book=self.books[0], user=self.users[3])
+        mail.outbox = []
+
+    def test_expires_stale_reservations_and_promotes_waitlist(self):
+        version = cache.get(BORROW_VERSION_KEY)
+
+        call_command('expire_reservations', stdout=StringIO())
+
+        self.assertEqual(
+            set(Borrow.objects.filter(status='expired').values_list('pk', flat=True)),
+            {borrow.pk for borrow in self.stale},
+        )
+        self.assertEqual(Borrow.objects.get(pk=self.fresh.pk).status, 'reserved')
+        promoted = Borrow.objects.get(book=self.books[0], status='reserved')
+        self.assertEqual(promoted.user, self.users[2])
+        self.assertEqual(promoted.borrow_date, date.today())
+        self.assertEqual(list(WaitlistEntry.objects.values_list('user', flat=True)), [self.users[3].pk])
+        self.assertEqual(cache.get(BORROW_VERSION_KEY), version + 1)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['hold0@example.com', 'hold1@example.com', 'hold2@example.com'],
+        )
+
+    def test_query_count_does_not_grow_with_expired_rows(self):
+        def sweep_queries():
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    call_command('expire_reservations', stdout=StringIO())
+                transaction.set_rollback(True)
+            return len(queries)
+
+        small = sweep_queries()
+        old = date.today() - timedelta(days=10)
+        for user in self.users[1:]:
+            Borrow.objects.create(user=user, book=self.books[2], status='reserved', borrow_date=old)
+        self.assertEqual(sweep_queries(), small)
+
+    def test_expired_user_can_reserve_again(self):
+        call_command('expire_reservations', stdout=StringIO())
+        client = Client()
+        session = client.session
+        session['account_id'] = self.users[1].account_id
+        session.save()
+
+        client.post(reverse('reserve_book', args=[self.books[1].pk]))
+
+        self.assertTrue(Borrow.objects.filter(user=self.users[1], book=self.books[1], status='reserved').exists())
+
+
+
+class ImportAccountsTests(IsolatedSettingsMixin, TestCase):
+    """import_accounts: mật khẩu ngẫu nhiên ra file riêng, tài khoản admin bị từ chối mặc định."""
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / 'accounts.csv'
+        self.path.write_text(
+            'account_id,account_name,email,user_type\n'
+            'sv001,Student One,sv001@example.com,student\n'
+            'ad001,Admin One,ad001@example.com,admin\n',
+            encoding='utf-8',
+        )
+
+    def test_generated_passwords_go_to_the_password_file(self):
+        call_command('import_accounts', str(self.path), stdout=StringIO())
+
+        account = Account.objects.get(account_id='sv001')
+        self.assertNotEqual(account.password, 'sv001')
+        self.assertGreaterEqual(len(account.password), 16)
+        with open(Path(self.tmp.name) / 'accounts-passwords.csv', encoding='utf-8') as f:
+            self.assertEqual(list(csv.reader(f))[1], ['sv001', 'sv001', account.password])
+
+    def test_admin_rows_need_allow_admin(self):
+        Account.objects.create(
+            account_id='sv001', account_name='Old', email='old@example.com', username='boss',
+            password='secret', phone='', status='active', user_type='admin',
+        )
+        out = StringIO()
+        call_command('import_accounts', str(self.path), stdout=out)
+        self.assertIn('2 admin rows refused', out.getvalue())
+        self.assertFalse(Account.objects.filter(account_id='ad001').exists())
+        self.assertEqual(Account.objects.get(account_id='sv001').account_name, 'Old')
+
+        call_command(
+            'import_accounts', str(self.path), '--allow-admin',
+            '--password-file', str(Path(self.tmp.name) / 'admin-passwords.csv'), stdout=StringIO(),
+        )
+        self.assertEqual(Account.objects.get(account_id='ad001').user_type, 'admin')
+        self.assertEqual(Account.objects.get(account_id='sv001').account_name, 'Student One')
+
+
+class CachingTests(IsolatedSettingsMixin, TestCase):
+    """cached_call: hit, stale-while-revalidate, chờ khi thiếu mục; khóa phiên bản."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh'):
+        self.calls += 1
+        return value
+
+    def test_hit_computes_once(self):
+        self.assertEqual(cached_call('t', 'k', self.compute), 'fresh')
+        self.assertEqual(cached_call('t', 'k', self.compute), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_entry_is_served_while_another_caller_refreshes(self):
+        cache.set('k', {'value': 'old', 'fresh_until': time.time() - 1})
+        cache.add('k:lock', 1, 30)
+        self.assertEqual(cached_call('t', 'k', self.compute), 'old')
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('k:lock')
+        self.assertEqual(cached_call('t', 'k', self.compute), 'fresh')
+        self.assertEqual(cached_call('t', 'k', self.compute), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_cold_miss_waits_for_the_computing_caller(self):
+        cache.add('k:lock', 1, 30)
+        filler = threading.Timer(0.05, lambda: cache.set('k', {'value': 'theirs', 'fresh_until': time.time() + 60}))
+        filler.start()
+        self.addCleanup(filler.join)
+        self.assertEqual(cached_call('t', 'k', self.compute, wait=2.0), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+        # Người tính chết giữa chừng: hết thời gian chờ thì tự tính
+        cache.add('k2:lock', 1, 30)
+        self.assertEqual(cached_call('t', 'k2', self.compute, wait=0.05), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_version_bump(self):
+        self.assertEqual(get_version('v'), 1)
+        bump_version('v')
+        self.assertEqual(get_version('v'), 2)
+        bump_version('missing')
+        self.assertEqual(get_version('missing'), 2)
+
+    def test_file_cache_locks_and_versions(self):
+        with TemporaryDirectory() as tmp:
+            file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'TIMEOUT': None}
+            with override_settings(CACHES={
+                'default': {**file_cache, 'LOCATION': f'{tmp}/default', 'OPTIONS': {'MAX_ENTRIES': 5}},
+                'versions': {**file_cache, 'LOCATION': f'{tmp}/versions'},
+            }):
+                backend = caches['default']
+                self.assertTrue(caching._acquire(backend, 'k:lock', 30))
+                self.assertFalse(caching._acquire(backend, 'k:lock', 30))
+                caching._release(backend, 'k:lock')
+                self.assertTrue(caching._acquire(backend, 'k:lock', 30))
+                # Khóa bỏ lại bởi process đã chết được lấy lại sau timeout
+                os.utime(caching._lock_path(backend, 'k:lock'), (time.time() - 60,) * 2)
+                self.assertTrue(caching._acquire(backend, 'k:lock', 30))
+
+                def bump_many():
+                    for _ in range(20):
+                        bump_version('gen')
+                threads = [threading.Thread(target=bump_many) for _ in range(5)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(get_version('gen'), 101)
+
+                # Cache mặc định bị cull nhưng khóa phiên bản thì không
+                for i in range(50):
+                    cache.set(f'filler-{i}', i)
+                self.assertEqual(get_version('gen'), 101)
+
+
+class RuleExportImportTests(IsolatedSettingsMixin, TestCase):
+    """mine_rules --export / import_rules: file .npz giữ nguyên luật và thứ tự theo lift."""
+
+    def setUp(self):
+        self.books = make_books(4)
+        a, b, c, d = self.books
+        for ant, cons, lift in ((a, b, 1.5), (a, c, 3.0), (b, d, 2.0)):
+            BookAssociationRule.objects.create(
+                antecedent_book=ant, consequent_book=cons, support=0.1, confidence=0.5, lift=lift,
+            )
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'rules.npz'
+
+    def rules(self):
+        # Các cột số thực được lưu dạng float32 trong file
+        return {
+            (ant, cons, *(round(value, 6) for value in scores))
+            for ant, cons, *scores in BookAssociationRule.objects.values_list(
+                'antecedent_book_id', 'consequent_book_id', 'support', 'confidence', 'lift',
+            )
+        }
+
+    def test_round_trip(self):
+        before = self.rules()
+        self.assertEqual(export_rules(self.path), 3)
+
+        rule_set = RuleSet(self.path)
+        a, b, c, d = self.books
+        self.assertEqual(rule_set.for_book(a.pk), [c.pk, b.pk])
+        self.assertEqual(rule_set.for_books([a.pk, b.pk]), [c.pk, d.pk])
+
+        BookAssociationRule.objects.all().delete()
+        call_command('import_rules', str(self.path), stdout=StringIO())
+        self.assertEqual(self.rules(), before)
+
+    def test_rules_for_missing_books_are_skipped(self):
+        export_rules(self.path)
+        self.books[3].delete()
+        self.assertEqual(import_rules(self.path), (2, 1))
+        self.assertEqual(BookAssociationRule.objects.count(), 2)
+
+
+
+class BookExportImportTests(IsolatedSettingsMixin, TestCase):
+    """export_books_csv -> import_books dựng lại đúng danh mục sách (CSV và JSONL.gz)."""
+
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        novel = Category.objects.create(category_name='Tiểu thuyết')
+        science = Category.objects.create(category_name='Khoa học')
+        books = make_books(3, quantity=4, available=2, price=55000, publishYear=2020)
+        books[0].categories.add(novel, science)
+        books[1].categories.add(science)
+        Book.objects.filter(pk=books[2].pk).update(description='Dòng 1, "trích dẫn"\nDòng 2')
+
+    def catalog(self):
+        return sorted(
+            (book.book_name, book.author.author_name, book.publisher.publish_name, book.publishYear,
+             book.price, book.quantity, book.available, book.description,
+             sorted(c.category_name for c in book.categories.all()))
+            for book in Book.objects.select_related('author', 'publisher').prefetch_related('categories')
+        )
+
+    def round_trip(self, filename, *export_options):
+        before = self.catalog()
+        path = self.dir / filename
+        call_command('export_books_csv', '--output', str(path), *export_options, stdout=StringIO())
+        Book.objects.all().delete()
+
+        call_command('import_books', str(path), stdout=StringIO())
+        self.assertEqual(self.catalog(), before)
+
+        # Nhập lại lần nữa: sách trùng (tên + tác giả) bị bỏ qua
+        out = StringIO()
+        call_command('import_books', str(path), stdout=out)
+        self.assertIn('3 duplicates skipped', out.getvalue())
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_csv_round_trip(self):
+        self.round_trip('books.csv', '--bom')
+
+    def test_jsonl_gzip_round_trip(self):
+        self.round_trip('books.jsonl.gz', '--format', 'jsonl', '--gzip')
+
+
+class ArchiveBorrowsTests(IsolatedSettingsMixin, TestCase):
+    """archive_borrows chuyển phiếu cũ sang BorrowArchive; lịch sử của người dùng vẫn đầy đủ."""
+
+    def setUp(self):
+        self.account = Account.objects.create(
+            account_id='archive-user', account_name='Archive User', email='archive@example.com',
+            username='archive', password='pw', phone='0900000000', status='active',
+        )
+        books = make_books(4)
+        today = date.today()
+        long_ago = today - timedelta(days=400)
+        self.old = Borrow.objects.create(
+            user=self.account, book=books[0], status='returned', borrow_date=long_ago,
+            due_date=long_ago + timedelta(days=14), return_date=long_ago + timedelta(days=20),
+        )
+        self.recent = Borrow.objects.create(
+            user=self.account, book=books[1], status='returned', borrow_date=today - timedelta(days=10),
+            due_date=today, return_date=today - timedelta(days=2),
+        )
+        self.expired = Borrow.objects.create(user=self.account, book=books[2], status='expired', borrow_date=long_ago)
+        self.on_loan = Borrow.objects.create(user=self.account, book=books[3], status='borrowed', borrow_date=long_ago)
+        rollup(full=True)
+
+    def test_moves_only_old_finished_borrows(self):
+        popularity = sorted(BookPopularity.objects.values_list('book_id', 'borrow_count'))
+
+        self.assertEqual(archive_borrows(365, batch_size=1), 2)
+
+        self.assertEqual(
+            set(BorrowArchive.objects.values_list('borrow_id', flat=True)), {self.old.pk, self.expired.pk},
+        )
+        self.assertEqual(set(Borrow.objects.values_list('pk', flat=True)), {self.recent.pk, self.on_loan.pk})
+        archived = BorrowArchive.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.return_date, archived.fine), (self.old.return_date, self.old.fine))
+        # Lưu trữ không phải hủy mượn: số lượt mượn giữ nguyên, kể cả sau rollup
+        self.assertEqual(sorted(BookPopularity.objects.values_list('book_id', 'borrow_count')), popularity)
+        rollup(full=True)
+        self.assertEqual(sorted(BookPopularity.objects.values_list('book_id', 'borrow_count')), popularity)
+
+    def test_history_spans_both_tables(self):
+        archive_borrows(365)
+
+        self.assertEqual([b.pk for b in returned_history(self.account)], [self.recent.pk, self.old.pk])
+
+        client = Client()
+        session = client.session
+        session['account_id'] = self.account.account_id
+        session.save()
+        client.post(reverse('delete_returned_borrow', args=[self.old.pk]), headers={'HX-Request': 'true'})
+        client.post(reverse('delete_returned_borrow', args=[self.recent.pk]), headers={'HX-Request': 'true'})
+        self.assertEqual(returned_history(self.account), [])
+        self.assertTrue(BorrowArchive.objects.filter(pk=self.expired.pk).exists())
+
+    def test_exports_include_archived_borrows(self):
+        from .columnar_export import export_columnar
+        from .exports import iter_export
+
+        everything = {self.old.pk, self.recent.pk, self.expired.pk, self.on_loan.pk}
+        with TemporaryDirectory() as out_dir:
+            export_columnar(out_dir, fmt='arrow', tables=('borrows',))
+            archive_borrows(365)
+
+            rows = [json.loads(line) for line in iter_export('borrows', 'jsonl')]
+            self.assertEqual({row['borrow_id'] for row in rows}, everything)
+            self.assertEqual(next(r for r in rows if r['borrow_id'] == self.old.pk)['account_id'], 'archive-user')
+
+            # Phiếu lưu trữ đã có trong lần xuất trước: lần xuất tăng dần không lặp lại
+            later = Borrow.objects.create(user=self.account, book=self.old.book, status='borrowed')
+            self.assertEqual(export_columnar(out_dir, fmt='arrow', tables=('borrows',), incremental=True),
+                             {'borrows': 1})
+            self.assertEqual(export_columnar(out_dir, fmt='arrow', tables=('borrows',)), {'borrows': 5})
+
+            import pyarrow as pa
+            [part] = Path(out_dir, 'borrows').glob('part-*.arrow')
+            with pa.ipc.open_file(part) as reader:
+                exported = set(reader.read_all().column('borrow_id').to_pylist())
+        self.assertEqual(exported, everything | {later.pk})
+
+    def test_evaluation_includes_archived_borrows(self):
+        for days in range(380, 388):
+            Borrow.objects.create(
+                user=self.account, book=self.old.book, status='returned', borrow_date=date.today() - timedelta(days=days),
+                return_date=date.today() - timedelta(days=days - 5),
+            )
+        archive_borrows(365)
+        self.assertEqual(BorrowArchive.objects.count(), 10)
+
+        out = StringIO()
+        call_command('evaluate_recommender', engine='popular', latency_samples=0, stdout=out)
+        train, test = map(int, re.search(r'(\d+) train / (\d+) test', out.getvalue()).groups())
+        self.assertEqual(train + test, 12)
+        self.assertGreater(train, 8)
+
+
+@mock.patch('library.db_router.replica_enabled', return_value=True)
+@mock.patch('library.middleware.replica_enabled', return_value=True)
+class ReplicaRoutingTests(IsolatedSettingsMixin, SimpleTestCase):
+    """Đọc từ replica chỉ trong read_from_replica; sau khi ghi thì bám primary (cả request sau)."""
+
+    router = ReplicaRouter()
+
+    def read_target(self):
+        with read_from_replica():
+            return self.router.db_for_read(Book)
+
+    def test_reads_use_replica_only_when_asked(self, *mocks):
+        with primary_scope():
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+            self.assertEqual(self.read_target(), 'replica')
+            with read_from_replica():
+                # Session / auth luôn đọc ở primary
+                self.assertEqual(self.router.db_for_read(get_user_model()), 'default')
+
+    def test_write_pins_the_rest_of_the_request(self, *mocks):
+        with primary_scope():
+            self.router.db_for_write(Borrow)
+            self.assertTrue(has_written())
+            self.assertEqual(self.read_target(), 'default')
+        with primary_scope():
+            self.assertEqual(self.read_target(), 'replica')
+
+    def test_sticky_cookie_keeps_the_next_request_on_primary(self, *mocks):
+        seen = []
+
+        def view(request):
+            seen.append(self.read_target())
+            if request.method == 'POST':
+                self.router.db_for_write(Borrow)
+            return HttpResponse()
+
+        middleware = PrimaryStickyMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post('/borrow/reserve/1/'))
+        cookie = response.cookies[PrimaryStickyMiddleware.COOKIE_NAME]
+        self.assertEqual(cookie['max-age'], 10)
+
+        middleware(factory.get('/user/get-reserved-books/', HTTP_COOKIE=f'{cookie.key}={cookie.value}'))
+        fresh = middleware(factory.get('/user/get-reserved-books/'))
+        self.assertEqual(seen, ['replica', 'default', 'replica'])
+        self.assertNotIn(PrimaryStickyMiddleware.COOKIE_NAME, fresh.cookies)
+
+
+class MetricsEndpointTests(IsolatedSettingsMixin, TestCase):
+    """/metrics chỉ mở cho token / IP nội bộ / admin; worker đã chết được gộp, tổng không giảm."""
+
+    def write_worker_file(self, name, count, gauge=None):
+        data = {metrics.REQUESTS.name: {'kind': 'counter', 'help': 'h', 'labelnames': ['view', 'status'],
+                                        'samples': [[['probe', '200'], count]]}}
+        if gauge is not None:
+            data[metrics.RULES.name] = {'kind': 'gauge', 'help': 'h', 'labelnames': [],
+                                        'samples': [[[], [gauge, time.time()]]]}
+        (Path(settings.METRICS_DIR) / name).write_text(json.dumps(data))
+
+    def test_access(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer s3cret'}).status_code, 200)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer nope'}).status_code, 401)
+            self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(get_user_model().objects.create_user('ops', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dead_workers_are_folded(self):
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.write_worker_file(f'{socket.gethostname()}-{dead.pid}-0000.json', 5, gauge=42)
+        self.write_worker_file(f'{dead.pid}.json', 7)
+        self.write_worker_file('other-host-1-0000.json', 3)
+
+        for _ in range(2):
+            text = metrics.render()
+            self.assertIn('library_requests_total{view="probe",status="200"} 15', text)
+            # Gauge của worker đã chết bị bỏ
+            self.assertNotIn(metrics.RULES.name, text)
+
+        self.assertEqual(
+            sorted(path.name for path in directory.glob('*.json') if not path.name.startswith(socket.gethostname())),
+            ['other-host-1-0000.json', metrics.RETIRED_FILE],
+        )
+        self.assertFalse((directory / f'{dead.pid}.json').exists())
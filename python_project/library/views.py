@@ -2,25 +2,26 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_http_methods, require_POST
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse
+from django.conf import settings
 from functools import wraps
+import hmac
 from django.db import transaction
-from .models import Book, Author, Category, Publisher, Account, Borrow, BookAssociationRule
+from .models import Book, Author, Category, Publisher, Account, Borrow, BorrowArchive, BookAssociationRule, WaitlistEntry
 from django.core.exceptions import ValidationError
+from .archive import returned_history
+from .caching import get_cache_stats
+from .db_router import read_from_replica
+from .metrics import render as render_metrics
 from .recommendation import RecommendationService
 
 
 # --- HELPER FUNCTIONS ---
 
-def _get_current_account(request):
-    acc_id = request.session.get('account_id')
-    if not acc_id:
-        return None
-    return Account.objects.filter(account_id=acc_id).first()
-
-
 def calculate_days_left(borrow_instance):
     if borrow_instance.due_date and borrow_instance.status == 'borrowed':
         delta = borrow_instance.due_date - timezone.now().date()
@@ -40,7 +41,7 @@ def session_login_required(view_func):
 
 
 def home_page_user(request):
-    account = _get_current_account(request)
+    account = request.account
     notifications = []
     if account:
         notifications = Borrow.objects.filter(
@@ -75,7 +76,7 @@ def library_rule(request):
 
 @session_login_required
 def must_return_book(request):
-    account = _get_current_account(request)
+    account = request.account
     if not account:
         return redirect('login_view')
 
@@ -116,10 +117,8 @@ def must_return_book(request):
         })
 
     # --- PHẦN 2: SÁCH ĐÃ TRẢ (Lịch sử nợ) ---
-    returned_borrows = Borrow.objects.filter(
-        user=account,
-        status='returned'
-    ).select_related('book').order_by('-return_date')
+    # Gồm cả các phiếu đã chuyển sang BorrowArchive
+    returned_borrows = returned_history(account, statuses=('returned',))
 
     history_items = []
     for b in returned_borrows:
@@ -155,14 +154,14 @@ def must_return_book(request):
 
 @session_login_required
 def library_card(request):
-    account = _get_current_account(request)
+    account = request.account
     return render(request, 'library_card.html', {
         'account': account
     })
 
 @session_login_required
 def notify(request):
-    account = _get_current_account(request)
+    account = request.account
     if not account:
         return redirect('login_view')
 
@@ -189,6 +188,7 @@ def custom_login(request):
     return render(request, 'login.html')
 
 
+@read_from_replica()
 def user_books_view(request):
     keyword = request.GET.get("keyword", "").strip()
     selected_author = request.GET.get("author", "")
@@ -196,15 +196,22 @@ def user_books_view(request):
     selected_publisher = request.GET.get("publisher", "")
     selected_date = request.GET.get("date_add", "")
     selected_status = request.GET.get("status", "")
+    selected_sort = request.GET.get("sort", "")
 
     books = (
         Book.objects
         .select_related("author", "publisher")
         .prefetch_related("categories")
         .all()
-        .order_by("book_name")
     )
 
+    if selected_sort == "popular":
+        books = books.order_by(F("popularity__borrow_count").desc(nulls_last=True), "book_name")
+    elif selected_sort == "trending":
+        books = books.order_by(F("popularity__borrow_count_30d").desc(nulls_last=True), "book_name")
+    else:
+        books = books.order_by("book_name")
+
     if keyword:
         books = books.filter(
             Q(book_name__icontains=keyword) |
@@ -226,7 +233,7 @@ def user_books_view(request):
 
     books = books.distinct()
 
-    account = _get_current_account(request)
+    account = request.account
     if account:
         recommended_books = RecommendationService.get_recommendations_for_user(account, limit=6)
     else:
@@ -244,12 +251,13 @@ def user_books_view(request):
         "selected_publisher": selected_publisher,
         "selected_status": selected_status,
         "selected_date": selected_date,
+        "selected_sort": selected_sort,
     })
 
 
 @require_POST
 def reserve_book(request, book_id):
-    account = _get_current_account(request)
+    account = request.account
     book = get_object_or_404(Book, pk=book_id)
 
     # Kiểm tra xem người dùng đã có trạng thái mượn/đặt với sách này chưa
@@ -271,18 +279,35 @@ def reserve_book(request, book_id):
         status='reserved'
     ).count()
 
-    if book.available <= reserved_count:
-        messages.error(
-            request,
-            "Hiện đã có người dùng khác đặt trước."
-        )
+    # Còn bản trống mà vẫn có hàng chờ (vd. admin vừa nhập thêm sách): giữ cho hàng chờ trước
+    if book.available > reserved_count and WaitlistEntry.objects.filter(book=book).exists():
+        with transaction.atomic():
+            promoted = WaitlistEntry.promote(book)
+        if any(borrow.user_id == account.pk for borrow in promoted):
+            messages.success(request, "Đặt trước thành công.")
+            return redirect('user_books_author')
+        reserved_count += len(promoted)
+
+    # Hết bản trống, hoặc đã có người xếp hàng trước: vào hàng chờ thay vì báo lỗi
+    if book.available <= reserved_count or WaitlistEntry.objects.filter(book=book).exclude(user=account).exists():
+        entry, created = WaitlistEntry.objects.get_or_create(book=book, user=account)
+        position = WaitlistEntry.position_of(entry)
+        if created:
+            messages.success(
+                request,
+                f"Sách đã hết. Bạn đứng thứ {position} trong hàng chờ, sách sẽ được tự động giữ cho bạn khi có người trả."
+            )
+        else:
+            messages.info(request, f"Bạn đang đứng thứ {position} trong hàng chờ của cuốn sách này.")
         return redirect('user_books_author')
 
-    Borrow.objects.create(
-        user=account,
-        book=book,
-        status='reserved'
-    )
+    with transaction.atomic():
+        Borrow.objects.create(
+            user=account,
+            book=book,
+            status='reserved'
+        )
+        WaitlistEntry.objects.filter(book=book, user=account).delete()
 
     messages.success(request, "Đặt trước thành công.")
     return redirect('user_books_author')
@@ -292,7 +317,7 @@ def reserve_book(request, book_id):
 
 @session_login_required
 def user_borrowed(request):
-    account = _get_current_account(request)
+    account = request.account
     if not account:
         return redirect('login_view')
 
@@ -315,7 +340,7 @@ def user_borrowed(request):
 @session_login_required
 @require_POST
 def confirm_return(request, borrow_id):
-    account = _get_current_account(request)
+    account = request.account
     if not account: return redirect('login_view')
 
     b = get_object_or_404(Borrow, borrow_id=borrow_id, user=account)
@@ -335,9 +360,12 @@ def confirm_return(request, borrow_id):
 @session_login_required
 @require_POST
 def cancel_pending_borrow(request, borrow_id):
-    account = _get_current_account(request)
+    account = request.account
     b = get_object_or_404(Borrow, borrow_id=borrow_id, user=account, status__in=['reserved', 'pending'])
-    b.delete()
+    with transaction.atomic():
+        b.delete()
+        # Suất đặt trước vừa trống chuyển cho người đầu hàng chờ
+        WaitlistEntry.promote(b.book)
     messages.success(request, "Đã hủy yêu cầu.")
 
     if request.headers.get('HX-Request'):
@@ -348,8 +376,9 @@ def cancel_pending_borrow(request, borrow_id):
 @session_login_required
 @require_POST
 def delete_returned_borrow(request, borrow_id):
-    account = _get_current_account(request)
-    b = get_object_or_404(Borrow, borrow_id=borrow_id, user=account, status='returned')
+    account = request.account
+    b = (Borrow.objects.filter(borrow_id=borrow_id, user=account, status='returned').first()
+         or get_object_or_404(BorrowArchive, borrow_id=borrow_id, user=account))
     b.delete()
     messages.success(request, "Đã xóa lịch sử đã trả.")
 
@@ -382,7 +411,7 @@ def get_pending_requests(request):
 
 @session_login_required
 def get_user_active_borrows(request):
-    account = _get_current_account(request)
+    account = request.account
     if not account:
         return HttpResponse("")
 
@@ -403,13 +432,10 @@ def get_user_active_borrows(request):
 
 @session_login_required
 def get_user_returned_history(request):
-    account = _get_current_account(request)
+    account = request.account
     if not account: return HttpResponse("")
 
-    borrows_returned = (Borrow.objects
-                        .select_related('book', 'book__author')
-                        .filter(user=account, status__in=['await_return', 'returned'])
-                        .order_by('-return_date', '-borrow_id'))
+    borrows_returned = returned_history(account)
 
     returned_items = [{'borrow': b} for b in borrows_returned]
 
@@ -422,7 +448,7 @@ def get_user_returned_history(request):
 @session_login_required
 def get_user_reserved_books(request):
 
-    account = _get_current_account(request)
+    account = request.account
     if not account: return HttpResponse("")
     borrows_reserved = (Borrow.objects
                         .select_related('book', 'book__author')
@@ -431,7 +457,49 @@ def get_user_reserved_books(request):
 
     reserved_items = [{'borrow': b} for b in borrows_reserved]
 
+    # Vị trí trong hàng chờ tính bằng window function: một truy vấn cho mọi sách
+    waitlist = (WaitlistEntry.objects
+                .select_related('book', 'book__author')
+                .annotate(position=Window(RowNumber(), partition_by=F('book'), order_by=[F('created_at'), F('pk')]))
+                .filter(user=account)
+                .order_by('created_at'))
+    waitlist_items = list(waitlist)
+
     return render(request, 'partials/user_reserved_list.html', {
         'reserved_items': reserved_items,
-        'is_empty_reserved': len(reserved_items) == 0,
-    })
\ No newline at end of file
+        'waitlist_items': waitlist_items,
+        'is_empty_reserved': len(reserved_items) == 0 and len(waitlist_items) == 0,
+    })
+
+
+@session_login_required
+@require_POST
+def leave_waitlist(request, entry_id):
+    account = request.account
+    entry = get_object_or_404(WaitlistEntry, pk=entry_id, user=account)
+    entry.delete()
+    messages.success(request, "Đã rời hàng chờ.")
+
+    if request.headers.get('HX-Request'):
+        return HttpResponse("")
+    return HttpResponseRedirect(reverse('user_borrowed') + '?tab=reserved')
+
+
+@staff_member_required
+def cache_stats(request):
+    # Bộ đếm của riêng worker xử lý request này
+    return JsonResponse({"cache": get_cache_stats()})
+
+
+def metrics(request):
+    # Prometheus scrape endpoint, gộp số liệu của mọi worker. Chỉ cho: header
+    # "Authorization: Bearer <METRICS_TOKEN>", IP trong METRICS_ALLOWED_IPS, hoặc admin đã đăng nhập.
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization:
+        if not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return HttpResponse(status=401)
+    elif not (request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+              or request.user.is_staff):
+        return HttpResponse(status=401 if token else 403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')